@@ -1,15 +1,38 @@
+import functools
 import os
+import sys
 
-import anthropic
 import dotenv
 
+# llm-common is the module directory shared with oop-scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'llm-common'))
+from llm_cache import CachedMessages, cache_from_env  # noqa: E402
+from llm_metrics import InstrumentedMessages, LLMMetrics  # noqa: E402
+
 dotenv.load_dotenv()
 
 
-client = anthropic.Anthropic(
-    # defaults to os.environ.get("ANTHROPIC_API_KEY")
-    api_key=os.getenv("ANTHROPIC_API_KEY"),
-)
+@functools.cache
+def get_client():
+    """The Anthropic client, created on first use and shared so its HTTP connection pool is reused.
+
+    The SDK is imported here, so importing this module stays cheap and makes no API call.
+    """
+    import anthropic
+
+    return anthropic.Anthropic(
+        # defaults to os.environ.get("ANTHROPIC_API_KEY")
+        api_key=os.getenv("ANTHROPIC_API_KEY"),
+    )
+
+
+class LazyClient:
+    """Stands in for the client so that replies served from the cache never build it"""
+
+    @property
+    def messages(self):
+        return get_client().messages
+
 
 prompt = """
 You are an experienced software architect and technical interviewer. Your task is to analyze a basic project description, expand upon it, increase its complexity to match real-world business scenarios, and identify potential technical challenges that might be asked about in an interview, with a focus on backend technologies.\n\nHere's the project description you'll be working with:\n\n<project_description>\n{{PROJECT_DESCRIPTION}}\n</project_description>\n\nPlease follow these steps to complete the task:\n\n1. Carefully read and analyze the given project description.\n\n2. Expand and enrich the project description:\n   - Identify key components and features that are implied but not explicitly stated.\n   - Add realistic details about the system architecture, data flow, and user interactions.\n   - Consider scalability, performance, and security aspects that would be relevant in a production environment.\n\n3. Increase the system's complexity:\n   - Introduce additional features or requirements that align with the project's goals and real-world business needs.\n   - Consider integration with other systems or third-party services that would be common in similar projects.\n   - Add constraints or challenges that the system might face in a real-world scenario (e.g., high concurrency, data volume, regulatory compliance).\n\n4. Identify potential technical interview questions:\n   - Think about challenging aspects of the expanded system design, focusing on backend technologies.\n   - Consider questions related to databases, distributed systems, scalability, performance optimization, data consistency, and fault tolerance.\n   - Include questions about specific backend technologies, algorithms, or architectural patterns that might be relevant to the project.\n\nBefore providing your final response, break down your thought process for each step in <analysis> tags. For each step:\n- List key components or features you've identified or added\n- Provide justifications for your additions or changes\n- Consider potential challenges or implications of your decisions\n\nThis will help ensure a thorough analysis and consideration of all aspects of the project.\n\nYour final output should be structured as follows:\n\n<expanded_description>\n[Provide the expanded and enriched project description here, including key components, architectural details, and considerations for scalability, performance, and security.]\n</expanded_description>\n\n<increased_complexity>\n[Describe the additional features, integrations, and challenges that increase the system's complexity, focusing on real-world business needs and technical constraints.]\n</increased_complexity>\n\n<potential_interview_questions>\n[List 5-7 potential technical interview questions related to the expanded project, with a focus on backend technologies, databases, distributed systems, and implementation challenges. Each question should be challenging and relevant to the technical aspects of the expanded project.]\n</potential_interview_questions>\n\nEnsure that your expansion and complexity increase are realistic and align with current industry practices. The potential interview questions should be challenging and relevant to the technical aspects of the expanded project, with a particular emphasis on backend technologies and system design.\n\nExample output structure (do not copy the content, only the format):\n\n<expanded_description>\nThe project is a distributed e-commerce platform that... [continue with detailed description]\n</expanded_description>\n\n<increased_complexity>\nTo increase complexity, we can introduce the following features and challenges:\n1. Multi-region deployment for improved latency and redundancy...\n2. Real-time inventory management across multiple warehouses...\n3. Integration with third-party payment gateways and fraud detection services...\n[continue with more complexity factors]\n</increased_complexity>\n\n<potential_interview_questions>\n1. How would you design the database schema to efficiently handle product catalogs, user data, and order information at scale?\n2. Describe a strategy for maintaining data consistency across multiple microservices in this distributed e-commerce system.\n3. What approach would you take to implement a real-time inventory management system that can handle high concurrency during flash sales?\n[continue with more questions, focusing on backend and distributed systems challenges]\n</potential_interview_questions>
@@ -25,36 +48,54 @@ PROJECT_DESCRIPTION="""
 
 prompt = prompt.replace("{{PROJECT_DESCRIPTION}}", PROJECT_DESCRIPTION)
 
-# Replace placeholders like {{PROJECT_DESCRIPTION}} with real values,
-# because the SDK does not support variables.
-message = client.messages.create(
-    model="claude-3-5-sonnet-20241022",
-    max_tokens=1000,
-    temperature=0,
-    messages=[
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text":  prompt
-                }
-            ]
-        },
-        {
-            "role": "assistant",
-            "content": [
-                {
-                    "type": "text",
-                    "text": "<analysis>"
-                }
-            ]
-        }
-    ]
-)
-print(message.content)
-
-# save the response to a file
-with open("output.txt", "w") as f:
-    data = message.content[0].text
-    f.write(data)
\ No newline at end of file
+
+def main():
+    # Responses are cached on disk (LLM_CACHE_PATH, empty to disable); LLM_REPLAY=1 never calls the API
+    cache = cache_from_env()
+    if cache:
+        messages = CachedMessages(LazyClient(), cache, offline=os.getenv("LLM_REPLAY") == "1")
+    else:
+        messages = get_client().messages
+    # Latency and token usage of each call go to the JSONL trace at LLM_TRACE_PATH (empty to disable)
+    metrics = LLMMetrics(trace_path=os.getenv("LLM_TRACE_PATH", "trace.jsonl") or None)
+    messages = InstrumentedMessages(messages, metrics)
+
+    # Replace placeholders like {{PROJECT_DESCRIPTION}} with real values,
+    # because the SDK does not support variables.
+    message = messages.create(
+        model="claude-3-5-sonnet-20241022",
+        max_tokens=1000,
+        temperature=0,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text":  prompt
+                    }
+                ]
+            },
+            {
+                "role": "assistant",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "<analysis>"
+                    }
+                ]
+            }
+        ]
+    )
+    print(message.content)
+    print(metrics.format_summary())
+    metrics.close()
+
+    # save the response to a file
+    with open("output.txt", "w") as f:
+        data = message.content[0].text
+        f.write(data)
+
+
+if __name__ == '__main__':
+    main()
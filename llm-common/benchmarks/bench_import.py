@@ -0,0 +1,60 @@
+"""Measure cold import time of the scripts that call LLM providers.
+
+Usage: python llm-common/benchmarks/bench_import.py [--repeat 5] [--max-seconds 1.5]
+
+Each import runs in a fresh interpreter, so nothing is already in
+sys.modules. Besides the time, the report lists any provider SDK the import
+pulled in; those should only load on the first model call. With
+--max-seconds the exit status is 1 when a script is slower than the budget
+or loads a provider SDK, so the check can run in CI.
+"""
+import argparse
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+SCRIPTS = {
+    'oop-practice-generator': ROOT / 'oop-scripts' / 'oop-practice-generator.py',
+    'ai-interviewer': ROOT / 'ai-interviewer' / 'main.py',
+}
+PROVIDER_MODULES = ('anthropic', 'langchain_anthropic', 'openai', 'langchain_openai')
+
+# 在子进程里执行：按文件路径导入（脚本名带连字符），输出耗时和已加载的供应商模块
+CHILD = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('bench_target', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'providers': [name for name in %r if name in sys.modules]}))
+""" % (PROVIDER_MODULES,)
+
+
+def measure(path):
+    output = subprocess.run([sys.executable, '-c', CHILD, str(path)], cwd=path.parent, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, help="fail if the best import time exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    for name, path in SCRIPTS.items():
+        runs = [measure(path) for _ in range(args.repeat)]
+        best = min(run['seconds'] for run in runs)
+        providers = runs[0]['providers']
+        print(f"{name:24} best {best * 1000:7.1f} ms  provider SDKs at import: {', '.join(providers) or 'none'}")
+        if args.max_seconds is not None and (best > args.max_seconds or providers):
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
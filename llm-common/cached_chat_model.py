@@ -0,0 +1,129 @@
+import operator
+from functools import reduce
+from typing import Any
+
+from langchain_core.callbacks import CallbackManager
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from llm_cache import pick_recorded
+
+
+def message_record(message):
+    """The parts of a model reply that are stored in the cache"""
+    return {
+        "content": message.content,
+        "usage_metadata": message.usage_metadata,
+        "response_metadata": message.response_metadata,
+    }
+
+
+def as_chunk(message):
+    """Models without streaming support yield a whole AIMessage from ``astream``"""
+    if isinstance(message, AIMessageChunk):
+        return message
+    return AIMessageChunk(**message_record(message), id=message.id)
+
+
+def child_config(run_manager):
+    """Run the wrapped model as a child of this run, so callbacks can tell the two apart.
+
+    ``stream``/``astream`` do not pass a run manager to ``_stream``; the wrapped
+    model then gets no callbacks, or it would inherit the chain's callbacks
+    from the context and every call would be reported twice.
+    """
+    if run_manager is None:
+        return {"callbacks": []}
+    # LLM 的 run manager 没有 get_child，按 ParentRunManager.get_child 的方式构造
+    callbacks = CallbackManager(handlers=[], parent_run_id=run_manager.run_id)
+    callbacks.set_handlers(run_manager.inheritable_handlers)
+    callbacks.add_tags(run_manager.inheritable_tags)
+    callbacks.add_metadata(run_manager.inheritable_metadata)
+    return {"callbacks": callbacks}
+
+
+def cached_message(value, message_class=AIMessage):
+    response_metadata = dict(value.get('response_metadata') or {}, cache_hit=True)
+    return message_class(content=value['content'], usage_metadata=value.get('usage_metadata'),
+                         response_metadata=response_metadata)
+
+
+class CachedChatModel(BaseChatModel):
+    """Chat model wrapper that answers from a ``ResponseCache`` before calling the wrapped model.
+
+    Keys are built from the wrapped model's identity and parameters, the
+    rendered messages and the occurrence number of the request. Streamed
+    replies are stored only when the stream ran to the end, so a generation
+    the caller cancelled is never replayed. With ``offline=True`` the wrapped
+    model is never called and it acts as a record/replay fake: unknown
+    requests get another recorded reply for the same model.
+    """
+
+    inner: BaseChatModel
+    response_cache: Any
+    offline: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.inner._llm_type}"
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.inner, 'model', None) or getattr(self.inner, 'model_name', None) or self.inner._llm_type
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        # 回调看到的是被包装模型的名字和参数，按模型计费的统计才对得上
+        return self.inner._get_ls_params(stop=stop, **kwargs)
+
+    def lookup(self, messages, stop, kwargs):
+        """Return ``(key, value)``; ``value`` is None when the wrapped model has to be called"""
+        prompt = [[message.type, message.content] for message in messages]
+        key = self.response_cache.request_key(self.model_name, self.inner._get_llm_string(stop=stop, **kwargs), prompt)
+        value = self.response_cache.get(key)
+        if value is None and self.offline:
+            value = pick_recorded(self.response_cache, self.model_name, key)
+        return key, value
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key, value = self.lookup(messages, stop, kwargs)
+        if value is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached_message(value))])
+        message = self.inner.invoke(messages, child_config(run_manager), stop=stop, **kwargs)
+        self.response_cache.put(key, self.model_name, message_record(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key, value = self.lookup(messages, stop, kwargs)
+        if value is not None:
+            return ChatResult(generations=[ChatGeneration(message=cached_message(value))])
+        message = await self.inner.ainvoke(messages, child_config(run_manager), stop=stop, **kwargs)
+        self.response_cache.put(key, self.model_name, message_record(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key, value = self.lookup(messages, stop, kwargs)
+        if value is not None:
+            yield ChatGenerationChunk(message=cached_message(value, AIMessageChunk))
+            return
+        chunks = []
+        for chunk in self.inner.stream(messages, child_config(run_manager), stop=stop, **kwargs):
+            chunk = as_chunk(chunk)
+            chunks.append(chunk)
+            yield ChatGenerationChunk(message=chunk)
+        if chunks:
+            self.response_cache.put(key, self.model_name, message_record(reduce(operator.add, chunks)))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key, value = self.lookup(messages, stop, kwargs)
+        if value is not None:
+            yield ChatGenerationChunk(message=cached_message(value, AIMessageChunk))
+            return
+        chunks = []
+        async for chunk in self.inner.astream(messages, child_config(run_manager), stop=stop, **kwargs):
+            chunk = as_chunk(chunk)
+            chunks.append(chunk)
+            yield ChatGenerationChunk(message=chunk)
+        # 调用方提前关闭流时不会执行到这里，被取消的输出不会进缓存
+        if chunks:
+            self.response_cache.put(key, self.model_name, message_record(reduce(operator.add, chunks)))
@@ -0,0 +1,194 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = "cache/llm.db"
+
+# 调用方设置的请求作用域（例如题目序号）。同一个 prompt 在不同作用域下分开计数：
+# 续跑时剩下的第 3 题不会拿到上次第 0 题的回复
+request_scope = contextvars.ContextVar('llm_request_scope', default=None)
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when no recorded response exists"""
+
+
+def make_key(model, params, prompt, occurrence=0, scope=None):
+    """Content address of a request: model, call parameters, rendered prompt, scope and occurrence number.
+
+    Generators send the same prompt many times and expect different samples,
+    so the n-th identical request in a run (within its scope) gets its own entry.
+    """
+    parts = [model, params, prompt, occurrence] + ([scope] if scope is not None else [])
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Persistent SQLite cache of model responses.
+
+    Entries older than ``ttl`` seconds (if set) are treated as missing. The
+    total stored size is bounded by ``max_bytes``; the least recently used
+    entries are evicted first.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=None, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+        self.occurrences = {}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_model ON responses (model)")
+        self.db.commit()
+        logger.info(f"LLM response cache opened: {path}")
+
+    def request_key(self, model, params, prompt):
+        """Key for the next occurrence of this request in the current process and ``request_scope``"""
+        scope = request_scope.get()
+        base = make_key(model, params, prompt, scope=scope)
+        with self.lock:
+            occurrence = self.occurrences.get(base, 0)
+            self.occurrences[base] = occurrence + 1
+        return make_key(model, params, prompt, occurrence, scope)
+
+    def get(self, key):
+        """Return the cached value for a key, or None"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row['created_at'] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                self.counters['expired'] += 1
+                row = None
+            if row is None:
+                self.counters['misses'] += 1
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.counters['hits'] += 1
+        return json.loads(row['value'])
+
+    def put(self, key, model, value):
+        """Store a JSON-serializable response, then evict old entries if the cache is over its size limit"""
+        data = json.dumps(value, ensure_ascii=False, default=str)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, now, now, len(data.encode('utf-8')))
+            )
+            self.evict()
+            self.db.commit()
+
+    def recorded(self, model):
+        """All stored responses for a model, in a stable order"""
+        with self.lock:
+            rows = self.db.execute("SELECT value FROM responses WHERE model = ? ORDER BY key", (model,)).fetchall()
+        return [json.loads(row['value']) for row in rows]
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes (lock must be held)"""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM responses WHERE key = ?", (row['key'],))
+            total -= row['size']
+            self.counters['evictions'] += 1
+
+    def stats(self):
+        """Return counters plus the current number of entries and stored bytes"""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'hit_ratio': stats['hits'] / lookups if lookups else 0.0,
+        })
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def cache_from_env():
+    """Cache configured by LLM_CACHE_PATH / LLM_CACHE_TTL / LLM_CACHE_MAX_MB; None if LLM_CACHE_PATH is empty"""
+    path = os.getenv('LLM_CACHE_PATH', DEFAULT_PATH)
+    if not path:
+        return None
+    ttl = os.getenv('LLM_CACHE_TTL')
+    return ResponseCache(path, ttl=float(ttl) if ttl else None,
+                         max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', 256)) * 1024 * 1024)
+
+
+def pick_recorded(cache, model, key):
+    """Offline fallback: a recorded response for the model, chosen deterministically by the request key"""
+    recorded = cache.recorded(model)
+    if not recorded:
+        raise CacheMiss(f"No recorded responses for {model} in {cache.path}")
+    return recorded[int(key[:8], 16) % len(recorded)]
+
+
+class CachedMessages:
+    """``client.messages`` of the ``anthropic`` SDK with a response cache in front of ``create``.
+
+    With ``offline=True`` the provider is never called: a request that was
+    not recorded gets another recorded response for the same model, or
+    ``CacheMiss`` if there is none.
+    """
+
+    def __init__(self, client, cache, offline=False):
+        self.client = client
+        self.cache = cache
+        self.offline = offline
+
+    def create(self, **kwargs):
+        from anthropic.types import Message
+
+        model = kwargs.get('model', '')
+        params = {name: value for name, value in kwargs.items() if name not in ('model', 'messages', 'system')}
+        key = self.cache.request_key(model, params, [kwargs.get('system'), kwargs.get('messages')])
+        value = self.cache.get(key)
+        if value is None and self.offline:
+            value = pick_recorded(self.cache, model, key)
+        if value is not None:
+            # SDK 的模型允许额外字段，用 cache_hit 标出没有真正调用 API
+            return Message.model_validate(dict(value, cache_hit=True))
+
+        message = self.client.messages.create(**kwargs)
+        self.cache.put(key, model, message.model_dump(mode='json'))
+        return message
@@ -0,0 +1,152 @@
+import json
+import math
+import threading
+import time
+from pathlib import Path
+
+# 每百万 token 的美元价格（输入, 输出），用于估算费用；不在表中的模型不估算
+MODEL_PRICES = {
+    'claude-3-opus-20240229': (15.0, 75.0),
+    'claude-3-5-sonnet-20241022': (3.0, 15.0),
+    'gpt-4o': (2.5, 10.0),
+}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers, or None when it is empty"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LLMMetrics:
+    """Per-run record of model calls: latency, time to first token, tokens, retries and parse failures.
+
+    Every call and event is appended to an optional JSONL trace as it
+    happens; ``summary`` aggregates the run. Recording is a few dict and
+    list operations under a lock, cheap next to any model call.
+    """
+
+    def __init__(self, trace_path=None):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.counters = {'retries': 0, 'parse_failures': 0, 'accepted': 0, 'rejected': 0}
+        self.started = time.perf_counter()
+        self.trace = None
+        if trace_path:
+            Path(trace_path).parent.mkdir(parents=True, exist_ok=True)
+            # 行缓冲：崩溃时已完成的调用都在 trace 里
+            self.trace = open(trace_path, 'a', encoding='utf-8', buffering=1)
+
+    def write_trace(self, record):
+        if self.trace is not None:
+            self.trace.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def record_call(self, model, latency, ttft=None, input_tokens=0, output_tokens=0, cache_hit=False, error=None):
+        record = {
+            "ts": time.time(), "event": "call", "model": model, "latency_s": round(latency, 4),
+            "ttft_s": round(ttft, 4) if ttft is not None else None,
+            "input_tokens": input_tokens, "output_tokens": output_tokens, "cache_hit": cache_hit, "error": error,
+        }
+        with self.lock:
+            self.calls.append(record)
+            self.write_trace(record)
+
+    def record_event(self, event, amount=1, **fields):
+        """Count a retry, parse failure, accepted or rejected exercise"""
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+            self.write_trace({"ts": time.time(), "event": event, "count": amount, **fields})
+
+    def summary(self):
+        with self.lock:
+            calls = list(self.calls)
+            counters = dict(self.counters)
+        completed = [call for call in calls if call['error'] is None]
+        # 提前取消的流已经生成的部分也要付费，计入 token 和费用
+        cancelled = [call for call in calls if call['error'] == 'cancelled' and not call['cache_hit']]
+        billed = [call for call in completed if not call['cache_hit']] + cancelled
+        latencies = [call['latency_s'] for call in completed]
+        ttfts = [call['ttft_s'] for call in completed if call['ttft_s'] is not None]
+        input_tokens = sum(call['input_tokens'] for call in billed)
+        output_tokens = sum(call['output_tokens'] for call in billed)
+
+        cost = 0.0
+        for call in billed:
+            prices = MODEL_PRICES.get(call['model'])
+            if prices is None:
+                cost = None
+                break
+            cost += (call['input_tokens'] * prices[0] + call['output_tokens'] * prices[1]) / 1_000_000
+
+        accepted = counters['accepted']
+        return {
+            **counters,
+            'calls': len(calls),
+            'errors': len(calls) - len(completed),
+            'cache_hits': sum(call['cache_hit'] for call in completed),
+            'cancelled': len(cancelled),
+            'cancelled_tokens': sum(call['input_tokens'] + call['output_tokens'] for call in cancelled),
+            'latency_p50_s': percentile(latencies, 0.5),
+            'latency_p95_s': percentile(latencies, 0.95),
+            'ttft_p50_s': percentile(ttfts, 0.5),
+            'ttft_p95_s': percentile(ttfts, 0.95),
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'tokens_per_accepted': (input_tokens + output_tokens) / accepted if accepted else None,
+            'cost_usd': round(cost, 4) if cost is not None else None,
+            'wall_s': round(time.perf_counter() - self.started, 3),
+        }
+
+    def format_summary(self):
+        """A few human readable lines summarizing the run"""
+        s = self.summary()
+
+        def seconds(value):
+            return f"{value:.2f}s" if value is not None else "-"
+
+        lines = [
+            f"{s['calls']} calls ({s['cache_hits']} cached, {s['errors']} failed or cancelled, {s['retries']} retries) "
+            f"in {s['wall_s']:.1f}s",
+            f"latency p50 {seconds(s['latency_p50_s'])} p95 {seconds(s['latency_p95_s'])}, "
+            f"first token p50 {seconds(s['ttft_p50_s'])} p95 {seconds(s['ttft_p95_s'])}",
+            f"tokens {s['input_tokens']} in / {s['output_tokens']} out"
+            + (f", ~${s['cost_usd']:.2f}" if s['cost_usd'] is not None else ""),
+        ]
+        if s['cancelled']:
+            lines.append(f"{s['cancelled']} calls cancelled early, {s['cancelled_tokens']} tokens spent on them")
+        if s['accepted'] or s['rejected'] or s['parse_failures']:
+            per_accepted = f"{s['tokens_per_accepted']:.0f}" if s['tokens_per_accepted'] is not None else "-"
+            lines.append(f"{s['accepted']} accepted, {s['rejected']} rejected, {s['parse_failures']} parse failures, "
+                         f"{per_accepted} tokens per accepted")
+        return '\n'.join(lines)
+
+    def close(self):
+        with self.lock:
+            if self.trace is not None:
+                self.trace.close()
+                self.trace = None
+
+
+class InstrumentedMessages:
+    """``client.messages`` of the ``anthropic`` SDK (or ``CachedMessages``) that records each ``create`` call"""
+
+    def __init__(self, messages, metrics):
+        self.messages = messages
+        self.metrics = metrics
+
+    def create(self, **kwargs):
+        start = time.perf_counter()
+        try:
+            message = self.messages.create(**kwargs)
+        except Exception as e:
+            self.metrics.record_call(kwargs.get('model', ''), time.perf_counter() - start, error=type(e).__name__)
+            raise
+        usage = message.usage
+        self.metrics.record_call(
+            message.model, time.perf_counter() - start,
+            input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+            cache_hit=bool(getattr(message, 'cache_hit', False))
+        )
+        return message
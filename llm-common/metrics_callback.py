@@ -0,0 +1,88 @@
+import asyncio
+import math
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# 估算被取消的流的输出 token 数时，每个 token 平均对应的字符数
+CHARS_PER_TOKEN = 4
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callback that feeds every chat model call into an ``LLMMetrics``.
+
+    Only timestamps and usage metadata are looked at; prompts and replies are
+    never formatted or printed. ``run_inline`` keeps async runs from
+    dispatching each callback to a thread pool.
+    """
+
+    run_inline = True
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.runs = {}
+        # 模型内部又调用的模型（例如 CachedChatModel 包着的模型），只记外层一次
+        self.nested = set()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None,
+                            invocation_params=None, **kwargs):
+        if parent_run_id in self.runs or parent_run_id in self.nested:
+            self.nested.add(run_id)
+            return
+        params = invocation_params or {}
+        model = (metadata or {}).get('ls_model_name') or params.get('model') or params.get('model_name') or ''
+        self.runs[run_id] = {'model': model, 'start': time.perf_counter(), 'first_token': None,
+                             'input_tokens': 0, 'output_tokens': 0, 'chars': 0, 'cache_hit': False}
+
+    def on_llm_new_token(self, token, *, chunk=None, run_id, **kwargs):
+        run = self.runs.get(run_id)
+        if run is None:
+            return
+        # 开头的 chunk 可能只带用量没有文字，首 token 时间从第一段文字算
+        if token and run['first_token'] is None:
+            run['first_token'] = time.perf_counter()
+        run['chars'] += len(token)
+        # 流式输出的用量分散在各个 chunk 里（输入在开头，输出在结尾），
+        # 先累计下来，流被提前取消时仍知道已经花了多少
+        message = getattr(chunk, 'message', None)
+        if message is not None:
+            usage = message.usage_metadata or {}
+            run['input_tokens'] += usage.get('input_tokens', 0)
+            run['output_tokens'] += usage.get('output_tokens', 0)
+            run['cache_hit'] = run['cache_hit'] or bool(message.response_metadata.get('cache_hit'))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self.nested.discard(run_id)
+        run = self.runs.pop(run_id, None)
+        if run is None:
+            return
+        now = time.perf_counter()
+        input_tokens = output_tokens = 0
+        cache_hit = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                usage = getattr(message, 'usage_metadata', None) or {}
+                input_tokens += usage.get('input_tokens', 0)
+                output_tokens += usage.get('output_tokens', 0)
+                cache_hit = cache_hit or bool(message is not None and message.response_metadata.get('cache_hit'))
+        first_token = run['first_token']
+        self.metrics.record_call(run['model'], now - run['start'],
+                                 first_token - run['start'] if first_token is not None else None,
+                                 input_tokens, output_tokens, cache_hit)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.nested.discard(run_id)
+        run = self.runs.pop(run_id, None)
+        if run is None:
+            return
+        latency = time.perf_counter() - run['start']
+        # 调用方提前关闭流（例如输出格式错误）时收到的是 GeneratorExit
+        if not isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+            self.metrics.record_call(run['model'], latency, error=type(error).__name__)
+            return
+        # 取消时输出用量还没发过来，按已收到的字符数估算；已生成的部分照样计费
+        output_tokens = run['output_tokens'] or math.ceil(run['chars'] / CHARS_PER_TOKEN)
+        first_token = run['first_token']
+        self.metrics.record_call(run['model'], latency, first_token - run['start'] if first_token is not None else None,
+                                 run['input_tokens'], output_tokens, run['cache_hit'], error='cancelled')
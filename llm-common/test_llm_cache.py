@@ -0,0 +1,157 @@
+import asyncio
+import os
+import tempfile
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from anthropic.types import Message
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from cached_chat_model import CachedChatModel
+from llm_cache import CacheMiss, CachedMessages, ResponseCache, make_key, request_scope
+
+
+class TempCacheMixin:
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'llm.db')
+        self.caches = []
+
+    def tearDown(self):
+        for cache in self.caches:
+            cache.close()
+        self.tmp.cleanup()
+
+    def open_cache(self, **kwargs):
+        cache = ResponseCache(self.path, **kwargs)
+        self.caches.append(cache)
+        return cache
+
+
+class TestResponseCache(TempCacheMixin, TestCase):
+    def test_round_trip_and_persistence(self):
+        cache = self.open_cache()
+        key = make_key("model", {"temperature": 0}, "prompt")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "model", {"content": "answer"})
+        self.assertEqual(self.open_cache().get(key), {"content": "answer"})
+
+    def test_key_covers_model_params_and_prompt(self):
+        keys = {make_key("a", {"t": 0}, "p"), make_key("b", {"t": 0}, "p"),
+                make_key("a", {"t": 1}, "p"), make_key("a", {"t": 0}, "q")}
+        self.assertEqual(len(keys), 4)
+
+    def test_repeated_requests_get_their_own_entries(self):
+        cache = self.open_cache()
+        first, second = (cache.request_key("m", {}, "p") for _ in range(2))
+        self.assertNotEqual(first, second)
+        # 新进程里同样的请求序列得到同样的 key
+        reopened = self.open_cache()
+        self.assertEqual([reopened.request_key("m", {}, "p") for _ in range(2)], [first, second])
+
+    def test_scopes_count_occurrences_separately(self):
+        cache = self.open_cache()
+        unscoped = cache.request_key("m", {}, "p")
+        token = request_scope.set("slot:3")
+        try:
+            scoped = cache.request_key("m", {}, "p")
+        finally:
+            request_scope.reset(token)
+        self.assertNotEqual(scoped, unscoped)
+        self.assertEqual(scoped, make_key("m", {}, "p", 0, "slot:3"))
+        self.assertEqual(unscoped, make_key("m", {}, "p"))
+
+    def test_expired_entries_are_misses(self):
+        cache = self.open_cache(ttl=60)
+        cache.put("key", "m", "value")
+        with patch('llm_cache.time.time', return_value=time.time() + 120):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()['expired'], 1)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.open_cache(max_bytes=250)
+        for key in ("a", "b", "c"):
+            cache.put(key, "m", "x" * 100)
+            time.sleep(0.01)
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+class FakeAnthropic:
+    def __init__(self):
+        self.calls = 0
+        self.messages = self
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return Message(id=f"msg_{self.calls}", type="message", role="assistant", model=kwargs['model'],
+                       content=[{"type": "text", "text": f"reply {self.calls}"}], stop_reason="end_turn",
+                       usage={"input_tokens": 10, "output_tokens": 5})
+
+
+class TestCachedMessages(TempCacheMixin, TestCase):
+    REQUEST = {"model": "claude", "max_tokens": 10, "temperature": 0,
+               "messages": [{"role": "user", "content": "hello"}]}
+
+    def test_second_run_is_served_from_cache(self):
+        client = FakeAnthropic()
+        self.assertEqual(CachedMessages(client, self.open_cache()).create(**self.REQUEST).content[0].text, "reply 1")
+
+        replayed = CachedMessages(client, self.open_cache()).create(**self.REQUEST)
+        self.assertIsInstance(replayed, Message)
+        self.assertEqual(replayed.content[0].text, "reply 1")
+        self.assertEqual(client.calls, 1)
+
+    def test_offline_mode_never_calls_the_provider(self):
+        client = FakeAnthropic()
+        CachedMessages(client, self.open_cache()).create(**self.REQUEST)
+        offline = CachedMessages(client, self.open_cache(), offline=True)
+        other = dict(self.REQUEST, messages=[{"role": "user", "content": "something else"}])
+        self.assertEqual(offline.create(**other).content[0].text, "reply 1")
+        with self.assertRaises(CacheMiss):
+            offline.create(**dict(self.REQUEST, model="unrecorded"))
+        self.assertEqual(client.calls, 1)
+
+
+class TestCachedChatModel(TempCacheMixin, TestCase):
+    def wrap(self, offline=False, responses=("one", "two")):
+        return CachedChatModel(inner=FakeListChatModel(responses=list(responses)), response_cache=self.open_cache(),
+                               offline=offline)
+
+    def test_record_then_replay(self):
+        recording = self.wrap()
+        self.assertEqual([recording.invoke("hi").content for _ in range(2)], ["one", "two"])
+
+        replay = self.wrap()
+        with patch.object(FakeListChatModel, '_call', side_effect=AssertionError("provider called")):
+            messages = [replay.invoke("hi") for _ in range(2)]
+        self.assertEqual([m.content for m in messages], ["one", "two"])
+        self.assertTrue(all(m.response_metadata['cache_hit'] for m in messages))
+
+    def test_offline_fake_answers_unrecorded_prompts(self):
+        self.wrap().invoke("hi")
+        offline = self.wrap(offline=True)
+        with patch.object(FakeListChatModel, '_call', side_effect=AssertionError("provider called")):
+            self.assertEqual(offline.invoke("a prompt that was never sent").content, "one")
+
+    def test_only_complete_streams_are_cached(self):
+        async def consume(model, stop_after=None):
+            chunks = model.astream("hi")
+            text = ""
+            try:
+                async for chunk in chunks:
+                    text += chunk.content
+                    if stop_after and len(text) >= stop_after:
+                        break
+            finally:
+                await chunks.aclose()
+            return text
+
+        model = self.wrap(responses=["a long streamed reply"])
+        self.assertEqual(asyncio.run(consume(model, stop_after=3)), "a l")
+        self.assertEqual(model.response_cache.stats()['entries'], 0)
+        self.assertEqual(asyncio.run(consume(model)), "a long streamed reply")
+        self.assertEqual(model.response_cache.stats()['entries'], 1)
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.prompts import PromptTemplate
+
+from cached_chat_model import CachedChatModel
+
+from llm_metrics import InstrumentedMessages, LLMMetrics, percentile
+from metrics_callback import MetricsCallbackHandler
+from test_llm_cache import FakeAnthropic, TempCacheMixin
+
+
+class TestLLMMetrics(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.95), 95)
+        self.assertEqual(percentile([3.0], 0.95), 3.0)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_summary_and_trace(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.jsonl')
+            metrics = LLMMetrics(trace_path=path)
+            metrics.record_call("claude-3-5-sonnet-20241022", 1.0, ttft=0.2, input_tokens=1000, output_tokens=200)
+            metrics.record_call("claude-3-5-sonnet-20241022", 3.0, ttft=0.4, input_tokens=1000, output_tokens=200)
+            metrics.record_call("claude-3-5-sonnet-20241022", 0.01, input_tokens=1000, output_tokens=200,
+                                cache_hit=True)
+            metrics.record_call("claude-3-5-sonnet-20241022", 0.5, error="RateLimitError")
+            metrics.record_event('retries')
+            metrics.record_event('accepted', 2)
+            metrics.close()
+
+            with open(path, encoding='utf-8') as f:
+                events = [json.loads(line)['event'] for line in f]
+        self.assertEqual(events, ["call"] * 4 + ["retries", "accepted"])
+
+        summary = metrics.summary()
+        self.assertEqual((summary['calls'], summary['errors'], summary['cache_hits']), (4, 1, 1))
+        self.assertEqual(summary['latency_p95_s'], 3.0)
+        self.assertEqual(summary['ttft_p50_s'], 0.2)
+        # 缓存命中不计 token 和费用
+        self.assertEqual((summary['input_tokens'], summary['output_tokens']), (2000, 400))
+        self.assertEqual(summary['tokens_per_accepted'], 1200)
+        self.assertAlmostEqual(summary['cost_usd'], 0.012)
+        self.assertIn("1 retries", metrics.format_summary())
+
+
+class UsageStreamingModel(GenericFakeChatModel):
+    """Streams like ChatAnthropic: input tokens arrive on an empty first chunk, output tokens on an empty last one"""
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata={"input_tokens": 12, "output_tokens": 0, "total_tokens": 12}))
+        yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", usage_metadata={"input_tokens": 0, "output_tokens": 4, "total_tokens": 4}))
+
+
+class TestMetricsCallbackHandler(TestCase):
+    def test_streamed_call_records_first_token_and_usage(self):
+        metrics = LLMMetrics()
+        model = UsageStreamingModel(messages=iter([AIMessage(content="a streamed reply")]))
+        text = "".join(chunk.content for chunk in model.stream("hi", config={"callbacks": [
+            MetricsCallbackHandler(metrics)]}))
+        self.assertEqual(text, "a streamed reply")
+
+        call, = metrics.calls
+        self.assertIsNotNone(call['ttft_s'])
+        self.assertLessEqual(call['ttft_s'], call['latency_s'])
+        self.assertEqual((call['input_tokens'], call['output_tokens']), (12, 4))
+
+    def test_parse_aborted_stream_still_counts_as_billed(self):
+        metrics = LLMMetrics()
+        model = UsageStreamingModel(messages=iter([AIMessage(content="not json at all, the caller gives up here")]))
+        chunks = model.stream("hi", config={"callbacks": [MetricsCallbackHandler(metrics)]})
+        streamed = ""
+        for chunk in chunks:
+            streamed += chunk.content
+            if len(streamed) >= 16:
+                break
+        chunks.close()
+
+        call, = metrics.calls
+        self.assertEqual(call['error'], 'cancelled')
+        # 输入用量来自第一个 chunk，输出按已收到的文字估算
+        self.assertEqual(call['input_tokens'], 12)
+        self.assertEqual(call['output_tokens'], 4)
+        metrics.record_event('accepted')
+        summary = metrics.summary()
+        self.assertEqual((summary['cancelled'], summary['cancelled_tokens']), (1, 16))
+        self.assertEqual((summary['input_tokens'], summary['output_tokens']), (12, 4))
+        self.assertEqual(summary['tokens_per_accepted'], 16)
+        self.assertIn("1 calls cancelled early, 16 tokens", metrics.format_summary())
+
+
+class TestCachedModelMetrics(TempCacheMixin, TestCase):
+    def test_wrapped_model_is_recorded_once(self):
+        metrics = LLMMetrics()
+        chain = PromptTemplate.from_template("hi {name}") | CachedChatModel(
+            inner=UsageStreamingModel(messages=iter([AIMessage(content="reply")])), response_cache=self.open_cache())
+        text = "".join(chunk.content for chunk in chain.stream({"name": "x"}, config={"callbacks": [
+            MetricsCallbackHandler(metrics)]}))
+        self.assertEqual(text, "reply")
+        call, = metrics.calls
+        self.assertEqual((call['input_tokens'], call['output_tokens']), (12, 4))
+
+
+class TestInstrumentedMessages(TestCase):
+    def test_usage_is_recorded(self):
+        metrics = LLMMetrics()
+        messages = InstrumentedMessages(FakeAnthropic().messages, metrics)
+        messages.create(model="claude", max_tokens=10, messages=[{"role": "user", "content": "hello"}])
+        summary = metrics.summary()
+        self.assertEqual((summary['calls'], summary['input_tokens'], summary['output_tokens']), (1, 10, 5))
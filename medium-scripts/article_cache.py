@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+logger = logging.getLogger('MediumConverter')
+
+# Medium 在分享链接里附带的跟踪参数，不影响文章内容
+TRACKING_PARAMS = {'source', 'sk', 'gi', 'fbclid', 'gclid'}
+# 文件名只保留安全字符
+UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def normalize_url(url):
+    """Normalize an article URL so that equivalent links share one cache key"""
+    parsed = urlparse(url.strip())
+    netloc = parsed.netloc.lower()
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    path = parsed.path.rstrip('/') or '/'
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name not in TRACKING_PARAMS and not name.startswith('utm_')
+    )
+    return urlunparse(((parsed.scheme or 'https').lower(), netloc, path, '', urlencode(query), ''))
+
+
+def article_filename(url, ext='.md'):
+    """File name for an article: the last path segment of its URL (Medium's slug-id)"""
+    segments = [segment for segment in urlparse(url).path.split('/') if segment]
+    name = UNSAFE_FILENAME_CHARS.sub('-', segments[-1] if segments else 'index').strip('-.')
+    return f"{name or 'article'}{ext}"
+
+
+class ArticleCache:
+    """Persistent SQLite cache of fetched articles and their converted markdown.
+
+    Entries younger than ``ttl`` seconds are served as-is. Older entries keep
+    their ETag/Last-Modified validators so the caller can revalidate them with
+    a conditional GET. The total stored size is bounded by ``max_bytes``; the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(self, path="cache/articles.db", max_bytes=256 * 1024 * 1024, ttl=3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'revalidations': 0, 'refreshes': 0, 'evictions': 0}
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                url TEXT PRIMARY KEY,
+                html TEXT NOT NULL,
+                markdown TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS articles_last_access ON articles (last_access)")
+        self.db.commit()
+        logger.info(f"Article cache opened: {path}")
+
+    def get(self, url):
+        """Return the cached entry for a URL as a dict, or None"""
+        key = normalize_url(url)
+        with self.lock:
+            row = self.db.execute("SELECT * FROM articles WHERE url = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE articles SET last_access = ? WHERE url = ?", (time.time(), key))
+            self.db.commit()
+        entry = dict(row)
+        entry['fresh'] = time.time() - entry['fetched_at'] < self.ttl
+        return entry
+
+    def put(self, url, html, markdown, etag=None, last_modified=None):
+        """Store a converted article, then evict old entries if the cache is over its size limit"""
+        key = normalize_url(url)
+        now = time.time()
+        size = len(html.encode('utf-8')) + len(markdown.encode('utf-8'))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, html, markdown, etag, last_modified, now, now, size)
+            )
+            self.evict()
+            self.db.commit()
+
+    def mark_revalidated(self, url, etag=None, last_modified=None):
+        """Reset the freshness of an entry after the origin answered 304 Not Modified"""
+        key = normalize_url(url)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "UPDATE articles SET fetched_at = ?, last_access = ?,"
+                " etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (now, now, etag, last_modified, key)
+            )
+            self.db.commit()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes (lock must be held)"""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM articles").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute("SELECT url, size FROM articles ORDER BY last_access").fetchall()
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM articles WHERE url = ?", (row['url'],))
+            total -= row['size']
+            self.counters['evictions'] += 1
+            logger.info(f"Evicted cached article: {row['url']}")
+
+    def record(self, counter):
+        """Increment one of the hit/miss/revalidation counters"""
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self):
+        """Return counters plus the current number of entries and stored bytes"""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM articles").fetchone()
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses'] + stats['revalidations'] + stats['refreshes']
+        stats.update({
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'hit_ratio': (stats['hits'] + stats['revalidations']) / lookups if lookups else 0.0,
+            'db_size': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        })
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,88 @@
+"""Compare the legacy string-concatenation + six-regex cleaner with the block builder and fused cleaner.
+
+Usage: python benchmarks/bench_clean.py [--sections 300] [--repeat 5]
+
+Blocks are produced once from a large synthetic article with Medium-sized
+paragraphs, code, lists and captioned figures; only output assembly and
+cleaning are timed. Peak memory is the tracemalloc peak of
+one run, i.e. the intermediate copies each approach allocates.
+"""
+import argparse
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from medium_to_markdown import MediumToMarkdown  # noqa: E402
+
+SENTENCE = "Back-pressure keeps the producer honest when consumers fall behind, and it is cheap to add. "
+
+
+def build_section(index):
+    code = "\n".join(f"    results <- process(job{line})  # step {line}" for line in range(15))
+    return (
+        f"<h2>Section {index}</h2>"
+        + "".join(f"<p>{SENTENCE * 5}</p>" for _ in range(5))
+        + f'<figure><img src="https://miro.medium.com/v2/1*{index}.png" alt="Figure {index}">'
+        + f"<figcaption>Figure {index} caption</figcaption></figure>"
+        + f'<pre><code class="language-go">for job := range jobs {{\n{code}\n}}</code></pre>'
+        + "<ul>" + "".join(f"<li>{SENTENCE}</li>" for _ in range(5)) + "</ul>"
+    )
+
+
+def legacy_clean(content):
+    """clean_markdown as it was before the fused single-pass cleaner"""
+    content = re.sub(r'\n{4,}', '\n\n\n', content)
+    content = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', content)
+    content = re.sub(r'(\n#{1,6}.*)\n([^\n])', r'\1\n\n\2', content)
+    content = re.sub(r'\n\*\s*\n', '\n', content)
+    content = re.sub(r'(!\[.*?\].*?\))(\n\*.*?\*)', r'\1\n\2', content)
+    content = '\n'.join(line.rstrip() for line in content.split('\n'))
+    return content.strip()
+
+
+def legacy_build(blocks):
+    markdown_content = ""
+    for block in blocks:
+        markdown_content += block
+    return legacy_clean(markdown_content)
+
+
+def measure(func, blocks, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(blocks)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(blocks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=300, help="number of article sections")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    converter = MediumToMarkdown(image_dir=tempfile.mkdtemp())
+    html = "<html><body><article><h1>Benchmark</h1>" + "".join(map(build_section, range(args.sections))) + "</article></body></html>"
+    with mock.patch.object(MediumToMarkdown, 'fetch_image', lambda self, url, timer=None: 'images/image.png'):
+        blocks = [block for _, block in converter.iter_content(html)]
+    size_mb = sum(map(len, blocks)) / (1024 * 1024)
+    print(f"{len(blocks)} blocks, {size_mb:.2f} MB of markdown")
+
+    for name, func in (('legacy', legacy_build), ('fused', converter.join_blocks)):
+        seconds, peak = measure(func, blocks, args.repeat)
+        print(f"{name:<8} {seconds * 1000:8.1f}ms  {size_mb / seconds:7.1f} MB/s  peak {peak / (1024 * 1024):6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Measure extract_content time as wrapper nesting depth grows.
+
+Usage: python benchmarks/bench_nesting.py [--depths 10 100 400 800] [--repeat 5]
+
+The article body is the same at every depth; only the number of wrapping
+<div> elements changes, so conversion time should stay roughly flat.
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from medium_to_markdown import MediumToMarkdown  # noqa: E402
+
+
+def build_document(depth, paragraphs=20):
+    body = "".join(f"<p>Paragraph {i} with some text.</p>" for i in range(paragraphs))
+    return f"<html><body><article><h1>Title</h1>{'<div>' * depth}{body}{'</div>' * depth}</article></body></html>"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[10, 100, 400, 800])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    converter = MediumToMarkdown(image_dir=tempfile.mkdtemp())
+    with mock.patch.object(MediumToMarkdown, 'fetch_image', lambda self, url, timer=None: 'images/image.png'):
+        for depth in args.depths:
+            html = build_document(depth)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                converter.extract_content(html)
+                timings.append(time.perf_counter() - start)
+            print(f"depth={depth:<6} best={min(timings) * 1000:8.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
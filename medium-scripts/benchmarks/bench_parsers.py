@@ -0,0 +1,73 @@
+"""Compare extract_content throughput and peak RSS across parser backends.
+
+Usage: python benchmarks/bench_parsers.py [--sections 50] [--repeat 5]
+
+Each backend runs in its own child process so that the reported peak RSS
+(ru_maxrss) belongs to that backend alone.
+"""
+import argparse
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from medium_to_markdown import PARSER_BACKENDS, MediumToMarkdown, parser_available  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'fixtures'
+
+
+def build_document(sections):
+    """A large page: the basic fixture's article body repeated, plus Medium-like page chrome"""
+    basic = (FIXTURES / 'basic.html').read_text(encoding='utf-8')
+    body = basic[basic.index('<section>'):basic.index('</article>')]
+    # Medium 页面在正文之外有体积很大的内联状态脚本和大量导航/推荐节点
+    state = "<script>window.__APOLLO_STATE__ = {" + '"k": "v",' * 100_000 + "};</script>"
+    chrome = "<div class='nav'><a href='/'>link</a><span>more</span></div>" * 2000
+    return f"<html><head>{state}</head><body>{chrome}<article>{body * sections}</article>{chrome}</body></html>"
+
+
+def run_backend(backend, html, repeat, results):
+    converter = MediumToMarkdown(image_dir=tempfile.mkdtemp(), parser=backend, max_tree_nodes=None)
+    with mock.patch.object(MediumToMarkdown, 'fetch_image', lambda self, url, timer=None: 'images/image.png'):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            converter.extract_content(html)
+            timings.append(time.perf_counter() - start)
+    results[backend] = {
+        'best_seconds': min(timings),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=50, help="times the article body is repeated")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    html = build_document(args.sections)
+    size_mb = len(html.encode('utf-8')) / (1024 * 1024)
+    print(f"document size: {size_mb:.2f} MB")
+
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Manager().dict()
+    for backend in PARSER_BACKENDS:
+        if not parser_available(backend):
+            print(f"{backend:<12} skipped (not installed)")
+            continue
+        process = ctx.Process(target=run_backend, args=(backend, html, args.repeat, results))
+        process.start()
+        process.join()
+        stats = results[backend]
+        print(f"{backend:<12} {size_mb / stats['best_seconds']:7.2f} MB/s "
+              f"{1 / stats['best_seconds']:7.2f} docs/s  peak RSS {stats['peak_rss_mb']:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""End-to-end benchmark of convert() against a local HTTP stand-in for Medium.
+
+Usage: python benchmarks/bench_pipeline.py [--repeat 20] [--output results.json]
+                                           [--compare baseline.json] [--threshold 0.15]
+
+The corpus (small, image_heavy, code_heavy, deeply_nested) is built
+deterministically from the fixtures and served, together with its images,
+by a local server, so results do not depend on the network. Every document
+is converted ``--repeat`` times with a fresh image directory; the report
+holds end-to-end and per-stage latency percentiles, throughput and peak
+memory as JSON. ``--compare`` diffs the run against a saved report (e.g.
+from another commit) on stderr and exits with status 1 if the p50 of any
+document's total time regressed by more than ``--threshold``.
+"""
+import argparse
+import json
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fetcher import Fetcher  # noqa: E402
+from image_store import ImageStore  # noqa: E402
+from medium_to_markdown import MediumToMarkdown  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'fixtures'
+STAGES = ('fetch', 'parse', 'find_all_images', 'download_image', 'clean', 'total')
+IMAGE_HOST = 'https://miro.medium.com/'
+# 语料里的图片地址（Medium 图片域名或站内相对路径），提供服务前改写到本地替身
+IMAGE_REFERENCE = re.compile(r'''(src="|url\(')(?:https://[\w.-]*medium\.com)?/''')
+
+
+def article_body(name):
+    html = (FIXTURES / name).read_text(encoding='utf-8')
+    return html[html.index('<article>') + len('<article>'):html.index('</article>')]
+
+
+def page(body):
+    # 模拟 Medium 页面：正文外有导航等页面骨架
+    chrome = "<div class='nav'><a href='/'>link</a><span>more</span></div>" * 200
+    return f"<html><head><title>Bench</title></head><body>{chrome}<article>{body}</article>{chrome}</body></html>"
+
+
+def build_corpus():
+    """Return ``{name: html}``; image URLs are rewritten to the stand-in when served"""
+    paragraphs = "".join(f"<p>Paragraph {i} explains one more detail of the system in plain words.</p>"
+                         for i in range(20))
+    figures = "".join(
+        f'<figure class="image-figure"><img src="{IMAGE_HOST}v2/resize:fit:700/1*bench{i}.png" alt="Figure {i}">'
+        f'<figcaption>Caption {i}</figcaption></figure><p>Text after figure {i}.</p>'
+        for i in range(40)
+    )
+    code = "".join(
+        f"<h3>Step {i}</h3><pre><code class=\"language-python\">"
+        + "\n".join(f"def step_{i}_{j}(x):\n    return x * {j}  # comment {j}\n" for j in range(15))
+        + "</code></pre><p>Run <code>step()</code> next.</p>"
+        for i in range(30)
+    )
+    nested = "<div>" * 400 + article_body('nested.html') * 10 + "</div>" * 400
+    return {
+        'small': (FIXTURES / 'basic.html').read_text(encoding='utf-8'),
+        'image_heavy': page(f"<h1>Image heavy</h1>{paragraphs}{figures}"),
+        'code_heavy': page(f"<h1>Code heavy</h1>{article_body('code.html')}{code}"),
+        'deeply_nested': page(nested),
+    }
+
+
+class StandInServer(ThreadingHTTPServer):
+    # 默认 backlog 只有 5，并发下载时 SYN 被丢弃会带来约 1 秒的重传延迟
+    request_queue_size = 128
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serve corpus pages at /article/<name> and fake images at /img/..."""
+    pages = {}
+    image_bytes = 20_000
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.path.startswith('/article/') and self.path[len('/article/'):] in self.pages:
+            self.reply('text/html; charset=utf-8', self.pages[self.path[len('/article/'):]])
+        elif self.path.startswith('/img/'):
+            # 内容随路径变化，保证每张图片都真正写入而不是被内容去重
+            header = b'\x89PNG\r\n\x1a\n' + self.path.encode()
+            self.reply('image/png', header + b'\0' * max(0, self.image_bytes - len(header)))
+        else:
+            self.reply('text/plain', b'not found', status=404)
+
+    def reply(self, content_type, body, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))]
+
+
+def summarize(values):
+    return {
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'mean': sum(values) / len(values),
+        'min': min(values),
+    }
+
+
+def run_document(converter, url, size, repeat, workdir):
+    runs = []
+    for _ in range(repeat):
+        # 每次使用新的图片目录，图片都要重新下载，而不是命中上一轮的索引
+        converter.images = ImageStore(tempfile.mkdtemp(dir=workdir))
+        converter.image_dir = converter.images.image_dir
+        timings = {}
+        converter.convert(url, timings=timings)
+        runs.append(timings)
+
+    stages = {stage: summarize([run.get(stage, 0.0) for run in runs]) for stage in STAGES}
+    total_p50 = stages['total']['p50']
+
+    # 内存单独测一次：tracemalloc 会拖慢计时
+    converter.images = ImageStore(tempfile.mkdtemp(dir=workdir))
+    converter.image_dir = converter.images.image_dir
+    tracemalloc.start()
+    converter.convert(url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'html_bytes': size,
+        'runs': repeat,
+        'stages': stages,
+        'throughput': {
+            'docs_per_second': 1 / total_p50 if total_p50 else None,
+            'mb_per_second': size / (1024 * 1024) / total_p50 if total_p50 else None,
+            'parse_mb_per_second': (size / (1024 * 1024) / stages['parse']['p50']
+                                    if stages['parse']['p50'] else None),
+        },
+        'peak_python_memory_bytes': peak,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Print p50 changes against a baseline report and return the regressions beyond threshold"""
+    regressions = []
+    print(f"compared with {baseline['meta'].get('commit')} (p50, + is slower)", file=sys.stderr)
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        for stage in STAGES:
+            before, after = old['stages'][stage]['p50'], result['stages'][stage]['p50']
+            if not before:
+                continue
+            change = (after - before) / before
+            marker = ' REGRESSION' if change > threshold and stage == 'total' else ''
+            print(f"  {name:<14} {stage:<16} {before * 1000:9.2f}ms -> {after * 1000:9.2f}ms {change:+7.1%}{marker}",
+                  file=sys.stderr)
+            if marker:
+                regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--parser', default='html.parser', help="HTML parser backend")
+    parser.add_argument('--image-bytes', type=int, default=20_000, help="size of each served image")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds the stand-in waits per request")
+    parser.add_argument('--documents', nargs='+', help="only run these corpus documents")
+    parser.add_argument('--output', help="write the JSON report to this file (default: stdout)")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    parser.add_argument('--threshold', type=float, default=0.15, help="allowed p50 slowdown of total (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    netloc = f"127.0.0.1:{server.server_port}"
+    corpus = build_corpus()
+    if args.documents:
+        corpus = {name: corpus[name] for name in args.documents}
+    StandInHandler.pages = {
+        name: IMAGE_REFERENCE.sub(rf"\1http://{netloc}/img/", html).encode('utf-8') for name, html in corpus.items()
+    }
+    StandInHandler.image_bytes = args.image_bytes
+    StandInHandler.latency = args.latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        converter = MediumToMarkdown(image_dir=workdir, parser=args.parser)
+        # 本地替身不需要限速，否则测到的是令牌桶而不是转换流程
+        converter.fetcher = Fetcher(converter.session, host_limits={netloc: (1e6, 1_000_000)})
+        results = {}
+        for name, body in StandInHandler.pages.items():
+            results[name] = run_document(converter, f"http://{netloc}/article/{name}", len(body), args.repeat, workdir)
+            print(f"{name:<14} p50 {results[name]['stages']['total']['p50'] * 1000:8.2f}ms "
+                  f"p99 {results[name]['stages']['total']['p99'] * 1000:8.2f}ms "
+                  f"{results[name]['throughput']['mb_per_second']:7.2f} MB/s", file=sys.stderr)
+        converter.session.close()
+    server.shutdown()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parser': args.parser,
+            'repeat': args.repeat,
+            'image_bytes': args.image_bytes,
+            'latency': args.latency,
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n', encoding='utf-8')
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
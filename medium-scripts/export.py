@@ -0,0 +1,175 @@
+import argparse
+import base64
+import logging
+import os
+import zipfile
+from pathlib import Path
+
+from image_store import CONTENT_TYPE_EXTENSIONS, IMAGE_REFERENCE
+
+logger = logging.getLogger('MediumConverter')
+
+EXPORT_FORMATS = {'zip': 'application/zip', 'markdown': 'text/markdown; charset=utf-8'}
+# 每次读取的图片字节数；3 的倍数保证分块 base64 编码后可以直接拼接
+CHUNK_SIZE = 3 * 64 * 1024
+MIME_TYPES = {ext: content_type for content_type, ext in CONTENT_TYPE_EXTENSIONS.items()}
+MIME_TYPES['.jpeg'] = 'image/jpeg'
+
+
+class ChunkSink:
+    """Write-only, unseekable file object that hands written bytes to a generator.
+
+    ``zipfile`` detects that it cannot seek and writes data descriptors
+    instead, so an archive can be produced front to back without buffering it.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def local_images(markdown_content, base_dirs):
+    """Map each local image reference in the markdown to an existing file.
+
+    References are tried relative to each of ``base_dirs`` in turn; remote and
+    missing images are left out.
+    """
+    found = {}
+    for ref in IMAGE_REFERENCE.findall(markdown_content):
+        if ref in found or '://' in ref or ref.startswith('data:'):
+            continue
+        for base in base_dirs:
+            path = os.path.join(base, ref)
+            if os.path.isfile(path):
+                found[ref] = path
+                break
+        else:
+            logger.warning(f"Image not found for export: {ref}")
+    return found
+
+
+def rewrite_images(markdown_content, replacements):
+    """Replace image references using a ``{ref: new_ref}`` mapping"""
+    def replace(match):
+        ref = match.group(1)
+        return match.group(0).replace(ref, replacements[ref]) if ref in replacements else match.group(0)
+
+    return IMAGE_REFERENCE.sub(replace, markdown_content)
+
+
+def iter_zip(markdown_content, name, base_dirs=('.',)):
+    """Yield a zip archive with ``<name>.md`` and its images under ``images/``.
+
+    Only one chunk of one image is in memory at a time. Images are stored
+    uncompressed (they already are compressed); the markdown is deflated.
+    """
+    images = local_images(markdown_content, base_dirs)
+    arcnames = {}
+    for ref, path in images.items():
+        arcname = f"images/{os.path.basename(path)}"
+        # 不同目录下的同名文件加序号区分
+        stem, ext = os.path.splitext(arcname)
+        index = 1
+        while arcname in arcnames.values():
+            arcname = f"{stem}-{index}{ext}"
+            index += 1
+        arcnames[ref] = arcname
+
+    sink = ChunkSink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        archive.writestr(f"{name}.md", rewrite_images(markdown_content, arcnames), zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+
+        written = set()
+        for ref, arcname in arcnames.items():
+            if arcname in written:
+                continue
+            written.add(arcname)
+            info = zipfile.ZipInfo(arcname)
+            info.compress_type = zipfile.ZIP_STORED
+            # 预先给出大小，zipfile 才能决定是否需要 ZIP64 头
+            info.file_size = os.path.getsize(images[ref])
+            with open(images[ref], 'rb') as src, archive.open(info, 'w') as dest:
+                while chunk := src.read(CHUNK_SIZE):
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_inline_markdown(markdown_content, base_dirs=('.',)):
+    """Yield the markdown with local images embedded as base64 data URIs, image by image"""
+    images = local_images(markdown_content, base_dirs)
+    position = 0
+    for match in IMAGE_REFERENCE.finditer(markdown_content):
+        ref = match.group(1)
+        if ref not in images:
+            continue
+        yield markdown_content[position:match.start(1)].encode('utf-8')
+        path = images[ref]
+        mime = MIME_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+        yield f"data:{mime};base64,".encode('ascii')
+        with open(path, 'rb') as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield base64.b64encode(chunk)
+        position = match.end(1)
+    yield markdown_content[position:].encode('utf-8')
+
+
+def iter_bundle(markdown_content, fmt, name='article', base_dirs=('.',)):
+    """Yield the bytes of an export bundle in the given format (``zip`` or ``markdown``)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (choose from {', '.join(EXPORT_FORMATS)})")
+    if fmt == 'zip':
+        return (chunk for chunk in iter_zip(markdown_content, name, base_dirs) if chunk)
+    return iter_inline_markdown(markdown_content, base_dirs)
+
+
+def write_bundle(chunks, path):
+    """Write a bundle to disk via a temporary file and an atomic rename; return its size"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    logger.info(f"Exported bundle to {path} ({size} bytes)")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a saved markdown article as a self-contained bundle")
+    parser.add_argument('markdown', help="markdown file written by the converter")
+    parser.add_argument('--format', default='zip', choices=sorted(EXPORT_FORMATS))
+    parser.add_argument('--output', help="bundle path (default: next to the markdown file)")
+    args = parser.parse_args()
+
+    source = Path(args.markdown)
+    markdown_content = source.read_text(encoding='utf-8')
+    output = args.output or str(source.with_suffix('.zip' if args.format == 'zip' else '.bundle.md'))
+    # 引用可能相对于 markdown 文件，也可能相对于生成时的工作目录
+    chunks = iter_bundle(markdown_content, args.format, source.stem, base_dirs=(str(source.parent), '.'))
+    print(f"{output}: {write_bundle(chunks, output)} bytes")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,209 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger('MediumConverter')
+
+# 这些状态码表示暂时性错误，值得重试
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# 每个主机的限速：(每秒请求数, 突发容量)；未列出的主机使用 default
+DEFAULT_HOST_LIMITS = {
+    'default': (10.0, 20),
+    'medium.com': (4.0, 8),
+    'miro.medium.com': (20.0, 40),
+}
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without sending a request while a host's circuit breaker is open"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a request may be sent"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 先预定令牌（允许为负），在锁外等待，避免持锁 sleep
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            wait = max(wait, self.paused_until - now)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hold back every request to this host for the given time (e.g. after a 429)"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """Stops requests to a host after repeated failures.
+
+    After ``threshold`` consecutive failures the circuit opens and requests
+    fail fast for ``reset_timeout`` seconds. Then one trial request is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_flight = False
+
+
+def parse_retry_after(value):
+    """Return the delay in seconds from a Retry-After header (seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class Fetcher:
+    """Shared HTTP GET layer with per-host rate limits, retries and circuit breakers.
+
+    Transient failures (connection errors, timeouts, 429 and 5xx) are retried
+    up to ``max_retries`` times with full-jitter exponential backoff; a
+    Retry-After header takes precedence and also pauses the host's bucket
+    for every other thread. The final response is returned as-is, so callers
+    keep using ``raise_for_status``.
+    """
+
+    def __init__(self, session, host_limits=None, max_retries=3, backoff=0.5, max_backoff=30,
+                 timeout=(5, 30), breaker_threshold=5, breaker_reset=30):
+        self.session = session
+        self.host_limits = dict(DEFAULT_HOST_LIMITS, **(host_limits or {}))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.buckets = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def host_state(self, host):
+        """Return the (TokenBucket, CircuitBreaker) pair of a host, creating it on first use"""
+        with self.lock:
+            if host not in self.buckets:
+                rate, burst = self.host_limits.get(host, self.host_limits['default'])
+                self.buckets[host] = TokenBucket(rate, burst)
+                self.breakers[host] = CircuitBreaker(self.breaker_threshold, self.breaker_reset)
+            return self.buckets[host], self.breakers[host]
+
+    def backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def get(self, url, timeout=None, **kwargs):
+        """Send a GET request through the host's rate limiter and circuit breaker"""
+        host = urlparse(url).netloc.lower()
+        bucket, breaker = self.host_state(host)
+        timeout = timeout or self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"Circuit open for {host}, not fetching {url}")
+            bucket.acquire()
+
+            try:
+                response = self.session.get(url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"GET {url} failed ({str(e)}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+            except requests.RequestException:
+                # 其他错误不重试，但必须结束半开状态的试探请求，否则熔断器永远不再放行
+                breaker.record_failure()
+                raise
+
+            if response.status_code not in RETRY_STATUSES:
+                breaker.record_success()
+                return response
+
+            # 429 是对方在限流，不算主机故障；5xx 计入熔断
+            if response.status_code == 429:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            # 对方要求的冷却期对所有线程生效，即使这个请求不再重试、直接返回 429
+            if response.status_code == 429 and retry_after is not None:
+                bucket.pause(retry_after)
+            if attempt == self.max_retries or (retry_after is not None and retry_after > self.max_backoff):
+                return response
+
+            delay = retry_after if retry_after is not None else self.backoff_delay(attempt)
+            if response.status_code == 429 and retry_after is None:
+                bucket.pause(delay)
+            logger.warning(f"GET {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
+
+    def stats(self):
+        """Return the circuit breaker state per host"""
+        with self.lock:
+            breakers = dict(self.breakers)
+        return {host: {'state': breaker.state, 'failures': breaker.failures} for host, breaker in breakers.items()}
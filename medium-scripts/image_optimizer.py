@@ -0,0 +1,227 @@
+import argparse
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from image_store import IMAGE_REFERENCE
+
+logger = logging.getLogger('MediumConverter')
+
+# 输出格式 -> (Pillow 格式名, 扩展名)
+OUTPUT_FORMATS = {'webp': ('WEBP', '.webp'), 'avif': ('AVIF', '.avif'), 'jpeg': ('JPEG', '.jpg')}
+# 矢量图和动图原样保留
+SKIPPED_EXTENSIONS = {'.svg', '.gif'}
+# 已处理过的文件名形如 <hash>.w1400.webp
+OPTIMIZED_NAME = re.compile(r'\.w\d+\.\w+$')
+
+
+def optimizer_available(fmt='webp'):
+    """Whether Pillow is installed and can encode the given output format"""
+    if importlib.util.find_spec('PIL') is None:
+        return False
+    from PIL import features
+
+    return fmt == 'jpeg' or bool(features.check(fmt))
+
+
+def optimized_name(path, fmt, max_width):
+    """Deterministic output name, so an image is only processed once per setting"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{stem}.w{max_width}{OUTPUT_FORMATS[fmt][1]}"
+
+
+def optimize_file(path, fmt='webp', max_width=1400, quality=80):
+    """Downsize and re-encode one image file; runs in a worker process.
+
+    Returns ``{"source", "path", "bytes_in", "bytes_out"}``. ``path`` is the
+    source itself when the image is skipped or re-encoding would not make it
+    smaller. Metadata (EXIF, ICC profiles, comments) is not carried over.
+    """
+    from PIL import Image, ImageOps
+
+    target = os.path.join(os.path.dirname(path), optimized_name(path, fmt, max_width))
+    if os.path.exists(target):
+        # 已处理过（原图可能已删除），直接复用
+        size = os.path.getsize(target)
+        return {"source": path, "path": target, "bytes_in": size, "bytes_out": size}
+
+    bytes_in = os.path.getsize(path)
+    result = {"source": path, "path": path, "bytes_in": bytes_in, "bytes_out": bytes_in}
+    if os.path.splitext(path)[1].lower() in SKIPPED_EXTENSIONS:
+        return result
+
+    with Image.open(path) as image:
+        if getattr(image, 'is_animated', False):
+            return result
+        # 去掉 EXIF 之前先按方向标记旋转，否则手机照片会横过来
+        image = ImageOps.exif_transpose(image)
+        if image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.LANCZOS)
+        if fmt == 'jpeg':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            # 不传 exif/icc_profile，元数据自然被去掉
+            image.save(tmp_path, OUTPUT_FORMATS[fmt][0], quality=quality)
+            bytes_out = os.path.getsize(tmp_path)
+            if bytes_out >= bytes_in:
+                os.remove(tmp_path)
+                return result
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    return {"source": path, "path": target, "bytes_in": bytes_in, "bytes_out": bytes_out}
+
+
+class ImageOptimizer:
+    """Resizes and re-encodes downloaded images on a process pool.
+
+    ``optimize`` blocks the calling (download) thread while the CPU-bound work
+    runs in another process, so images are processed in parallel with the
+    remaining downloads. With ``keep_originals=False`` the source file is
+    removed once a smaller version has been written.
+    """
+
+    def __init__(self, fmt='webp', max_width=1400, quality=80, keep_originals=True, workers=None):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown image format: {fmt} (choose from {', '.join(OUTPUT_FORMATS)})")
+        if not optimizer_available(fmt):
+            raise ValueError(f"Image optimization to {fmt} requires Pillow with {fmt} support")
+        self.fmt = fmt
+        self.max_width = max_width
+        self.quality = quality
+        self.keep_originals = keep_originals
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.lock = threading.Lock()
+        self.counters = {'images': 0, 'optimized': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0}
+
+    def get_executor(self):
+        # 进程池按需创建；服务是多线程的，用 spawn 而不是 fork 启动子进程
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+            return self.executor
+
+    def optimize(self, path):
+        """Return the path of the optimized version of an image file"""
+        target = os.path.join(os.path.dirname(path), optimized_name(path, self.fmt, self.max_width))
+        if os.path.exists(target):
+            return target
+
+        start = time.perf_counter()
+        result = self.get_executor().submit(optimize_file, path, self.fmt, self.max_width, self.quality).result()
+        self.record(result, time.perf_counter() - start)
+
+        if result['path'] != path and not self.keep_originals:
+            os.remove(path)
+        return result['path']
+
+    def optimize_many(self, paths):
+        """Process many files at once and return their results in order; originals are kept"""
+        executor = self.get_executor()
+        start = time.perf_counter()
+        futures = [executor.submit(optimize_file, path, self.fmt, self.max_width, self.quality) for path in paths]
+        results = [future.result() for future in futures]
+        for result in results:
+            self.record(result, 0.0)
+        with self.lock:
+            self.counters['seconds'] += time.perf_counter() - start
+        return results
+
+    def record(self, result, seconds):
+        with self.lock:
+            self.counters['images'] += 1
+            self.counters['optimized'] += result['path'] != result['source']
+            self.counters['bytes_in'] += result['bytes_in']
+            self.counters['bytes_out'] += result['bytes_out']
+            self.counters['seconds'] += seconds
+
+    def stats(self):
+        """Return processed image counts, bytes saved and throughput"""
+        with self.lock:
+            stats = dict(self.counters)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        stats['mb_per_second'] = stats['bytes_in'] / (1024 * 1024) / stats['seconds'] if stats['seconds'] else 0.0
+        return stats
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+
+
+def rewrite_references(markdown_path, renamed):
+    """Point image references in a markdown file at their optimized files"""
+    text = Path(markdown_path).read_text(encoding='utf-8')
+
+    def replace(match):
+        ref = match.group(1)
+        name = os.path.basename(ref)
+        if '://' in ref or name not in renamed:
+            return match.group(0)
+        return match.group(0).replace(ref, ref[:len(ref) - len(name)] + renamed[name])
+
+    updated = IMAGE_REFERENCE.sub(replace, text)
+    if updated != text:
+        Path(markdown_path).write_text(updated, encoding='utf-8')
+    return updated != text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Downsize and re-encode an existing image library")
+    parser.add_argument('--images', default='images', help="image directory (default: images)")
+    parser.add_argument('--markdown', nargs='*', default=[],
+                        help="markdown files or directories whose image references are rewritten")
+    parser.add_argument('--format', default='webp', choices=sorted(OUTPUT_FORMATS))
+    parser.add_argument('--max-width', type=int, default=1400)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--delete-originals', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    optimizer = ImageOptimizer(args.format, args.max_width, args.quality, workers=args.workers)
+    paths = [entry.path for entry in os.scandir(args.images)
+             if entry.is_file() and os.path.splitext(entry.name)[1].lower() in {'.jpg', '.jpeg', '.png', '.webp'}
+             and not OPTIMIZED_NAME.search(entry.name)]
+
+    renamed = {
+        os.path.basename(result['source']): os.path.basename(result['path'])
+        for result in optimizer.optimize_many(paths) if result['path'] != result['source']
+    }
+    optimizer.shutdown()
+
+    markdown_paths = []
+    for path in args.markdown:
+        markdown_paths.extend(Path(path).rglob('*.md') if os.path.isdir(path) else [Path(path)])
+    rewritten = sum(rewrite_references(path, renamed) for path in markdown_paths)
+
+    # 只有引用都改写完才删除原图
+    if args.delete_originals:
+        for name in renamed:
+            os.remove(os.path.join(args.images, name))
+
+    stats = optimizer.stats()
+    print(f"{stats['optimized']} of {stats['images']} images optimized, "
+          f"{stats['bytes_saved'] / (1024 * 1024):.1f} MB saved, {stats['mb_per_second']:.1f} MB/s, "
+          f"{rewritten} markdown files rewritten")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
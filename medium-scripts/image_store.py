@@ -0,0 +1,201 @@
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+
+logger = logging.getLogger('MediumConverter')
+
+MEDIUM_IMAGE_HOSTS = {'miro.medium.com', 'cdn-images-1.medium.com', 'cdn-images-2.medium.com'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg'}
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/svg+xml': '.svg',
+}
+# markdown 中的图片引用：![alt](path)
+IMAGE_REFERENCE = re.compile(r'!\[[^\]]*\]\(([^)\s]+)')
+
+
+def canonical_image_id(url):
+    """Collapse the size/format variants of one Medium image to a single asset id.
+
+    ``https://miro.medium.com/v2/resize:fit:700/format:webp/1*abc.png``,
+    ``https://miro.medium.com/max/1400/1*abc.png`` and
+    ``https://cdn-images-1.medium.com/fit/c/160/160/1*abc.png`` all map to
+    ``medium:1*abc.png``. Other URLs keep their host, path and query string:
+    elsewhere the query usually selects a different image (chart APIs, proxies).
+    """
+    parsed = urlparse(url)
+    host = parsed.netloc.lower()
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    if host in MEDIUM_IMAGE_HOSTS and segments:
+        # v2/resize:fit:700、max/800、fit/c/160/160 等都只是变换参数，最后一段才是资源 id
+        return f"medium:{segments[-1]}"
+    return f"{host}{parsed.path}?{parsed.query}" if parsed.query else f"{host}{parsed.path}"
+
+
+def image_extension(url, content_type=''):
+    """Pick a file extension from the response content type, falling back to the URL"""
+    ext = CONTENT_TYPE_EXTENSIONS.get(content_type.split(';')[0].strip().lower())
+    if ext:
+        return ext
+    ext = os.path.splitext(urlparse(url).path)[1].lower()
+    return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+
+class ImageStore:
+    """Content-addressed image files plus an index from canonical asset id to file.
+
+    Files are named by the sha256 of their bytes, so identical images are
+    stored once no matter how many URLs or asset ids point at them. The index
+    is kept in memory and persisted to ``index.json`` by ``flush``. A miss
+    never touches the filesystem; a hit costs one stat, so files removed by
+    ``gc`` in another process are dropped from the index instead of linked.
+    """
+
+    def __init__(self, image_dir="images"):
+        self.image_dir = image_dir
+        self.index_path = os.path.join(image_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.assets = {}
+        self.hashes = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.assets = data.get('assets', {})
+            self.hashes = data.get('hashes', {})
+            logger.info(f"Loaded image index with {len(self.assets)} assets")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to load image index {self.index_path}: {str(e)}")
+
+    def flush(self):
+        """Persist the index if it changed, via a temporary file and an atomic rename"""
+        # flush_lock 保证快照的先后顺序与写盘顺序一致，旧快照不会覆盖新快照
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                data = json.dumps({'assets': self.assets, 'hashes': self.hashes}, indent=1, sort_keys=True)
+                self.dirty = False
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+
+    def lookup(self, url):
+        """Return the local path of an already stored image, or None"""
+        asset_id = canonical_image_id(url)
+        with self.lock:
+            filename = self.assets.get(asset_id)
+        if not filename:
+            return None
+        path = os.path.join(self.image_dir, filename)
+        if os.path.exists(path):
+            return path
+        logger.info(f"Stored image {filename} is gone, dropping it from the index: {url}")
+        with self.lock:
+            # 同一个文件可能对应多个资源 id，全部去掉，下次 flush 也不会再写回
+            self.assets = {k: v for k, v in self.assets.items() if v != filename}
+            self.hashes = {k: v for k, v in self.hashes.items() if v != filename}
+            self.dirty = True
+        return None
+
+    def add(self, url, tmp_path, digest, ext):
+        """Move a fully downloaded temporary file into the store and return its path.
+
+        If a file with the same content already exists, the temporary file is
+        discarded and the existing file is reused.
+        """
+        asset_id = canonical_image_id(url)
+        with self.lock:
+            filename = self.hashes.get(digest)
+            if filename and os.path.exists(os.path.join(self.image_dir, filename)):
+                os.remove(tmp_path)
+                logger.info(f"Image content already stored as {filename}: {url}")
+            else:
+                filename = f"{digest}{ext}"
+                os.replace(tmp_path, os.path.join(self.image_dir, filename))
+                self.hashes[digest] = filename
+            self.assets[asset_id] = filename
+            self.dirty = True
+        return os.path.join(self.image_dir, filename)
+
+    def collect_garbage(self, markdown_paths, dry_run=False):
+        """Delete images that none of the given markdown files reference.
+
+        Returns the list of removed (or, with ``dry_run``, removable) paths.
+        """
+        referenced = set()
+        for markdown_path in markdown_paths:
+            base = Path(markdown_path).parent
+            try:
+                text = Path(markdown_path).read_text(encoding='utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping {markdown_path}: {str(e)}")
+                continue
+            for ref in IMAGE_REFERENCE.findall(text):
+                if '://' in ref:
+                    continue
+                # 引用可能相对于 markdown 文件，也可能相对于生成时的工作目录
+                for candidate in (base / ref, Path(ref)):
+                    referenced.add(os.path.abspath(candidate))
+
+        removed = []
+        for entry in os.scandir(self.image_dir):
+            if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            if os.path.abspath(entry.path) in referenced:
+                continue
+            removed.append(entry.path)
+            if not dry_run:
+                os.remove(entry.path)
+
+        if not dry_run and removed:
+            gone = {os.path.basename(path) for path in removed}
+            with self.lock:
+                self.assets = {k: v for k, v in self.assets.items() if v not in gone}
+                self.hashes = {k: v for k, v in self.hashes.items() if v not in gone}
+                self.dirty = True
+            self.flush()
+        logger.info(f"Image GC {'would remove' if dry_run else 'removed'} {len(removed)} files")
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the converter's image store")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    gc = subcommands.add_parser('gc', help="remove images that no saved markdown references")
+    gc.add_argument('--images', default='images', help="image directory (default: images)")
+    gc.add_argument('--markdown', nargs='+', default=['.'],
+                    help="markdown files or directories to scan recursively (default: .)")
+    gc.add_argument('--dry-run', action='store_true', help="only list the files that would be removed")
+    args = parser.parse_args()
+
+    markdown_paths = []
+    for path in args.markdown:
+        if os.path.isdir(path):
+            markdown_paths.extend(Path(path).rglob('*.md'))
+        else:
+            markdown_paths.append(Path(path))
+
+    for path in ImageStore(args.images).collect_garbage(markdown_paths, dry_run=args.dry_run):
+        print(path)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('MediumConverter')
+
+# 单个 URL 的状态
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+
+
+class BatchJob:
+    """A batch of URLs converted in the background, with per-URL progress"""
+
+    def __init__(self, urls):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cancelled = False
+        self.items = [
+            {"url": url, "status": PENDING, "markdown": None, "failed_images": [], "error": None}
+            for url in urls
+        ]
+        self.futures = []
+        self.lock = threading.Lock()
+
+    @property
+    def status(self):
+        statuses = {item['status'] for item in self.items}
+        if statuses & {PENDING, RUNNING}:
+            return 'cancelling' if self.cancelled else 'running'
+        if self.cancelled:
+            return CANCELLED
+        return FAILED if statuses == {FAILED} else DONE
+
+    def to_dict(self, include_markdown=True):
+        with self.lock:
+            items = [dict(item) for item in self.items]
+        if not include_markdown:
+            for item in items:
+                item.pop('markdown')
+        counts = {}
+        for item in items:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        return {
+            "id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "total": len(items),
+            "progress": counts,
+            "items": items,
+        }
+
+
+class JobManager:
+    """Runs batch conversions on a bounded worker pool shared by all jobs.
+
+    Finished jobs are kept in memory until more than ``max_jobs`` exist, then
+    the oldest finished ones are dropped.
+    """
+
+    def __init__(self, converter, max_workers=4, max_jobs=100):
+        self.converter = converter
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='batch-convert')
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, urls):
+        """Queue a batch of URLs and return the new job"""
+        job = BatchJob(urls)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.prune()
+        job.futures = [self.executor.submit(self.run_item, job, index) for index in range(len(urls))]
+        logger.info(f"Queued batch job {job.id} with {len(urls)} URLs")
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job: queued URLs are skipped, URLs already converting run to completion"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancelled = True
+        for index, future in enumerate(job.futures):
+            if future.cancel():
+                self.update(job, index, status=CANCELLED)
+        logger.info(f"Cancelled batch job {job.id}")
+        return job
+
+    def run_item(self, job, index):
+        if job.cancelled:
+            self.update(job, index, status=CANCELLED)
+            return
+        url = job.items[index]['url']
+        self.update(job, index, status=RUNNING)
+        failed_images = []
+        try:
+            markdown_content = self.converter.convert(url, failed_images=failed_images)
+            self.update(job, index, status=DONE, markdown=markdown_content, failed_images=failed_images)
+        except Exception as e:
+            logger.error(f"Batch job {job.id} failed for {url}: {str(e)}")
+            self.update(job, index, status=FAILED, error=str(e), failed_images=failed_images)
+
+    def update(self, job, index, **fields):
+        with job.lock:
+            job.items[index].update(fields)
+            if all(item['status'] not in (PENDING, RUNNING) for item in job.items):
+                job.finished_at = job.finished_at or time.time()
+
+    def prune(self):
+        """Drop the oldest finished jobs beyond max_jobs (lock must be held)"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at]
+        excess = len(self.jobs) - self.max_jobs
+        for job_id in finished[:max(0, excess)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
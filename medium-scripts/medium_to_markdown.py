@@ -1,24 +1,46 @@
 import hashlib
+import tempfile
 from pathlib import Path
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, Tag
 import markdown
 import re
 import logging
+import time
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, urljoin
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context
 from datetime import datetime
 import os
 from logging.handlers import RotatingFileHandler
 import json
 
+from article_cache import ArticleCache, article_filename, normalize_url
+from export import EXPORT_FORMATS, iter_bundle, write_bundle
+from fetcher import CircuitOpenError, Fetcher
+from image_optimizer import ImageOptimizer
+from image_store import ImageStore, canonical_image_id, image_extension
+from jobs import JobManager
+from metrics import ConverterMetrics, StageTimer
+from search_index import SearchIndex
+from singleflight import SingleFlight
+
+
+logger = logging.getLogger('MediumConverter')
+
 
 # Configure logging (same as before)
-def setup_logging():
-    log_dir = "logs"
+def setup_logging(log_dir="logs"):
+    """Attach the file and console handlers once, however often it is called"""
+    if logger.handlers:
+        return logger
+
     if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+        os.makedirs(log_dir, exist_ok=True)
 
     log_file = os.path.join(log_dir, f"medium_converter_{datetime.now().strftime('%Y%m%d')}.log")
 
@@ -34,7 +56,6 @@ def setup_logging():
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
 
-    logger = logging.getLogger('MediumConverter')
     logger.setLevel(logging.INFO)
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
@@ -42,25 +63,88 @@ def setup_logging():
     return logger
 
 
-logger = setup_logging()
+# 直接转换为 markdown 的块级元素；遇到它们时不再向下遍历
+BLOCK_TAGS = frozenset(['p', 'h1', 'h2', 'h3', 'h4', 'pre', 'blockquote', 'ul', 'ol'])
+
+# clean_block 删除的不可打印控制字符（保留 \t \n \r 和所有 Unicode 字符）
+CONTROL_CHARS = dict.fromkeys([*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F])
+IMAGE_LINE = re.compile(r'!\[.*?\].*\)$')
+
+# HTML 解析后端 -> 所需的第三方模块（None 表示标准库自带）
+PARSER_BACKENDS = {
+    'html.parser': None,
+    'lxml': 'lxml',
+    # 先用 selectolax (lexbor) 快速选出 <h1> 和 <article>，只为这部分构建 BeautifulSoup 树
+    'selectolax': 'selectolax',
+}
+
+
+class DocumentTooLargeError(ValueError):
+    """Raised when an article exceeds the configured document or tree size limits"""
+
+
+def parser_available(backend):
+    """Return True if the given parser backend can be used in this environment"""
+    if backend not in PARSER_BACKENDS:
+        return False
+    module = PARSER_BACKENDS[backend]
+    return module is None or importlib.util.find_spec(module) is not None
 
 
 class MediumAuthentication:
-    def __init__(self, cookie_file="medium_cookies.txt"):
+    """Medium session cookies shared by every request thread.
+
+    The parsed cookie dict is replaced, never mutated, so readers always see
+    a complete set. The cookie file is written atomically and re-read when
+    another process (e.g. a sibling worker) changes it.
+    """
+
+    def __init__(self, cookie_file="medium_cookies.txt", reload_interval=1.0):
         self.cookie_file = cookie_file
-        self.cookies = self.load_cookies()
+        self.reload_interval = reload_interval
+        self.lock = threading.Lock()
+        self.file_mtime = self.cookie_file_mtime()
+        self.checked_at = time.monotonic()
+        self._cookies = self.load_cookies()
+
+    @property
+    def cookies(self):
+        """Current cookies, reloaded first if the cookie file changed on disk"""
+        if time.monotonic() - self.checked_at >= self.reload_interval:
+            self.reload_if_changed()
+        return self._cookies
+
+    def cookie_file_mtime(self):
+        try:
+            return os.stat(self.cookie_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self):
+        """Reload the cookies if the cookie file was modified since it was last read"""
+        with self.lock:
+            self.checked_at = time.monotonic()
+            mtime = self.cookie_file_mtime()
+            if mtime == self.file_mtime:
+                return
+            self.file_mtime = mtime
+            self._cookies = self.load_cookies()
+
+    @staticmethod
+    def parse_cookies(cookie_string):
+        """Parse a browser cookie string into a dictionary"""
+        cookies = {}
+        for cookie in cookie_string.split(';'):
+            if '=' in cookie:
+                name, value = cookie.strip().split('=', 1)
+                cookies[name] = value
+        return cookies
 
     def load_cookies(self):
         """Load Medium cookies from file"""
         try:
             with open(self.cookie_file, 'r') as f:
-                cookie_string = f.read().strip()
-                cookies = {}
-                # Parse cookie string into dictionary
-                for cookie in cookie_string.split(';'):
-                    if '=' in cookie:
-                        name, value = cookie.strip().split('=', 1)
-                        cookies[name] = value
+                cookies = self.parse_cookies(f.read().strip())
                 logger.info("Successfully loaded Medium cookies")
                 return cookies
         except FileNotFoundError:
@@ -72,28 +156,31 @@ class MediumAuthentication:
 
     def save_cookies(self, cookie_string):
         """Save Medium cookies to file"""
+        # 先写临时文件再原子替换，其他进程不会读到写了一半的文件
+        tmp_path = f"{self.cookie_file}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
-            with open(self.cookie_file, 'w') as f:
+            with open(tmp_path, 'w') as f:
                 f.write(cookie_string)
+            os.replace(tmp_path, self.cookie_file)
             logger.info("Successfully saved Medium cookies")
             return True
         except Exception as e:
             logger.error(f"Failed to save cookies: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
 
     def update_cookies(self, cookie_string):
         """Update cookies from browser cookie string"""
         try:
-            # Save the raw cookie string
-            self.save_cookies(cookie_string)
-
             # Parse cookies for requests library
-            cookies = {}
-            for cookie in cookie_string.split(';'):
-                if '=' in cookie:
-                    name, value = cookie.strip().split('=', 1)
-                    cookies[name] = value
-            self.cookies = cookies
+            cookies = self.parse_cookies(cookie_string)
+
+            with self.lock:
+                # Save the raw cookie string
+                self.save_cookies(cookie_string)
+                self.file_mtime = self.cookie_file_mtime()
+                self._cookies = cookies
             logger.info("Successfully updated cookies")
             return True
         except Exception as e:
@@ -110,66 +197,215 @@ class MediumAuthentication:
 
 
 class MediumToMarkdown:
-    def __init__(self, image_dir="images"):
-        self.auth = MediumAuthentication()
+    """Converts Medium articles to markdown.
+
+    One instance is meant to be shared by all request threads: per-conversion
+    state lives in local variables, and the shared pieces (cookies, HTTP
+    session, fetcher, cache, image store) are thread-safe.
+    """
+
+    def __init__(self, image_dir="images", max_image_workers=8, image_timeout=30,
+                 parser='html.parser', max_document_bytes=20 * 1024 * 1024, max_tree_nodes=500_000,
+                 cache=None, fetcher=None, auth=None, pool_size=32, metrics=None, optimizer=None,
+                 search_index=None):
+        if parser not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend: {parser} (choose from {', '.join(PARSER_BACKENDS)})")
+        if not parser_available(parser):
+            raise ValueError(f"Parser backend {parser} requires the '{PARSER_BACKENDS[parser]}' package")
+
+        self.auth = auth or MediumAuthentication()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.image_dir = image_dir
+        # 图片并发下载的上限，以及单张图片的总超时时间（秒）
+        self.max_image_workers = max(1, max_image_workers)
+        self.image_timeout = image_timeout
+        # 连接池大小要覆盖所有请求线程的并发下载
+        self.pool_size = max(pool_size, self.max_image_workers)
+        # HTML 解析后端与内存上限：文档字节数、解析后节点数
+        self.parser = parser
+        self.max_document_bytes = max_document_bytes
+        self.max_tree_nodes = max_tree_nodes
+        # 可选的文章缓存（ArticleCache），None 表示每次都重新抓取和转换
+        self.cache = cache
+        self.session = self.create_session()
+        # 文章和图片请求都经过同一个限速/重试/熔断层
+        self.fetcher = fetcher or Fetcher(self.session)
         self.ensure_image_dir()
+        self.images = ImageStore(image_dir)
+        # 各阶段耗时、下载字节数、图片/缓存/错误计数，由 /metrics 导出
+        self.metrics = metrics or ConverterMetrics()
+        # 可选的图片后处理（ImageOptimizer）：缩放、转码为 WebP/AVIF、去除元数据
+        self.optimizer = optimizer
+        # 可选的全文索引（SearchIndex），每次转换后按内容哈希增量更新
+        self.search_index = search_index
+        # 同一文章（按规范化 URL）和同一图片资源（按 asset id）的并发请求合并为一次执行
+        self.conversions = SingleFlight()
+        self.image_flights = SingleFlight()
+
+    def create_session(self):
+        """Create a pooled HTTP session shared by all downloads"""
+        session = requests.Session()
+        session.headers.update(self.headers)
+        # 连接池足够大，保证每个下载线程都能复用 keep-alive 连接
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
 
     def ensure_image_dir(self):
         """Ensure the image directory exists"""
         Path(self.image_dir).mkdir(parents=True, exist_ok=True)
         logger.info(f"Image directory ensured: {self.image_dir}")
 
-    def download_image(self, img_url):
-        """Download image and return local path"""
+    def fetch_image(self, img_url, timer=None):
+        """Download image and return local path, raising on failure"""
+        # 同一资源的不同尺寸变体共享一个 asset id，已存储过就直接复用
+        filepath = self.images.lookup(img_url)
+        if filepath:
+            logger.info(f"Image already exists: {filepath}")
+            self.metrics.images.inc(outcome='reused')
+            return filepath
+
+        timer = timer or StageTimer(self.metrics)
+        try:
+            with timer.stage('download_image'):
+                filepath = self.store_image(img_url)
+        except Exception:
+            self.metrics.images.inc(outcome='failed')
+            raise
+        self.metrics.images.inc(outcome='downloaded')
+        return filepath
+
+    def store_image(self, img_url):
+        """Stream one image into the image store and return its local path"""
+        deadline = time.monotonic() + self.image_timeout
+        response = self.fetcher.get(
+            img_url,
+            cookies=self.auth.cookies,
+            stream=True,
+            timeout=(min(5, self.image_timeout), self.image_timeout)
+        )
         try:
-            # Generate unique filename based on URL hash
-            url_hash = hashlib.md5(img_url.encode()).hexdigest()
-
-            # Get file extension from URL or default to .jpg
-            parsed_url = urlparse(img_url)
-            ext = os.path.splitext(parsed_url.path)[1]
-            if not ext or ext.lower() not in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-                ext = '.jpg'  # Default extension
-
-            filename = f"{url_hash}{ext}"
-            filepath = os.path.join(self.image_dir, filename)
-
-            # If file already exists, return existing path
-            if os.path.exists(filepath):
-                logger.info(f"Image already exists: {filepath}")
-                return filepath
-
-            # Download image
-            response = requests.get(
-                img_url,
-                headers=self.headers,
-                cookies=self.auth.cookies,
-                stream=True
-            )
             response.raise_for_status()
 
             # Verify it's an image
             content_type = response.headers.get('content-type', '')
             if not content_type.startswith('image/'):
-                logger.warning(f"URL {img_url} is not an image (content-type: {content_type})")
-                return None
+                raise ValueError(f"not an image (content-type: {content_type})")
+
+            # 先写入临时文件并计算内容哈希，下载完整后再交给图片仓库按内容去重
+            fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, suffix='.part')
+            size = 0
+            try:
+                digest = hashlib.sha256()
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f"download exceeded {self.image_timeout}s")
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+                filepath = self.images.add(img_url, tmp_path, digest.hexdigest(), image_extension(img_url, content_type))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            finally:
+                self.metrics.bytes_fetched.inc(size, kind='image')
+        finally:
+            response.close()
+
+        logger.info(f"Successfully downloaded image: {filepath}")
+        return filepath
 
-            # Save image
-            with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+    def download_image(self, img_url):
+        """Download image and return local path"""
+        try:
+            return self.coalesced_image(img_url)
+        except Exception as e:
+            logger.error(f"Failed to download image {img_url}: {str(e)}")
+            return None
 
-            logger.info(f"Successfully downloaded image: {filepath}")
+    def start_image_downloads(self, img_urls, timer=None):
+        """Start downloading images in the background.
+
+        Returns ``(executor, futures)`` where ``futures`` maps each unique URL to
+        the future of its local path. The caller must shut the executor down.
+        Download times are recorded on ``timer`` when one is given.
+        """
+        # 同一资源的多个尺寸变体只下载一次，共享同一个 future
+        assets = {}
+        for url in img_urls:
+            assets.setdefault(canonical_image_id(url), []).append(url)
+        workers = max(1, min(self.max_image_workers, len(assets)))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-download')
+        if assets:
+            logger.info(f"Downloading {len(assets)} images with {workers} workers")
+
+        futures = {}
+        for urls in assets.values():
+            future = executor.submit(self.coalesced_image, urls[0], timer)
+            for url in urls:
+                futures[url] = future
+        return executor, futures
+
+    def coalesced_image(self, img_url, timer=None):
+        """Prepare an image, sharing the work with concurrent conversions that need the same asset"""
+        filepath, shared = self.image_flights.do(canonical_image_id(img_url), self.prepare_image, img_url, timer)
+        if shared:
+            self.metrics.coalesced.inc(kind='image')
+        return filepath
+
+    def prepare_image(self, img_url, timer=None):
+        """Download an image and, if an optimizer is configured, return the optimized file instead"""
+        filepath = self.fetch_image(img_url, timer)
+        if not self.optimizer:
             return filepath
 
+        timer = timer or StageTimer(self.metrics)
+        try:
+            with timer.stage('optimize_image'):
+                optimized = self.optimizer.optimize(filepath)
         except Exception as e:
-            logger.error(f"Failed to download image {img_url}: {str(e)}")
+            # 后处理失败不影响转换，退回原图
+            logger.error(f"Failed to optimize image {filepath}: {str(e)}")
+            return filepath
+        if optimized != filepath:
+            self.metrics.images.inc(outcome='optimized')
+        return optimized
+
+    def download_result(self, url, future, failures):
+        """Wait for one image download; return its path or record the failure and return None"""
+        try:
+            return future.result()
+        except Exception as e:
+            if url not in failures:
+                logger.error(f"Failed to download image {url}: {str(e)}")
+                failures[url] = str(e)
             return None
 
+    def download_images(self, img_urls):
+        """Download images concurrently.
+
+        Returns a ``(paths, failures)`` tuple: ``paths`` maps each successfully
+        downloaded URL to its local path and ``failures`` maps each failed URL
+        to the error message.
+        """
+        paths, failures = {}, {}
+        executor, futures = self.start_image_downloads(img_urls)
+        with executor:
+            for url, future in futures.items():
+                path = self.download_result(url, future, failures)
+                if path:
+                    paths[url] = path
+        self.images.flush()
+
+        if failures:
+            logger.warning(f"{len(failures)} of {len(futures)} images failed to download")
+        return paths, failures
+
     def find_all_images(self, article):
         """查找文章中的所有图片"""
         images = []
@@ -202,6 +438,8 @@ class MediumToMarkdown:
                         if url_match:
                             img_url = url_match.group(1)
                             new_img = BeautifulSoup().new_tag('img', src=img_url)
+                            # 挂到容器下，遍历时才能在原位置输出这张图片
+                            container.append(new_img)
                             images.append(new_img)
 
         # 去重
@@ -215,20 +453,66 @@ class MediumToMarkdown:
 
         return unique_images
 
-    def extract_content(self, html):
-        """Extract and convert article content to markdown"""
-        logger.info("Starting content extraction")
-        soup = BeautifulSoup(html, 'html.parser')
+    def extract_content(self, html, failed_images=None):
+        """Extract and convert article content to markdown
+
+        If ``failed_images`` is a list, an entry ``{"url", "error"}`` is appended
+        for every image that could not be downloaded.
+        """
+        return ''.join(block for _, block in self.iter_content(html, failed_images))
 
-        # Initialize markdown content with metadata
-        markdown_content = ""
+    def iter_content(self, html, failed_images=None, timer=None):
+        """Convert an article incrementally, yielding ``(kind, markdown)`` pairs.
+
+        ``kind`` is ``title``, ``block`` or ``image``. Text blocks are produced as
+        soon as the walker reaches them while image downloads run in the
+        background; an image is only waited for when its turn comes. Stage
+        timings are recorded on ``timer`` (a ``StageTimer``) when one is given.
+        """
+        logger.info("Starting content extraction")
+        timer = timer or StageTimer(self.metrics)
+        if self.max_document_bytes and len(html) > self.max_document_bytes:
+            raise DocumentTooLargeError(
+                f"Document is {len(html)} characters, limit is {self.max_document_bytes}"
+            )
 
+        with timer.stage('parse'):
+            soup = self.parse_html(html)
+        try:
+            yield from self.iter_soup(soup, failed_images, timer)
+        finally:
+            # 显式拆除解析树，尽快释放大文档占用的内存
+            soup.decompose()
+
+    def parse_html(self, html):
+        """Parse HTML with the configured backend and enforce the tree size limit"""
+        if self.parser == 'selectolax':
+            from selectolax.lexbor import LexborHTMLParser
+
+            tree = LexborHTMLParser(html)
+            fragments = [node.html for node in (tree.css_first('h1'), tree.css_first('article')) if node]
+            del tree
+            features = 'lxml' if parser_available('lxml') else 'html.parser'
+            soup = BeautifulSoup(''.join(fragments), features)
+        else:
+            soup = BeautifulSoup(html, self.parser)
+
+        if self.max_tree_nodes:
+            for count, _ in enumerate(soup.descendants, 1):
+                if count > self.max_tree_nodes:
+                    soup.decompose()
+                    raise DocumentTooLargeError(f"Document has more than {self.max_tree_nodes} nodes")
+        return soup
+
+    def iter_soup(self, soup, failed_images=None, timer=None):
+        """Yield ``(kind, markdown)`` pairs for an already parsed document"""
+        timer = timer or StageTimer(self.metrics)
         # Extract article title
         title = soup.find('h1')
         if title:
             title_text = title.get_text().strip()
-            markdown_content += f"# {title_text}\n\n"
             logger.info(f"Extracted title: {title_text}")
+            yield 'title', f"# {title_text}\n\n"
 
         # Find and process the main article content
         article = soup.find('article')
@@ -238,80 +522,147 @@ class MediumToMarkdown:
 
         logger.info("Processing article elements")
 
-        # 首先处理所有图片
-        images = self.find_all_images(article)
-        image_markdowns = {}
-        for img in images:
-            parent = img.parent
-            key = str(parent)
-            img_markdown = self.process_image(img)
-            if img_markdown:
-                image_markdowns[key] = img_markdown
-
-        # 处理文章内容
-        for element in article.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'pre', 'blockquote', 'ul', 'ol', 'figure', 'div']):
-            # 如果这个元素包含图片，先处理图片
-            if str(element) in image_markdowns:
-                markdown_content += image_markdowns[str(element)]
+        # 首先收集全部图片URL并在后台并发下载；按节点身份（而不是序列化后的字符串）记录图片
+        with timer.stage('find_all_images'):
+            images = self.find_all_images(article)
+        image_srcs = {id(img): self.image_src(img) for img in images}
+        executor, downloads = self.start_image_downloads((src for src in image_srcs.values() if src), timer)
+        failures = {}
+        try:
+            # 处理文章内容
+            for element in self.walk_blocks(article):
+                if element.name != 'img':
+                    yield 'block', self.render_block(element)
+                elif image_srcs.get(id(element)):
+                    src = image_srcs[id(element)]
+                    local_path = self.download_result(src, downloads[src], failures)
+                    downloaded = {src: local_path} if local_path else {}
+                    img_markdown = self.process_image(element, self.find_caption(element), downloaded=downloaded)
+                    if img_markdown:
+                        yield 'image', img_markdown
+
+            # 没有出现在正文里的图片也要等下载结束，才能完整报告失败
+            for src, future in downloads.items():
+                self.download_result(src, future, failures)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.images.flush()
+
+        if failures:
+            logger.warning(f"{len(failures)} of {len(downloads)} images failed to download")
+        if failed_images is not None:
+            failed_images.extend({"url": url, "error": error} for url, error in failures.items())
+
+    def walk_blocks(self, article):
+        """Walk the article tree once and yield block and image elements in document order.
+
+        Block elements are yielded as a whole and never descended into, so nested
+        content is emitted exactly once; images nested inside a block follow it.
+        The walk uses an explicit stack, so deeply nested wrappers cannot hit the
+        recursion limit.
+        """
+        stack = [iter(article.children)]
+        while stack:
+            element = next(stack[-1], None)
+            if element is None:
+                stack.pop()
+                continue
+            if not isinstance(element, Tag):
                 continue
 
-            # Headers
-            if element.name in ['h1', 'h2', 'h3', 'h4']:
-                level = int(element.name[1])
-                text = element.get_text().strip()
-                markdown_content += f"{'#' * level} {text}\n\n"
-
-            # Paragraphs
-            elif element.name == 'p':
-                text = element.get_text().strip()
-                if text:
-                    if element.find('code'):
-                        code = element.find('code').get_text()
-                        markdown_content += f"`{code}`\n\n"
-                    else:
-                        text = text.replace('*', r'\*')
-                        markdown_content += f"{text}\n\n"
-
-            # Code blocks
-            elif element.name == 'pre':
-                code = element.get_text().strip()
-                code_element = element.find('code')
-                language = code_element.get('class', [''])[0].replace('language-', '') if code_element else ''
-                markdown_content += f"```{language}\n{code}\n```\n\n"
-
-            # Blockquotes
-            elif element.name == 'blockquote':
-                quote = element.get_text().strip()
-                markdown_content += f"> {quote}\n\n"
-
-            # Lists
-            elif element.name in ['ul', 'ol']:
-                for idx, li in enumerate(element.find_all('li', recursive=False)):
-                    prefix = '* ' if element.name == 'ul' else f"{idx + 1}. "
-                    item_text = li.get_text().strip()
-                    markdown_content += f"{prefix}{item_text}\n"
-                markdown_content += "\n"
-
-        return markdown_content
-
-    def process_image(self, img_element, caption_element=None):
-        """Process an image element and return markdown"""
+            if element.name == 'img':
+                yield element
+                continue
+
+            if element.name in BLOCK_TAGS:
+                yield element
+                # 块内部嵌套的图片（例如 <p><a><img></a></p>）紧跟在块后输出
+                yield from element.find_all('img')
+                continue
+
+            stack.append(iter(element.children))
+
+    def render_block(self, element):
+        """Render a single block element to markdown"""
+        # Headers
+        if element.name in ['h1', 'h2', 'h3', 'h4']:
+            level = int(element.name[1])
+            text = element.get_text().strip()
+            return f"{'#' * level} {text}\n\n"
+
+        # Paragraphs
+        elif element.name == 'p':
+            text = element.get_text().strip()
+            if text:
+                if element.find('code'):
+                    code = element.find('code').get_text()
+                    return f"`{code}`\n\n"
+                else:
+                    text = text.replace('*', r'\*')
+                    return f"{text}\n\n"
+
+        # Code blocks
+        elif element.name == 'pre':
+            code = element.get_text().strip()
+            code_element = element.find('code')
+            language = code_element.get('class', [''])[0].replace('language-', '') if code_element else ''
+            return f"```{language}\n{code}\n```\n\n"
+
+        # Blockquotes
+        elif element.name == 'blockquote':
+            quote = element.get_text().strip()
+            return f"> {quote}\n\n"
+
+        # Lists
+        elif element.name in ['ul', 'ol']:
+            markdown_content = ""
+            for idx, li in enumerate(element.find_all('li', recursive=False)):
+                prefix = '* ' if element.name == 'ul' else f"{idx + 1}. "
+                item_text = li.get_text().strip()
+                markdown_content += f"{prefix}{item_text}\n"
+            return markdown_content + "\n"
+
+        return ""
+
+    def find_caption(self, img_element):
+        """Return the figcaption of the figure enclosing an image, if any"""
+        figure = img_element.find_parent('figure')
+        if figure:
+            return figure.find('figcaption')
+        return None
+
+    def image_src(self, img_element):
+        """Return the absolute source URL of an image element, or None"""
+        # 获取图片URL
+        src = img_element.get('src', '')
+        if not src:
+            src = img_element.get('data-src', '')
+
+        if not src:
+            return None
+
+        # 确保URL是绝对路径
+        if not src.startswith(('http://', 'https://')):
+            src = urljoin('https://medium.com', src)
+        return src
+
+    def process_image(self, img_element, caption_element=None, downloaded=None):
+        """Process an image element and return markdown
+
+        ``downloaded`` maps already-fetched image URLs to local paths; when it is
+        given, images missing from it are treated as failed downloads.
+        """
         try:
-            # 获取图片URL
-            src = img_element.get('src', '')
-            if not src:
-                src = img_element.get('data-src', '')
-            
+            src = self.image_src(img_element)
             if not src:
                 logger.warning("Found image element without source URL")
                 return None
 
-            # 确保URL是绝对路径
-            if not src.startswith(('http://', 'https://')):
-                src = urljoin('https://medium.com', src)
-
             # 下载图片
-            local_path = self.download_image(src)
+            if downloaded is not None:
+                local_path = downloaded.get(src)
+            else:
+                local_path = self.download_image(src)
             if not local_path:
                 return None
 
@@ -367,26 +718,62 @@ class MediumToMarkdown:
     def clean_markdown(self, content):
         """Clean up the markdown content"""
         logger.info("Cleaning markdown content")
+        return self.clean_block(content)
 
-        # 移除多余的空行，但保留必要的间距
-        content = re.sub(r'\n{4,}', '\n\n\n', content)
-        
+    def clean_block(self, content):
+        """Apply the markdown cleaning rules to a document or a single block in one pass.
+
+        Removes control characters and trailing spaces, keeps at most two blank
+        lines in a row, puts a blank line after headings and between an image
+        and its caption, and drops empty list items. Fenced code is only
+        stripped of control characters and trailing spaces.
+        """
         # 保留Unicode字符，只清理不可打印字符
-        content = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', content)
-        
-        # 修复标题周围的空格
-        content = re.sub(r'(\n#{1,6}.*)\n([^\n])', r'\1\n\n\2', content)
-        
-        # 修复列表格式
-        content = re.sub(r'\n\*\s*\n', '\n', content)
-        
-        # 确保图片和其caption之间有适当的间距
-        content = re.sub(r'(!\[.*?\].*?\))(\n\*.*?\*)', r'\1\n\2', content)
-        
-        # 移除行尾空格但保留换行
-        content = '\n'.join(line.rstrip() for line in content.split('\n'))
-        
-        return content.strip()
+        content = content.translate(CONTROL_CHARS).strip()
+        # 大多数块（段落、标题）只有一行，不需要逐行处理
+        if '\n' not in content:
+            return '' if content[:1] == '*' and not content[1:].strip() else content
+
+        lines = []
+        blank_run = 0
+        in_code = False
+        for line in content.split('\n'):
+            # 移除行尾空格但保留换行
+            line = line.rstrip()
+            if in_code:
+                lines.append(line)
+                in_code = not line.startswith('```')
+                continue
+
+            # 移除多余的空行，但保留必要的间距
+            if not line:
+                blank_run += 1
+                if blank_run <= 2:
+                    lines.append(line)
+                continue
+
+            # 修复列表格式：去掉空的列表项
+            if line[0] == '*' and not line[1:].strip():
+                continue
+
+            if lines and lines[-1]:
+                previous = lines[-1]
+                # 修复标题周围的空格
+                if previous[0] == '#':
+                    lines.append('')
+                # 确保图片和其caption之间有适当的间距
+                elif line[0] == '*' and '*' in line[1:] and IMAGE_LINE.search(previous):
+                    lines.append('')
+
+            blank_run = 0
+            lines.append(line)
+            in_code = line.startswith('```')
+
+        return '\n'.join(lines).strip()
+
+    def join_blocks(self, blocks):
+        """Clean each markdown block and join them into a document with a single join"""
+        return '\n\n'.join(cleaned for cleaned in map(self.clean_block, blocks) if cleaned)
 
     def validate_url(self, url):
         """Validate if the URL is a Medium article"""
@@ -395,61 +782,320 @@ class MediumToMarkdown:
 
     def fetch_article(self, url):
         """Fetch the HTML content of the Medium article"""
+        html, _ = self.fetch_document(url)
+        return html
+
+    def fetch_document(self, url, etag=None, last_modified=None):
+        """Fetch an article, sending a conditional GET when validators are given.
+
+        Returns ``(html, validators)`` where ``validators`` holds the response's
+        ``etag`` and ``last_modified``. ``html`` is None if the server answered
+        304 Not Modified.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
         try:
-            response = requests.get(url, headers=self.headers, cookies=self.auth.cookies)
-            response.raise_for_status()
-            return response.text
+            response = self.fetcher.get(url, headers=headers, cookies=self.auth.cookies, stream=True)
+            try:
+                validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }
+                if response.status_code == 304 and headers:
+                    return None, validators
+                response.raise_for_status()
+                return self.read_document(response), validators
+            finally:
+                response.close()
         except requests.RequestException as e:
             logger.error(f"Failed to fetch article: {str(e)}")
             raise
 
-    def convert(self, url, filename=None):
-        """Convert Medium article to markdown"""
+    def read_document(self, response):
+        """Read a streamed response body, refusing documents above max_document_bytes"""
+        limit = self.max_document_bytes
+        content_length = response.headers.get('content-length')
+        if limit and content_length and content_length.isdigit() and int(content_length) > limit:
+            raise DocumentTooLargeError(f"Document is {content_length} bytes, limit is {limit}")
+
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            body += chunk
+            if limit and len(body) > limit:
+                raise DocumentTooLargeError(f"Document exceeds {limit} bytes")
+        self.metrics.bytes_fetched.inc(len(body), kind='article')
+
+        # 只有响应头声明了 charset 才使用它，否则按 UTF-8 解码（requests 对 text/html 默认 ISO-8859-1）
+        content_type = response.headers.get('content-type', '')
+        encoding = response.encoding if 'charset' in content_type.lower() else 'utf-8'
+        return body.decode(encoding or 'utf-8', errors='replace')
+
+    def convert(self, url, filename=None, failed_images=None, refresh=False, timings=None):
+        """Convert Medium article to markdown
+
+        With a cache configured, fresh entries are returned without any network
+        request and stale ones are revalidated with a conditional GET. ``refresh``
+        bypasses the cache lookup and always re-converts the article. If
+        ``timings`` is a dict, it is filled with the seconds spent per stage.
+
+        Concurrent calls for the same article share one conversion; each caller
+        still gets its own ``filename``, ``failed_images`` and ``timings``.
+        """
         logger.info(f"Starting conversion for URL: {url}")
+        timer = StageTimer(self.metrics, keep=timings is not None)
+        start = time.perf_counter()
 
         # if not self.validate_url(url):
         #     logger.error(f"Invalid URL provided: {url}")
         #     raise ValueError("Not a valid Medium URL")
 
         try:
-            # Fetch the article
-            html = self.fetch_article(url)
-
-            # Extract and convert content
-            markdown_content = self.extract_content(html)
-
-            # Clean up the markdown
-            cleaned_content = self.clean_markdown(markdown_content)
-
-            logger.info("Successfully converted article to markdown")
+            (cleaned_content, image_failures), shared = self.conversions.do(
+                (normalize_url(url), refresh), self.convert_content, url, refresh, timer
+            )
+            if shared:
+                logger.info(f"Joined an in-flight conversion of {url}")
+                self.metrics.coalesced.inc(kind='conversion')
+            if failed_images is not None:
+                failed_images.extend(image_failures)
 
             # Save markdown to file if filename is provided
             if filename:
                 self.save_markdown(cleaned_content, filename)
+            self.index_article(url, cleaned_content, filename)
+            self.metrics.conversions.inc(status='success')
             return cleaned_content
 
         except Exception as e:
             logger.error(f"Conversion failed: {str(e)}")
+            self.metrics.conversions.inc(status='error')
             raise
+        finally:
+            timer.record('total', time.perf_counter() - start)
+            if timings is not None:
+                timings.update(timer.timings)
+
+    def convert_content(self, url, refresh, timer):
+        """Produce the markdown of an article; returns ``(markdown, image_failures)``"""
+        image_failures = []
+        cached = self.cache.get(url) if self.cache and not refresh else None
+        if cached and cached['fresh']:
+            self.record_cache('hits')
+            logger.info(f"Serving cached markdown for {url}")
+            return cached['markdown'], image_failures
+
+        # Fetch the article (conditionally if we hold a stale copy)
+        with timer.stage('fetch'):
+            html, validators = self.fetch_document(
+                url,
+                etag=cached['etag'] if cached else None,
+                last_modified=cached['last_modified'] if cached else None
+            )
+
+        if html is None:
+            self.record_cache('revalidations')
+            self.cache.mark_revalidated(url, **validators)
+            logger.info(f"Article not modified, serving cached markdown for {url}")
+            return cached['markdown'], image_failures
+
+        if self.cache:
+            self.record_cache('refreshes' if cached else 'misses')
+
+        # Extract and convert content, cleaning block by block
+        blocks = [block for _, block in self.iter_content(html, image_failures, timer)]
+        with timer.stage('clean'):
+            cleaned_content = self.join_blocks(blocks)
+
+        # 有图片下载失败时不缓存，下次请求会重试
+        if self.cache and not image_failures:
+            self.cache.put(url, html, cleaned_content, **validators)
+
+        logger.info("Successfully converted article to markdown")
+        return cleaned_content, image_failures
+
+    def index_article(self, url, markdown_content, filename=None):
+        """Update the search index; unchanged articles cost one lookup, and failures never fail a conversion"""
+        if not self.search_index:
+            return
+        try:
+            self.search_index.update(url, markdown_content, filename)
+        except Exception as e:
+            logger.error(f"Failed to index {url}: {str(e)}")
+
+    def record_cache(self, result):
+        """Count a cache lookup result in both the cache stats and the metrics"""
+        self.cache.record(result)
+        self.metrics.cache.inc(result=result)
+
+    def stream(self, url, refresh=False):
+        """Convert an article incrementally, yielding events as dicts.
+
+        Events are ``{"type": "title" | "block" | "image", "markdown": ...}``
+        with each block cleaned on its own, followed by a final
+        ``{"type": "done", "failed_images": [...]}``. The article is fetched
+        before the first event, so fetch errors are raised to the caller
+        instead of being streamed.
+        """
+        logger.info(f"Starting streaming conversion for URL: {url}")
+        cached = self.cache.get(url) if self.cache and not refresh else None
+        if cached and cached['fresh']:
+            self.record_cache('hits')
+            return self.stream_cached(cached['markdown'])
+
+        timer = StageTimer(self.metrics)
+        with timer.stage('fetch'):
+            html, validators = self.fetch_document(
+                url,
+                etag=cached['etag'] if cached else None,
+                last_modified=cached['last_modified'] if cached else None
+            )
+        if html is None:
+            self.record_cache('revalidations')
+            self.cache.mark_revalidated(url, **validators)
+            return self.stream_cached(cached['markdown'])
+
+        if self.cache:
+            self.record_cache('refreshes' if cached else 'misses')
+        return self.stream_html(url, html, validators, timer)
+
+    def stream_cached(self, markdown_content):
+        yield {"type": "block", "markdown": markdown_content}
+        yield {"type": "done", "failed_images": [], "cached": True}
+
+    def stream_html(self, url, html, validators, timer=None):
+        timer = timer or StageTimer(self.metrics)
+        failed_images = []
+        cleaned_blocks = []
+        clean_seconds = 0.0
+        for kind, block in self.iter_content(html, failed_images, timer):
+            start = time.perf_counter()
+            cleaned = self.clean_block(block)
+            clean_seconds += time.perf_counter() - start
+            if cleaned:
+                cleaned_blocks.append(cleaned)
+                yield {"type": kind, "markdown": cleaned}
+
+        # 与 convert 保持一致：缓存和索引的是整篇清理后的 markdown
+        markdown_content = '\n\n'.join(cleaned_blocks)
+        if self.cache and not failed_images:
+            self.cache.put(url, html, markdown_content, **validators)
+        self.index_article(url, markdown_content)
+        # 按块清理的耗时累加后只记一次，直方图里与 convert 的 clean 阶段可比
+        timer.record('clean', clean_seconds)
+        self.metrics.conversions.inc(status='success')
+        logger.info("Successfully streamed article")
+        yield {"type": "done", "failed_images": failed_images, "cached": False}
 
     def save_markdown(self, content, filename):
-        """Save markdown content to file"""
+        """Save markdown content to file via a temporary file and an atomic rename"""
+        # 并发写同一个文件时，读者只会看到某一次完整的写入
+        tmp_path = f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
                 f.write(content)
+            os.replace(tmp_path, filename)
             logger.info(f"Successfully saved markdown to {filename}")
             return True
         except Exception as e:
             logger.error(f"Failed to save markdown: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return False
 
 
-# Initialize Flask app
-app = Flask(__name__)
-converter = MediumToMarkdown()
+# 单个批量任务允许的最大 URL 数
+MAX_BATCH_URLS = 1000
+
+api = Blueprint('api', __name__)
+
+
+def load_config():
+    """Read service settings from MEDIUM_* environment variables"""
+    return {
+        'MEDIUM_LOG_DIR': os.getenv('MEDIUM_LOG_DIR', 'logs'),
+        'MEDIUM_IMAGE_DIR': os.getenv('MEDIUM_IMAGE_DIR', 'images'),
+        'MEDIUM_IMAGE_WORKERS': int(os.getenv('MEDIUM_IMAGE_WORKERS', 8)),
+        'MEDIUM_COOKIE_FILE': os.getenv('MEDIUM_COOKIE_FILE', 'medium_cookies.txt'),
+        'MEDIUM_PARSER': os.getenv('MEDIUM_PARSER', 'html.parser'),
+        # 设为空字符串可关闭文章缓存
+        'MEDIUM_CACHE_PATH': os.getenv('MEDIUM_CACHE_PATH', 'cache/articles.db'),
+        'MEDIUM_CACHE_MAX_BYTES': int(os.getenv('MEDIUM_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+        'MEDIUM_CACHE_TTL': int(os.getenv('MEDIUM_CACHE_TTL', 3600)),
+        'MEDIUM_BATCH_WORKERS': int(os.getenv('MEDIUM_BATCH_WORKERS', 4)),
+        # 设为空字符串可关闭全文索引
+        'MEDIUM_SEARCH_PATH': os.getenv('MEDIUM_SEARCH_PATH', 'cache/search.db'),
+        # 图片后处理：webp / avif / jpeg，空字符串表示保留下载的原图
+        'MEDIUM_IMAGE_FORMAT': os.getenv('MEDIUM_IMAGE_FORMAT', ''),
+        'MEDIUM_IMAGE_MAX_WIDTH': int(os.getenv('MEDIUM_IMAGE_MAX_WIDTH', 1400)),
+        'MEDIUM_IMAGE_QUALITY': int(os.getenv('MEDIUM_IMAGE_QUALITY', 80)),
+        'MEDIUM_KEEP_ORIGINAL_IMAGES': os.getenv('MEDIUM_KEEP_ORIGINAL_IMAGES', '1') not in ('0', 'false'),
+        'MEDIUM_OPTIMIZE_WORKERS': int(os.getenv('MEDIUM_OPTIMIZE_WORKERS', 0)),
+    }
+
+
+def create_converter(config):
+    """Build a converter, with its optional cache and image optimizer, from MEDIUM_* settings"""
+    cache = None
+    if config['MEDIUM_CACHE_PATH']:
+        cache = ArticleCache(
+            config['MEDIUM_CACHE_PATH'],
+            max_bytes=config['MEDIUM_CACHE_MAX_BYTES'],
+            ttl=config['MEDIUM_CACHE_TTL']
+        )
+    optimizer = None
+    if config['MEDIUM_IMAGE_FORMAT']:
+        optimizer = ImageOptimizer(
+            config['MEDIUM_IMAGE_FORMAT'],
+            max_width=config['MEDIUM_IMAGE_MAX_WIDTH'],
+            quality=config['MEDIUM_IMAGE_QUALITY'],
+            keep_originals=config['MEDIUM_KEEP_ORIGINAL_IMAGES'],
+            workers=config['MEDIUM_OPTIMIZE_WORKERS'] or None
+        )
+    search_index = SearchIndex(config['MEDIUM_SEARCH_PATH']) if config['MEDIUM_SEARCH_PATH'] else None
+    return MediumToMarkdown(
+        image_dir=config['MEDIUM_IMAGE_DIR'],
+        max_image_workers=config['MEDIUM_IMAGE_WORKERS'],
+        parser=config['MEDIUM_PARSER'],
+        cache=cache,
+        auth=MediumAuthentication(config['MEDIUM_COOKIE_FILE']),
+        optimizer=optimizer,
+        search_index=search_index
+    )
+
+
+def create_app(config=None):
+    """Create the Flask app with its own converter and batch job manager.
+
+    ``config`` overrides the MEDIUM_* settings from ``load_config``. Each call
+    builds independent state, so every worker process should call it once.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    app.config.update(config or {})
+    setup_logging(app.config['MEDIUM_LOG_DIR'])
+
+    converter = create_converter(app.config)
+    app.extensions['medium_converter'] = converter
+    app.extensions['medium_jobs'] = JobManager(converter, max_workers=app.config['MEDIUM_BATCH_WORKERS'])
+    app.register_blueprint(api)
+    return app
 
 
-@app.route('/auth/cookies', methods=['POST'])
+def get_converter():
+    """Return the converter of the app handling the current request"""
+    return current_app.extensions['medium_converter']
+
+
+def get_job_manager():
+    """Return the batch job manager of the app handling the current request"""
+    return current_app.extensions['medium_jobs']
+
+
+@api.route('/auth/cookies', methods=['POST'])
 def update_cookies():
     """Update Medium authentication cookies"""
     try:
@@ -462,7 +1108,7 @@ def update_cookies():
             }), 400
 
         cookie_string = data['cookies']
-        if converter.auth.update_cookies(cookie_string):
+        if get_converter().auth.update_cookies(cookie_string):
             return jsonify({
                 "message": "Cookies updated successfully",
                 "status": "success"
@@ -481,7 +1127,77 @@ def update_cookies():
         }), 500
 
 
-@app.route('/convert', methods=['POST'])
+@api.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Report article cache hit/miss/revalidation counters"""
+    cache = get_converter().cache
+    if not cache:
+        return jsonify({
+            "error": "Article cache is disabled",
+            "status": "error"
+        }), 404
+    return jsonify({
+        "cache": cache.stats(),
+        "status": "success"
+    })
+
+
+@api.route('/images/stats', methods=['GET'])
+def image_stats():
+    """Report how many images were optimized, bytes saved and throughput"""
+    optimizer = get_converter().optimizer
+    if not optimizer:
+        return jsonify({
+            "error": "Image optimization is disabled",
+            "status": "error"
+        }), 404
+    return jsonify({
+        "images": optimizer.stats(),
+        "status": "success"
+    })
+
+
+@api.route('/search', methods=['GET'])
+def search():
+    """Full-text search over converted articles, returning ranked snippets"""
+    index = get_converter().search_index
+    if not index:
+        return jsonify({
+            "error": "Search index is disabled",
+            "status": "error"
+        }), 404
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            "error": "No query provided",
+            "status": "error"
+        }), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({
+            "error": "limit and offset must be integers",
+            "status": "error"
+        }), 400
+
+    start = time.perf_counter()
+    results = index.search(query, limit=limit, offset=offset)
+    return jsonify({
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 3),
+        "status": "success"
+    })
+
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Export per-stage latencies and counters in the Prometheus text format"""
+    return Response(get_converter().metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@api.route('/convert', methods=['POST'])
 def convert_article():
     """API endpoint to convert Medium article to markdown"""
     logger.info("Received conversion request")
@@ -497,15 +1213,34 @@ def convert_article():
 
         url = data['url']
         filename = data.get('filename', None)
+        refresh = bool(data.get('refresh', False))
+        timings = {} if data.get('timings') else None
         logger.info(f"Processing URL: {url}")
 
         try:
-            markdown_content = converter.convert(url, filename)
+            failed_images = []
+            markdown_content = get_converter().convert(url, filename, failed_images, refresh=refresh, timings=timings)
             logger.info("Successfully converted article")
-            return jsonify({
+            result = {
                 "markdown": markdown_content,
+                "failed_images": failed_images,
                 "status": "success"
-            })
+            }
+            if timings is not None:
+                result["timings"] = timings
+            return jsonify(result)
+        except DocumentTooLargeError as dte:
+            logger.error(f"Document too large: {str(dte)}")
+            return jsonify({
+                "error": str(dte),
+                "status": "error"
+            }), 413
+        except CircuitOpenError as coe:
+            logger.error(f"Upstream unavailable: {str(coe)}")
+            return jsonify({
+                "error": str(coe),
+                "status": "error"
+            }), 503
         except ValueError as ve:
             logger.error(f"Validation error: {str(ve)}")
             return jsonify({
@@ -527,6 +1262,175 @@ def convert_article():
         }), 400
 
 
+@api.route('/convert/stream', methods=['POST'])
+def convert_article_stream():
+    """Stream a conversion as newline-delimited JSON events"""
+    data = request.get_json(silent=True)
+    if not data or 'url' not in data:
+        logger.error("No URL provided in request")
+        return jsonify({
+            "error": "No URL provided",
+            "status": "error"
+        }), 400
+
+    url = data['url']
+    converter = get_converter()
+    try:
+        events = converter.stream(url, refresh=bool(data.get('refresh', False)))
+    except DocumentTooLargeError as dte:
+        logger.error(f"Document too large: {str(dte)}")
+        return jsonify({
+            "error": str(dte),
+            "status": "error"
+        }), 413
+    except CircuitOpenError as coe:
+        logger.error(f"Upstream unavailable: {str(coe)}")
+        return jsonify({
+            "error": str(coe),
+            "status": "error"
+        }), 503
+    except Exception as e:
+        logger.error(f"Conversion error: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+    def generate():
+        try:
+            for event in events:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            # 响应头已经发出，只能以错误事件结束流
+            logger.error(f"Streaming conversion error: {str(e)}")
+            converter.metrics.conversions.inc(status='error')
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@api.route('/export', methods=['POST'])
+def export_article():
+    """Convert an article and stream it as a zip bundle or as markdown with inlined images"""
+    data = request.get_json(silent=True)
+    if not data or 'url' not in data:
+        logger.error("No URL provided in request")
+        return jsonify({
+            "error": "No URL provided",
+            "status": "error"
+        }), 400
+
+    url = data['url']
+    fmt = data.get('format', 'zip')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({
+            "error": f"Unknown export format: {fmt}",
+            "status": "error"
+        }), 400
+
+    try:
+        markdown_content = get_converter().convert(url, refresh=bool(data.get('refresh', False)))
+        chunks = iter_bundle(markdown_content, fmt, article_filename(url, ext=''))
+        if data.get('filename'):
+            size = write_bundle(chunks, data['filename'])
+            return jsonify({
+                "path": data['filename'],
+                "bytes": size,
+                "status": "success"
+            })
+    except DocumentTooLargeError as dte:
+        logger.error(f"Document too large: {str(dte)}")
+        return jsonify({
+            "error": str(dte),
+            "status": "error"
+        }), 413
+    except CircuitOpenError as coe:
+        logger.error(f"Upstream unavailable: {str(coe)}")
+        return jsonify({
+            "error": str(coe),
+            "status": "error"
+        }), 503
+    except Exception as e:
+        logger.error(f"Export error: {str(e)}")
+        return jsonify({
+            "error": str(e),
+            "status": "error"
+        }), 500
+
+    download_name = article_filename(url, ext='.zip' if fmt == 'zip' else '.md')
+    return Response(
+        stream_with_context(chunks),
+        content_type=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{download_name}"'}
+    )
+
+
+@api.route('/convert/batch', methods=['POST'])
+def convert_batch():
+    """Queue a list of Medium articles for background conversion"""
+    try:
+        data = request.get_json()
+        urls = data.get('urls') if data else None
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            logger.error("No URL list provided in batch request")
+            return jsonify({
+                "error": "A non-empty list of URLs is required",
+                "status": "error"
+            }), 400
+        if len(urls) > MAX_BATCH_URLS:
+            return jsonify({
+                "error": f"At most {MAX_BATCH_URLS} URLs per batch",
+                "status": "error"
+            }), 400
+
+        job = get_job_manager().submit(urls)
+        return jsonify({
+            "job_id": job.id,
+            "job": job.to_dict(include_markdown=False),
+            "status": "success"
+        }), 202
+
+    except Exception as e:
+        logger.error(f"Batch request error: {str(e)}")
+        return jsonify({
+            "error": "Invalid request",
+            "status": "error"
+        }), 400
+
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report per-URL progress, results and errors of a batch job"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return jsonify({
+            "error": "Job not found",
+            "status": "error"
+        }), 404
+    include_markdown = request.args.get('markdown', '1') not in ('0', 'false')
+    return jsonify({
+        "job": job.to_dict(include_markdown=include_markdown),
+        "status": "success"
+    })
+
+
+@api.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel the URLs of a batch job that have not started yet"""
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return jsonify({
+            "error": "Job not found",
+            "status": "error"
+        }), 404
+    return jsonify({
+        "job": job.to_dict(include_markdown=False),
+        "status": "success"
+    })
+
+
 if __name__ == '__main__':
+    # 开发/单机模式；生产环境请用 wsgi.py 配合多 worker 的 WSGI 服务器（见 README.md）
+    app = create_app()
     logger.info("Starting Medium to Markdown API service")
-    app.run(host='0.0.0.0', port=5050, debug=False)
+    app.run(host='0.0.0.0', port=int(os.getenv('PORT', 5050)), debug=False, threaded=True)
@@ -0,0 +1,125 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 直方图默认分桶（秒），覆盖从解析小文档到下载大图的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                # 每个桶只计自己的区间，渲染时再累加
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self.series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, float('inf')), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(key)} {count}")
+        return lines
+
+
+def format_labels(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+class ConverterMetrics:
+    """Process-wide metrics of the conversion pipeline, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram('medium_stage_duration_seconds', "Time spent per conversion stage")
+        self.bytes_fetched = Counter('medium_fetched_bytes_total', "Bytes downloaded, by kind")
+        self.images = Counter('medium_images_total', "Images processed, by outcome")
+        self.cache = Counter('medium_cache_lookups_total', "Article cache lookups, by result")
+        self.errors = Counter('medium_errors_total', "Errors, by stage")
+        self.conversions = Counter('medium_conversions_total', "Finished conversions, by status")
+        self.coalesced = Counter('medium_coalesced_total', "Requests that joined an in-flight conversion or download")
+
+    def render(self):
+        lines = []
+        for metric in (self.stage_seconds, self.bytes_fetched, self.images, self.cache, self.errors, self.conversions,
+                       self.coalesced):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    """Times the stages of one conversion.
+
+    Every stage is recorded in the shared histogram; the per-request
+    breakdown (``timings``, seconds per stage) is only kept when requested.
+    Stages that run in several threads, like image downloads, are summed.
+    """
+
+    def __init__(self, metrics, keep=False):
+        self.metrics = metrics
+        self.timings = {} if keep else None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.metrics.errors.inc(stage=name)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.metrics.stage_seconds.observe(seconds, stage=name)
+        if self.timings is not None:
+            with self.lock:
+                self.timings[name] = round(self.timings.get(name, 0.0) + seconds, 6)
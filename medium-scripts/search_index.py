@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from article_cache import normalize_url
+
+logger = logging.getLogger('MediumConverter')
+
+# 查询词：字母数字串，结尾的 * 表示前缀匹配
+QUERY_TERM = re.compile(r'\w+\*?')
+# bm25 各列权重：url（不索引）、标题、小标题、代码、正文
+COLUMN_WEIGHTS = (0.0, 10.0, 5.0, 2.0, 1.0)
+
+
+def extract_fields(markdown_content):
+    """Split converted markdown into title, headings, code and body text in one pass"""
+    title = ''
+    headings, code, body = [], [], []
+    in_code = False
+    for line in markdown_content.split('\n'):
+        if line.startswith('```'):
+            in_code = not in_code
+            continue
+        if in_code:
+            code.append(line)
+        elif line.startswith('#'):
+            text = line.lstrip('#').strip()
+            if not title and line.startswith('# '):
+                title = text
+            else:
+                headings.append(text)
+        elif line and not line.startswith('!['):
+            body.append(line)
+    return {'title': title, 'headings': '\n'.join(headings), 'code': '\n'.join(code), 'body': '\n'.join(body)}
+
+
+def build_query(text):
+    """Turn free text into an FTS5 query that matches all terms, without FTS syntax errors"""
+    terms = []
+    for term in QUERY_TERM.findall(text):
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return ' '.join(terms)
+
+
+class SearchIndex:
+    """SQLite FTS5 index of converted articles.
+
+    Each document is stored with a hash of its markdown, so ``update`` only
+    rewrites the index when an article actually changed. Results are ranked
+    with bm25, weighting title over headings over code over body text.
+    """
+
+    def __init__(self, path="cache/search.db"):
+        self.path = path
+        self.lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE NOT NULL,
+                filename TEXT,
+                content_hash TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        self.db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                url UNINDEXED, title, headings, code, body, tokenize='porter unicode61'
+            )
+        """)
+        self.db.commit()
+        logger.info(f"Search index opened: {path}")
+
+    def update(self, url, markdown_content, filename=None):
+        """Index an article unless the same content is already indexed; return True if it was (re)indexed"""
+        key = normalize_url(url) if '://' in url else url
+        content_hash = hashlib.sha256(markdown_content.encode('utf-8')).hexdigest()
+        with self.lock:
+            row = self.db.execute("SELECT id, content_hash, filename FROM documents WHERE url = ?", (key,)).fetchone()
+            if row and row['content_hash'] == content_hash:
+                if filename and filename != row['filename']:
+                    self.db.execute("UPDATE documents SET filename = ? WHERE id = ?", (filename, row['id']))
+                    self.db.commit()
+                return False
+
+            fields = extract_fields(markdown_content)
+            if row:
+                self.db.execute("DELETE FROM documents_fts WHERE rowid = ?", (row['id'],))
+                self.db.execute(
+                    "UPDATE documents SET filename = COALESCE(?, filename), content_hash = ?, indexed_at = ?"
+                    " WHERE id = ?",
+                    (filename, content_hash, time.time(), row['id'])
+                )
+                doc_id = row['id']
+            else:
+                doc_id = self.db.execute(
+                    "INSERT INTO documents (url, filename, content_hash, indexed_at) VALUES (?, ?, ?, ?)",
+                    (key, filename, content_hash, time.time())
+                ).lastrowid
+            self.db.execute(
+                "INSERT INTO documents_fts (rowid, url, title, headings, code, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (doc_id, key, fields['title'], fields['headings'], fields['code'], fields['body'])
+            )
+            self.db.commit()
+        logger.info(f"Indexed article for search: {key}")
+        return True
+
+    def remove(self, url):
+        key = normalize_url(url) if '://' in url else url
+        with self.lock:
+            row = self.db.execute("SELECT id FROM documents WHERE url = ?", (key,)).fetchone()
+            if row:
+                self.db.execute("DELETE FROM documents_fts WHERE rowid = ?", (row['id'],))
+                self.db.execute("DELETE FROM documents WHERE id = ?", (row['id'],))
+                self.db.commit()
+        return row is not None
+
+    def search(self, text, limit=20, offset=0):
+        """Return ranked ``{"url", "filename", "title", "snippet", "score"}`` dicts for a free-text query"""
+        query = build_query(text)
+        if not query:
+            return []
+        with self.lock:
+            rows = self.db.execute(
+                f"""
+                SELECT d.url, d.filename, f.title,
+                       snippet(documents_fts, -1, '**', '**', '…', 16) AS snippet,
+                       bm25(documents_fts, {', '.join(map(str, COLUMN_WEIGHTS))}) AS score
+                FROM documents_fts f JOIN documents d ON d.id = f.rowid
+                WHERE documents_fts MATCH ?
+                ORDER BY score
+                LIMIT ? OFFSET ?
+                """,
+                (query, limit, offset)
+            ).fetchall()
+        # bm25 越小越相关，取反后分数越大越好
+        return [dict(row, score=-row['score']) for row in rows]
+
+    def index_directory(self, directory):
+        """Index every markdown file under a directory, keyed by path; return (indexed, unchanged)"""
+        indexed = unchanged = 0
+        for path in sorted(Path(directory).rglob('*.md')):
+            try:
+                content = path.read_text(encoding='utf-8')
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping {path}: {str(e)}")
+                continue
+            if self.update(str(path.resolve()), content, filename=str(path)):
+                indexed += 1
+            else:
+                unchanged += 1
+        return indexed, unchanged
+
+    def stats(self):
+        with self.lock:
+            documents = self.db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        return {'documents': documents, 'path': self.path}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the full-text index of converted articles")
+    parser.add_argument('--index', default='cache/search.db', help="index database (default: cache/search.db)")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    add = subcommands.add_parser('add', help="index the markdown files under a directory")
+    add.add_argument('directory')
+    query = subcommands.add_parser('search', help="search the index")
+    query.add_argument('query')
+    query.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+
+    index = SearchIndex(args.index)
+    if args.command == 'add':
+        indexed, unchanged = index.index_directory(args.directory)
+        print(f"{indexed} indexed, {unchanged} unchanged")
+    else:
+        start = time.perf_counter()
+        results = index.search(args.query, limit=args.limit)
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"{len(results)} results in {(time.perf_counter() - start) * 1000:.1f} ms")
+    index.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,244 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlparse, urlunparse
+
+from article_cache import article_filename, normalize_url
+from medium_to_markdown import create_converter, load_config, setup_logging
+
+logger = logging.getLogger('MediumConverter')
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+def feed_url(url):
+    """Map an author, publication or custom-domain URL to its RSS feed.
+
+    ``https://medium.com/@alice`` -> ``https://medium.com/feed/@alice``,
+    ``https://medium.com/some-pub`` -> ``https://medium.com/feed/some-pub``,
+    ``https://blog.example.com`` -> ``https://blog.example.com/feed``.
+    URLs that already point at a feed are returned unchanged.
+    """
+    parsed = urlparse(url.strip())
+    segments = [segment for segment in parsed.path.split('/') if segment]
+    if 'feed' in segments:
+        return url.strip()
+    # medium.com 上的作者/出版物用路径区分，自定义域名和 alice.medium.com 子域名的 feed 在根路径
+    if parsed.netloc.lower() in ('medium.com', 'www.medium.com') and segments:
+        path = f"/feed/{segments[0]}"
+    else:
+        path = '/feed'
+    return urlunparse((parsed.scheme or 'https', parsed.netloc, path, '', '', ''))
+
+
+def parse_feed(xml_text):
+    """Return ``[{"id", "url", "title", "updated"}]`` for the items of an RSS or Atom feed"""
+    root = ET.fromstring(xml_text)
+    entries = []
+    for item in root.iter('item'):
+        link = (item.findtext('link') or '').strip()
+        updated = item.findtext(f'{ATOM}updated') or item.findtext('pubDate') or ''
+        entries.append({
+            "id": (item.findtext('guid') or link).strip(),
+            "url": link,
+            "title": (item.findtext('title') or '').strip(),
+            "updated": normalize_timestamp(updated),
+        })
+    for entry in root.iter(f'{ATOM}entry'):
+        link_element = entry.find(f"{ATOM}link[@rel='alternate']")
+        if link_element is None:
+            link_element = entry.find(f'{ATOM}link')
+        link = link_element.get('href', '').strip() if link_element is not None else ''
+        entries.append({
+            "id": (entry.findtext(f'{ATOM}id') or link).strip(),
+            "url": link,
+            "title": (entry.findtext(f'{ATOM}title') or '').strip(),
+            "updated": normalize_timestamp(entry.findtext(f'{ATOM}updated') or ''),
+        })
+    return [entry for entry in entries if entry['url']]
+
+
+def normalize_timestamp(value):
+    """RFC 822 dates (RSS pubDate) become ISO 8601, ISO values are kept as-is"""
+    value = value.strip()
+    if not value or value[:4].isdigit():
+        return value
+    try:
+        return parsedate_to_datetime(value).isoformat()
+    except (TypeError, ValueError):
+        return value
+
+
+class SyncState:
+    """JSON state file: feed validators plus when and from which version each article was converted"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'feeds': {}, 'articles': {}}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data.update(json.load(f))
+        except FileNotFoundError:
+            pass
+
+    def feed(self, url):
+        with self.lock:
+            return dict(self.data['feeds'].get(url, {}))
+
+    def article(self, article_id):
+        with self.lock:
+            return self.data['articles'].get(article_id)
+
+    def update_feed(self, url, **fields):
+        with self.lock:
+            self.data['feeds'].setdefault(url, {}).update(fields)
+        self.save()
+
+    def update_article(self, article_id, **fields):
+        with self.lock:
+            self.data['articles'].setdefault(article_id, {}).update(fields)
+        self.save()
+
+    def save(self):
+        """Write the state via a temporary file and an atomic rename"""
+        with self.lock:
+            data = json.dumps(self.data, indent=1, sort_keys=True, ensure_ascii=False)
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+
+class FeedSync:
+    """Mirrors an author's or publication's articles into a directory of markdown files.
+
+    The feed is fetched with a conditional GET, so an unchanged feed costs
+    one request. Only articles that are new or whose ``updated`` timestamp
+    changed since the last run are converted, in parallel. Feeds list only
+    the most recent stories; older articles stay in the state file and on disk.
+    """
+
+    def __init__(self, converter, output_dir, state_path=None, max_workers=4):
+        self.converter = converter
+        self.output_dir = output_dir
+        self.state = SyncState(state_path or os.path.join(output_dir, 'sync_state.json'))
+        self.max_workers = max(1, max_workers)
+
+    def fetch_feed(self, url, conditional=True):
+        """Return ``(xml, validators)``; ``xml`` is None if the feed did not change since the last sync"""
+        validators = self.state.feed(url) if conditional else {}
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        response = self.converter.fetcher.get(url, headers=headers, cookies=self.converter.auth.cookies, stream=True)
+        try:
+            if response.status_code == 304 and headers:
+                return None, validators
+            response.raise_for_status()
+            return self.converter.read_document(response), {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+        finally:
+            response.close()
+
+    def sync(self, url, force=False):
+        """Sync one author/publication/feed URL and return a summary dict"""
+        feed = feed_url(url)
+        logger.info(f"Syncing feed {feed}")
+        summary = {"feed": feed, "not_modified": False, "discovered": 0,
+                   "new": [], "changed": [], "unchanged": 0, "failed": [], "incomplete": []}
+
+        xml_text, validators = self.fetch_feed(feed, conditional=not force)
+        if xml_text is None:
+            logger.info(f"Feed not modified: {feed}")
+            summary['not_modified'] = True
+            self.state.update_feed(feed, synced_at=time.time())
+            return summary
+
+        # 去掉 ?source=rss 之类的跟踪参数，输出文件名和缓存键都更稳定
+        entries = [dict(entry, url=normalize_url(entry['url'])) for entry in parse_feed(xml_text)]
+        summary['discovered'] = len(entries)
+        pending = []
+        for entry in entries:
+            known = self.state.article(entry['id'])
+            if known is None:
+                summary['new'].append(entry['url'])
+                pending.append((entry, False))
+            elif force or known.get('updated') != entry['updated']:
+                summary['changed'].append(entry['url'])
+                pending.append((entry, True))
+            else:
+                summary['unchanged'] += 1
+
+        Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync') as executor:
+            futures = {executor.submit(self.convert_entry, entry, refresh): entry for entry, refresh in pending}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    if future.result():
+                        summary['incomplete'].append(entry['url'])
+                except Exception as e:
+                    logger.error(f"Sync failed for {entry['url']}: {str(e)}")
+                    summary['failed'].append({"url": entry['url'], "error": str(e)})
+
+        # 全部成功后才保存 feed 的校验值，否则下次会因 304 跳过失败的文章
+        if summary['failed'] or summary['incomplete']:
+            self.state.update_feed(feed, synced_at=time.time())
+        else:
+            self.state.update_feed(feed, synced_at=time.time(), **validators)
+        logger.info(f"Synced {feed}: {len(summary['new'])} new, {len(summary['changed'])} changed, "
+                    f"{summary['unchanged']} unchanged, {len(summary['failed'])} failed")
+        return summary
+
+    def convert_entry(self, entry, refresh):
+        """Convert one feed entry into the output directory; return the number of failed images"""
+        url = entry['url']
+        filename = os.path.join(self.output_dir, article_filename(url))
+        failed_images = []
+        self.converter.convert(url, filename=filename, failed_images=failed_images, refresh=refresh)
+        # 有图片失败时不记录 updated，下次同步会重试
+        self.state.update_article(
+            entry['id'],
+            url=url,
+            title=entry['title'],
+            filename=filename,
+            updated=entry['updated'] if not failed_images else None,
+            converted_at=time.time(),
+            failed_images=len(failed_images)
+        )
+        return len(failed_images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mirror a Medium author, publication or feed as markdown")
+    parser.add_argument('urls', nargs='+', help="author, publication or feed URLs")
+    parser.add_argument('--output', default='articles', help="directory for the markdown files (default: articles)")
+    parser.add_argument('--state', help="state file (default: <output>/sync_state.json)")
+    parser.add_argument('--workers', type=int, default=4, help="articles converted in parallel")
+    parser.add_argument('--force', action='store_true', help="re-convert every article in the feed")
+    args = parser.parse_args()
+
+    config = load_config()
+    setup_logging(config['MEDIUM_LOG_DIR'])
+    syncer = FeedSync(create_converter(config), args.output, args.state, max_workers=args.workers)
+    for url in args.urls:
+        summary = syncer.sync(url, force=args.force)
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
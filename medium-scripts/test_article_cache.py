@@ -0,0 +1,63 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from article_cache import ArticleCache, normalize_url
+
+
+class TestNormalizeUrl(TestCase):
+    def test_equivalent_links_share_a_key(self):
+        expected = 'https://medium.com/@jane/tiny-queue-1a2b3c'
+        for url in [
+            'https://medium.com/@jane/tiny-queue-1a2b3c',
+            'https://www.Medium.com/@jane/tiny-queue-1a2b3c/',
+            'https://medium.com/@jane/tiny-queue-1a2b3c?source=rss----1&utm_campaign=x',
+            'https://medium.com/@jane/tiny-queue-1a2b3c#section-2',
+        ]:
+            self.assertEqual(normalize_url(url), expected)
+
+    def test_meaningful_query_is_kept(self):
+        self.assertEqual(normalize_url('https://medium.com/p?b=2&a=1'), 'https://medium.com/p?a=1&b=2')
+
+
+class TestArticleCache(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = ArticleCache(os.path.join(self.tmp.name, 'articles.db'), max_bytes=10_000, ttl=60)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_put_and_get(self):
+        self.cache.put('https://medium.com/a?source=feed', '<html/>', '# A', etag='"v1"')
+
+        entry = self.cache.get('https://medium.com/a')
+
+        self.assertEqual(entry['markdown'], '# A')
+        self.assertEqual(entry['etag'], '"v1"')
+        self.assertTrue(entry['fresh'])
+        self.assertIsNone(self.cache.get('https://medium.com/b'))
+
+    def test_expired_entry_is_stale_until_revalidated(self):
+        self.cache.put('https://medium.com/a', '<html/>', '# A', etag='"v1"')
+        self.cache.db.execute("UPDATE articles SET fetched_at = ?", (time.time() - 120,))
+
+        self.assertFalse(self.cache.get('https://medium.com/a')['fresh'])
+        self.cache.mark_revalidated('https://medium.com/a')
+        self.assertTrue(self.cache.get('https://medium.com/a')['fresh'])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        body = 'x' * 3000
+        for name in 'abc':
+            self.cache.put(f'https://medium.com/{name}', body, '')
+            time.sleep(0.01)
+        self.cache.get('https://medium.com/a')
+
+        self.cache.put('https://medium.com/d', body, '')
+
+        self.assertIsNotNone(self.cache.get('https://medium.com/a'))
+        self.assertIsNone(self.cache.get('https://medium.com/b'))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertLessEqual(self.cache.stats()['bytes'], 10_000)
@@ -0,0 +1,79 @@
+import base64
+import io
+import os
+import tempfile
+import zipfile
+from unittest import TestCase, mock
+
+from export import iter_bundle, write_bundle
+from medium_to_markdown import MediumToMarkdown, create_app
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.tmp.name, 'images'))
+        self.big = os.urandom(3 * 1024 * 1024 + 7)
+        with open(os.path.join(self.tmp.name, 'images', 'big.png'), 'wb') as f:
+            f.write(self.big)
+        with open(os.path.join(self.tmp.name, 'images', 'small.webp'), 'wb') as f:
+            f.write(b'RIFF small')
+        self.markdown = ("# Title\n\n![Big](images/big.png)\n*Caption*\n\n![Small](images/small.webp)\n\n"
+                         "![Remote](https://example.com/x.png)\n\n![Missing](images/gone.png)")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_zip_bundle_streams_in_small_chunks(self):
+        chunks = list(iter_bundle(self.markdown, 'zip', 'post', base_dirs=(self.tmp.name,)))
+
+        self.assertLess(max(map(len, chunks)), 512 * 1024)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(sorted(archive.namelist()), ['images/big.png', 'images/small.webp', 'post.md'])
+            self.assertEqual(archive.read('images/big.png'), self.big)
+            self.assertEqual(archive.read('post.md').decode(), self.markdown)
+
+    def test_inline_markdown_embeds_local_images(self):
+        bundle = b''.join(iter_bundle(self.markdown, 'markdown', base_dirs=(self.tmp.name,))).decode()
+
+        encoded = base64.b64encode(self.big).decode()
+        self.assertIn(f"![Big](data:image/png;base64,{encoded})\n*Caption*", bundle)
+        self.assertIn("![Small](data:image/webp;base64,", bundle)
+        self.assertIn("![Remote](https://example.com/x.png)", bundle)
+        self.assertIn("![Missing](images/gone.png)", bundle)
+
+    def test_write_bundle_is_atomic(self):
+        path = os.path.join(self.tmp.name, 'out', 'post.zip')
+
+        def failing():
+            yield b'partial'
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            write_bundle(failing(), path)
+        self.assertEqual(os.listdir(os.path.dirname(path)), [])
+
+        size = write_bundle(iter_bundle(self.markdown, 'zip', base_dirs=(self.tmp.name,)), path)
+        self.assertEqual(size, os.path.getsize(path))
+
+    def test_export_endpoint(self):
+        app = create_app({
+            'MEDIUM_LOG_DIR': os.path.join(self.tmp.name, 'logs'),
+            'MEDIUM_IMAGE_DIR': os.path.join(self.tmp.name, 'images'),
+            'MEDIUM_COOKIE_FILE': os.path.join(self.tmp.name, 'cookies.txt'),
+            'MEDIUM_CACHE_PATH': '',
+            'MEDIUM_SEARCH_PATH': '',
+        })
+        markdown = f"# Title\n\n![Small]({os.path.relpath(os.path.join(self.tmp.name, 'images', 'small.webp'))})"
+
+        with mock.patch.object(MediumToMarkdown, 'convert', lambda self, url, refresh=False: markdown):
+            response = app.test_client().post('/export', json={'url': 'https://medium.com/@a/my-post-1a2b'})
+            bad = app.test_client().post('/export', json={'url': 'https://medium.com/@a/p', 'format': 'pdf'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename="my-post-1a2b.zip"')
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['images/small.webp', 'my-post-1a2b.md'])
+            self.assertEqual(archive.read('my-post-1a2b.md').decode(), "# Title\n\n![Small](images/small.webp)")
+        self.assertEqual(bad.status_code, 400)
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+import requests
+
+from fetcher import CircuitOpenError, Fetcher, TokenBucket, parse_retry_after
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/flaky fails twice with 503, /limited answers 429 once, /down always 500s, /slow stalls, /loop loops,
+    /cooldown answers 429 with a long Retry-After"""
+
+    hits = Counter()
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        count = self.hits[self.path]
+        if self.path == '/flaky' and count <= 2:
+            self.reply(503)
+        elif self.path == '/limited' and count == 1:
+            self.reply(429, {'Retry-After': '1'})
+        elif self.path == '/down':
+            self.reply(500)
+        elif self.path == '/cooldown':
+            self.reply(429, {'Retry-After': '120'})
+        elif self.path == '/loop':
+            self.reply(302, {'Location': '/loop'})
+        elif self.path == '/slow':
+            time.sleep(1)
+            self.reply(200)
+        else:
+            self.reply(200)
+
+    def reply(self, status, headers=None):
+        body = f"status {status}".encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFetcher(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubHandler.hits.clear()
+        self.session = requests.Session()
+        self.fetcher = Fetcher(self.session, max_retries=3, backoff=0.01, timeout=(1, 0.3),
+                               breaker_threshold=3, breaker_reset=60)
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_transient_errors_are_retried(self):
+        response = self.fetcher.get(f"{self.base_url}/flaky")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StubHandler.hits['/flaky'], 3)
+
+    def test_retry_after_is_respected(self):
+        start = time.monotonic()
+        response = self.fetcher.get(f"{self.base_url}/limited")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 1)
+
+    def test_long_retry_after_pauses_the_host(self):
+        # 冷却期超过 max_backoff：立即返回 429，但同主机的其他请求也要等
+        response = self.fetcher.get(f"{self.base_url}/cooldown")
+        bucket, _ = self.fetcher.host_state(f"127.0.0.1:{self.server.server_port}")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(StubHandler.hits['/cooldown'], 1)
+        self.assertGreater(bucket.paused_until - time.monotonic(), 100)
+
+    def test_read_timeout_gives_up_after_retries(self):
+        self.fetcher.breaker_threshold = 10
+        with self.assertRaises(requests.Timeout):
+            self.fetcher.get(f"{self.base_url}/slow")
+        self.assertEqual(StubHandler.hits['/slow'], 4)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        # 第三次失败后熔断打开，剩下的重试和同主机的其他请求都直接失败
+        with self.assertRaises(CircuitOpenError):
+            self.fetcher.get(f"{self.base_url}/down")
+        with self.assertRaises(CircuitOpenError):
+            self.fetcher.get(f"{self.base_url}/ok")
+        self.assertEqual(StubHandler.hits['/down'], 3)
+        self.assertEqual(StubHandler.hits['/ok'], 0)
+
+    def test_failed_half_open_trial_does_not_block_the_host(self):
+        _, breaker = self.fetcher.host_state(f"127.0.0.1:{self.server.server_port}")
+        self.session.max_redirects = 2
+        # 熔断已过冷却期：下一个请求是试探请求，它抛出的不是连接错误或超时
+        breaker.opened_at = time.monotonic() - 60
+        with self.assertRaises(requests.TooManyRedirects):
+            self.fetcher.get(f"{self.base_url}/loop")
+        self.assertFalse(breaker.trial_in_flight)
+
+        breaker.opened_at = time.monotonic() - 60
+        self.assertEqual(self.fetcher.get(f"{self.base_url}/ok").status_code, 200)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=20, burst=2)
+
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('7'), 7)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertAlmostEqual(parse_retry_after(time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 30))), 30, delta=2)
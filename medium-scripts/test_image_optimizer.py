@@ -0,0 +1,80 @@
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase, mock, skipUnless
+
+from image_optimizer import ImageOptimizer, optimizer_available, rewrite_references
+from medium_to_markdown import MediumToMarkdown
+
+
+def write_photo(path, width=1600, height=1000):
+    """A noisy RGB PNG with EXIF data, large enough that re-encoding pays off"""
+    from PIL import Image
+
+    image = Image.effect_noise((width, height), 40).convert('RGB')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'
+    image.save(path, 'PNG', exif=exif)
+    return path
+
+
+@skipUnless(optimizer_available('webp'), "Pillow with WebP support is not installed")
+class TestImageOptimizer(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.optimizer = ImageOptimizer('webp', max_width=800, workers=2)
+
+    def tearDown(self):
+        self.optimizer.shutdown()
+        self.tmp.cleanup()
+
+    def test_resize_reencode_and_strip_metadata(self):
+        from PIL import Image
+
+        source = write_photo(os.path.join(self.tmp.name, 'abc.png'))
+
+        path = self.optimizer.optimize(source)
+
+        self.assertEqual(os.path.basename(path), 'abc.w800.webp')
+        with Image.open(path) as image:
+            self.assertEqual(image.size, (800, 500))
+            self.assertFalse(image.getexif())
+        stats = self.optimizer.stats()
+        self.assertEqual((stats['images'], stats['optimized']), (1, 1))
+        self.assertGreater(stats['bytes_saved'], 0)
+        self.assertTrue(os.path.exists(source))
+        # 第二次直接复用已有结果，不再提交到进程池
+        self.assertEqual(self.optimizer.optimize(source), path)
+        self.assertEqual(self.optimizer.stats()['images'], 1)
+
+    def test_originals_can_be_dropped_and_svg_is_kept(self):
+        self.optimizer.keep_originals = False
+        source = write_photo(os.path.join(self.tmp.name, 'abc.png'))
+        svg = Path(self.tmp.name, 'logo.svg')
+        svg.write_text('<svg xmlns="http://www.w3.org/2000/svg"/>')
+
+        self.optimizer.optimize(source)
+
+        self.assertFalse(os.path.exists(source))
+        self.assertEqual(self.optimizer.optimize(str(svg)), str(svg))
+
+    def test_markdown_links_the_optimized_file(self):
+        source = write_photo(os.path.join(self.tmp.name, 'abc.png'))
+        converter = MediumToMarkdown(image_dir=self.tmp.name, optimizer=self.optimizer)
+        html = '<article><h1>T</h1><figure><img src="https://miro.medium.com/1*abc.png" alt="Pic"></figure></article>'
+
+        with mock.patch.object(MediumToMarkdown, 'fetch_image', lambda self, url, timer=None: source):
+            markdown = converter.extract_content(html)
+
+        self.assertIn('abc.w800.webp)', markdown)
+        self.assertIn('medium_images_total{outcome="optimized"} 1', converter.metrics.render())
+
+    def test_rewrite_references(self):
+        markdown = Path(self.tmp.name, 'post.md')
+        markdown.write_text("![a](images/abc.png)\n![b](https://example.com/abc.png)\n![c](images/other.png)\n")
+
+        self.assertTrue(rewrite_references(markdown, {'abc.png': 'abc.w800.webp'}))
+        self.assertEqual(
+            markdown.read_text(),
+            "![a](images/abc.w800.webp)\n![b](https://example.com/abc.png)\n![c](images/other.png)\n"
+        )
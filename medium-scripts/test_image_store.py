@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from image_store import ImageStore, canonical_image_id
+
+
+class TestCanonicalImageId(TestCase):
+    def test_resize_variants_collapse(self):
+        variants = [
+            'https://miro.medium.com/v2/resize:fit:700/1*queue.png',
+            'https://miro.medium.com/v2/resize:fit:1400/format:webp/1*queue.png',
+            'https://miro.medium.com/max/2000/1*queue.png',
+            'https://cdn-images-1.medium.com/fit/c/160/160/1*queue.png',
+        ]
+        self.assertEqual({canonical_image_id(url) for url in variants}, {'medium:1*queue.png'})
+
+    def test_other_hosts_keep_their_path_and_query(self):
+        self.assertEqual(canonical_image_id('https://example.com/a/b.png'), 'example.com/a/b.png')
+        self.assertEqual(canonical_image_id('https://example.com/a/b.png?w=100'), 'example.com/a/b.png?w=100')
+
+
+class TestImageStore(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.image_dir = self.tmp.name
+        self.store = ImageStore(self.image_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def add(self, url, data, ext='.png'):
+        fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return self.store.add(url, tmp_path, hashlib.sha256(data).hexdigest(), ext)
+
+    def image_files(self):
+        return sorted(name for name in os.listdir(self.image_dir) if name.endswith('.png'))
+
+    def test_identical_content_is_stored_once(self):
+        first = self.add('https://miro.medium.com/v2/1*a.png', b'same bytes')
+        second = self.add('https://example.com/mirror/a.png', b'same bytes')
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.image_files()), 1)
+        self.assertEqual(self.store.lookup('https://miro.medium.com/v2/resize:fit:640/1*a.png'), first)
+
+    def test_urls_differing_only_in_query_are_separate_assets(self):
+        first_url = 'https://chart.googleapis.com/chart?cht=p&chd=t:1'
+        second_url = 'https://chart.googleapis.com/chart?cht=p&chd=t:2'
+        first = self.add(first_url, b'chart one')
+        self.assertIsNone(self.store.lookup(second_url))
+        second = self.add(second_url, b'chart two')
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.store.lookup(first_url), first)
+        self.assertEqual(self.store.lookup(second_url), second)
+
+    def test_index_survives_restart(self):
+        path = self.add('https://miro.medium.com/v2/1*a.png', b'bytes')
+        self.store.flush()
+
+        reopened = ImageStore(self.image_dir)
+
+        self.assertEqual(reopened.lookup('https://miro.medium.com/max/800/1*a.png'), path)
+
+    def test_deleted_files_are_dropped_from_the_index(self):
+        # 例如另一个进程里的 gc 删掉了文件
+        path = self.add('https://miro.medium.com/v2/1*a.png', b'bytes')
+        self.add('https://example.com/mirror/a.png', b'bytes')
+        os.remove(path)
+
+        self.assertIsNone(self.store.lookup('https://miro.medium.com/v2/1*a.png'))
+        self.store.flush()
+        reopened = ImageStore(self.image_dir)
+        self.assertEqual((reopened.assets, reopened.hashes), ({}, {}))
+
+    def test_garbage_collection_keeps_referenced_images(self):
+        kept = self.add('https://miro.medium.com/v2/1*kept.png', b'kept')
+        dropped = self.add('https://miro.medium.com/v2/1*dropped.png', b'dropped')
+        article = Path(self.image_dir).parent / f"{Path(self.image_dir).name}-article.md"
+        article.write_text(f"# Title\n\n![Image]({kept})\n", encoding='utf-8')
+        self.addCleanup(article.unlink)
+
+        removed = self.store.collect_garbage([article])
+
+        self.assertEqual(removed, [dropped])
+        self.assertEqual(self.image_files(), [os.path.basename(kept)])
+        self.assertIsNone(self.store.lookup('https://miro.medium.com/v2/1*dropped.png'))
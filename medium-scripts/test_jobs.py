@@ -0,0 +1,56 @@
+import threading
+import time
+from unittest import TestCase
+
+from jobs import JobManager
+
+
+class FakeConverter:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def convert(self, url, filename=None, failed_images=None):
+        if url.endswith('/slow'):
+            self.release.wait(5)
+        if url.endswith('/broken'):
+            raise ValueError("Could not find article content")
+        return f"# {url}"
+
+
+class TestJobManager(TestCase):
+    def setUp(self):
+        self.converter = FakeConverter()
+        self.manager = JobManager(self.converter, max_workers=1)
+
+    def tearDown(self):
+        self.converter.release.set()
+        self.manager.shutdown()
+
+    def wait_for(self, job, timeout=5):
+        deadline = time.monotonic() + timeout
+        while job.finished_at is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return job.to_dict()
+
+    def test_results_and_errors_per_url(self):
+        job = self.manager.submit(['https://medium.com/a', 'https://medium.com/broken'])
+
+        result = self.wait_for(job)
+
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual([item['status'] for item in result['items']], ['done', 'failed'])
+        self.assertEqual(result['items'][0]['markdown'], '# https://medium.com/a')
+        self.assertIn('article content', result['items'][1]['error'])
+
+    def test_cancel_skips_queued_urls(self):
+        job = self.manager.submit(['https://medium.com/slow', 'https://medium.com/b', 'https://medium.com/c'])
+        while job.items[0]['status'] != 'running':
+            time.sleep(0.01)
+
+        self.manager.cancel(job.id)
+        self.assertEqual(job.status, 'cancelling')
+        self.converter.release.set()
+        result = self.wait_for(job)
+
+        self.assertEqual(result['status'], 'cancelled')
+        self.assertEqual([item['status'] for item in result['items']], ['done', 'cancelled', 'cancelled'])
@@ -0,0 +1,296 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import TestCase, mock
+
+from article_cache import ArticleCache
+from medium_to_markdown import (PARSER_BACKENDS, DocumentTooLargeError, MediumAuthentication, MediumToMarkdown,
+                                create_app, logger, parser_available)
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+
+
+def fake_fetch_image(self, img_url, timer=None):
+    """Pretend every image was downloaded to images/<last path segment>"""
+    return f"images/{img_url.rsplit('/', 1)[-1]}"
+
+
+ARTICLE_HTML = b"<html><body><article><h1>Cached</h1><p>Body text.</p></article></body></html>"
+
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    """Serve fake images under /img/, an ETag-versioned article at /article, anything else is a 404"""
+
+    article_etag = '"v1"'
+    article_requests = []
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            time.sleep(0.3)
+        if self.path.startswith(('/article', '/slow/article')):
+            self.article_requests.append(self.headers.get('If-None-Match'))
+            if self.headers.get('If-None-Match') == self.article_etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', self.article_etag)
+            self.send_header('Content-Length', str(len(ARTICLE_HTML)))
+            self.end_headers()
+            self.wfile.write(ARTICLE_HTML)
+        elif self.path.startswith('/img/'):
+            body = b'\x89PNG fake ' + self.path.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServerTestCase(TestCase):
+    handler = StubImageHandler
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), cls.handler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.converter = MediumToMarkdown(image_dir=self.tmp.name, max_image_workers=4, image_timeout=5)
+
+    def tearDown(self):
+        self.converter.session.close()
+        self.tmp.cleanup()
+
+
+class TestDownloadImages(StubServerTestCase):
+    def test_partial_failures_are_reported(self):
+        urls = [f"{self.base_url}/img/{i}.png" for i in range(6)] + [f"{self.base_url}/missing.png"]
+
+        paths, failures = self.converter.download_images(urls)
+
+        self.assertEqual(sorted(paths), sorted(urls[:6]))
+        self.assertEqual(list(failures), [urls[6]])
+        self.assertIn('404', failures[urls[6]])
+
+    def test_image_order_is_preserved(self):
+        html = "<html><body><h1>Title</h1><article>" + "".join(
+            f'<figure><img src="{self.base_url}/img/{i}.png" alt="pic {i}"></figure>' for i in range(5)
+        ) + f'<figure><img src="{self.base_url}/broken.png" alt="broken"></figure></article></body></html>'
+
+        failed_images = []
+        markdown = self.converter.extract_content(html, failed_images)
+
+        positions = [markdown.index(f"![pic {i}]") for i in range(5)]
+        self.assertEqual(positions, sorted(positions))
+        self.assertNotIn('broken', markdown)
+        self.assertEqual([f["url"] for f in failed_images], [f"{self.base_url}/broken.png"])
+
+
+class TestConvertCache(StubServerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.handler.article_requests.clear()
+        self.converter.cache = ArticleCache(os.path.join(self.tmp.name, 'articles.db'), ttl=60)
+
+    def tearDown(self):
+        self.converter.cache.close()
+        super().tearDown()
+
+    def test_hit_then_conditional_revalidation(self):
+        url = f"{self.base_url}/article"
+
+        first = self.converter.convert(url)
+        second = self.converter.convert(url + '?source=home')
+        self.converter.cache.db.execute("UPDATE articles SET fetched_at = 0")
+        third = self.converter.convert(url)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+        self.assertEqual(self.handler.article_requests, [None, '"v1"'])
+        stats = self.converter.cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['revalidations']), (1, 1, 1))
+
+
+class TestStream(StubServerTestCase):
+    def test_events_match_convert(self):
+        url = f"{self.base_url}/article"
+
+        events = list(self.converter.stream(url))
+
+        self.assertEqual([event['type'] for event in events], ['title', 'block', 'block', 'done'])
+        self.assertEqual(events[-1]['failed_images'], [])
+        streamed = '\n\n'.join(event['markdown'] for event in events[:-1])
+        self.assertEqual(streamed, self.converter.convert(url))
+
+
+class TestCoalescing(StubServerTestCase):
+    def test_concurrent_conversions_of_one_article_share_the_work(self):
+        self.handler.article_requests.clear()
+        url = f"{self.base_url}/slow/article"
+        saved = [os.path.join(self.tmp.name, f"copy{i}.md") for i in range(6)]
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(
+                lambda i: self.converter.convert(url + ('?source=feed' if i % 2 else ''), filename=saved[i]),
+                range(6)
+            ))
+
+        self.assertEqual(len(self.handler.article_requests), 1)
+        self.assertEqual(len(set(results)), 1)
+        for path in saved:
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), results[0])
+        self.assertIn('medium_coalesced_total{kind="conversion"} 5', self.converter.metrics.render())
+
+
+class TestMetricsEndpoint(StubServerTestCase):
+    def test_convert_reports_timings_and_metrics(self):
+        app = create_app({
+            'MEDIUM_LOG_DIR': os.path.join(self.tmp.name, 'logs'),
+            'MEDIUM_IMAGE_DIR': self.tmp.name,
+            'MEDIUM_COOKIE_FILE': os.path.join(self.tmp.name, 'cookies.txt'),
+            'MEDIUM_CACHE_PATH': '',
+            'MEDIUM_SEARCH_PATH': '',
+        })
+        client = app.test_client()
+
+        response = client.post('/convert', json={'url': f"{self.base_url}/article", 'timings': True})
+        plain = client.post('/convert', json={'url': f"{self.base_url}/article"})
+        client.post('/convert', json={'url': f"{self.base_url}/missing"})
+        text = client.get('/metrics').get_data(as_text=True)
+
+        self.assertEqual(set(response.get_json()['timings']), {'fetch', 'parse', 'find_all_images', 'clean', 'total'})
+        self.assertNotIn('timings', plain.get_json())
+        self.assertIn('medium_stage_duration_seconds_count{stage="total"} 3', text)
+        self.assertIn(f'medium_fetched_bytes_total{{kind="article"}} {2 * len(ARTICLE_HTML)}', text)
+        self.assertIn('medium_conversions_total{status="success"} 2', text)
+        self.assertIn('medium_errors_total{stage="fetch"} 1', text)
+
+
+@mock.patch.object(MediumToMarkdown, 'fetch_image', fake_fetch_image)
+class TestExtractContent(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.converter = MediumToMarkdown(image_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def convert_html(self, html):
+        return self.converter.join_blocks(block for _, block in self.converter.iter_content(html))
+
+    def test_regression_corpus(self):
+        for backend in filter(parser_available, PARSER_BACKENDS):
+            self.converter.parser = backend
+            for html_path in sorted(FIXTURES.glob('*.html')):
+                with self.subTest(backend=backend, fixture=html_path.name):
+                    expected = html_path.with_suffix('.md').read_text(encoding='utf-8')
+                    actual = self.convert_html(html_path.read_text(encoding='utf-8'))
+                    self.assertEqual(actual + '\n', expected)
+
+    def test_size_limits(self):
+        html = "<article>" + "<p>text</p>" * 100 + "</article>"
+
+        self.converter.max_tree_nodes = 150
+        with self.assertRaises(DocumentTooLargeError):
+            self.converter.extract_content(html)
+
+        self.converter.max_tree_nodes = None
+        self.converter.max_document_bytes = 500
+        with self.assertRaises(DocumentTooLargeError):
+            self.converter.extract_content(html)
+
+    def test_nested_blocks_are_emitted_once(self):
+        html = ("<article><blockquote><p>quoted</p></blockquote>"
+                "<ul><li><p>item</p></li></ul><div><div><p>para</p></div></div></article>")
+
+        markdown = self.convert_html(html)
+
+        self.assertEqual(markdown.count('quoted'), 1)
+        self.assertEqual(markdown.count('item'), 1)
+        self.assertEqual(markdown.count('para'), 1)
+
+    def test_clean_block(self):
+        raw = "# Title\nText\x07 \n\n\n\n\nMore\n* \n![Image](images/a.png)\n*Caption*\n```\n# comment\ncode\n```"
+
+        self.assertEqual(
+            self.converter.clean_block(raw),
+            "# Title\n\nText\n\n\nMore\n![Image](images/a.png)\n\n*Caption*\n```\n# comment\ncode\n```"
+        )
+
+    def test_deep_nesting(self):
+        depth = 3000
+        html = "<article>" + "<div>" * depth + "<p>deep</p>" + "</div>" * depth + "</article>"
+
+        self.assertEqual(self.convert_html(html), 'deep')
+
+
+class TestApp(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config = {
+            'MEDIUM_LOG_DIR': os.path.join(self.tmp.name, 'logs'),
+            'MEDIUM_IMAGE_DIR': os.path.join(self.tmp.name, 'images'),
+            'MEDIUM_COOKIE_FILE': os.path.join(self.tmp.name, 'cookies.txt'),
+            'MEDIUM_CACHE_PATH': os.path.join(self.tmp.name, 'cache', 'articles.db'),
+            'MEDIUM_SEARCH_PATH': os.path.join(self.tmp.name, 'cache', 'search.db'),
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_apps_are_independent_and_logging_is_set_up_once(self):
+        first = create_app(self.config)
+        handlers = list(logger.handlers)
+        second = create_app(dict(self.config, MEDIUM_CACHE_PATH=''))
+
+        self.assertEqual(logger.handlers, handlers)
+        self.assertIsNot(first.extensions['medium_converter'], second.extensions['medium_converter'])
+        self.assertEqual(first.test_client().get('/cache/stats').status_code, 200)
+        self.assertEqual(second.test_client().get('/cache/stats').status_code, 404)
+
+    def test_converted_articles_are_searchable(self):
+        app = create_app(self.config)
+        client = app.test_client()
+        html = "<html><body><article><h1>Profiling Services</h1><p>Measure the flame graph.</p></article></body></html>"
+
+        with mock.patch.object(MediumToMarkdown, 'fetch_document', lambda self, url, **kwargs: (html, {})):
+            client.post('/convert', json={'url': 'https://medium.com/@a/profiling-1a2b'})
+        response = client.get('/search', query_string={'q': 'flame'})
+
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual([r['url'] for r in results], ['https://medium.com/@a/profiling-1a2b'])
+        self.assertEqual(results[0]['title'], 'Profiling Services')
+        self.assertEqual(client.get('/search').status_code, 400)
+
+    def test_cookie_update_is_picked_up_by_other_workers(self):
+        app = create_app(self.config)
+        other_worker = MediumAuthentication(self.config['MEDIUM_COOKIE_FILE'], reload_interval=0)
+
+        response = app.test_client().post('/auth/cookies', json={'cookies': 'sid=abc; uid=42'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app.extensions['medium_converter'].auth.cookies, {'sid': 'abc', 'uid': '42'})
+        self.assertEqual(other_worker.cookies, {'sid': 'abc', 'uid': '42'})
+        self.assertEqual([name for name in os.listdir(self.tmp.name) if name.endswith('.tmp')], [])
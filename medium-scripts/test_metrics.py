@@ -0,0 +1,45 @@
+import threading
+from unittest import TestCase
+
+from metrics import ConverterMetrics, Counter, Histogram, StageTimer
+
+
+class TestMetrics(TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('latency_seconds', "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage='fetch')
+
+        lines = histogram.render()
+
+        self.assertIn('latency_seconds_bucket{stage="fetch",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{stage="fetch",le="1.0"} 3', lines)
+        self.assertIn('latency_seconds_bucket{stage="fetch",le="+Inf"} 4', lines)
+        self.assertIn('latency_seconds_count{stage="fetch"} 4', lines)
+        self.assertIn('latency_seconds_sum{stage="fetch"} 4.05', lines)
+
+    def test_counter_is_thread_safe_and_escapes_labels(self):
+        counter = Counter('errors_total', "Errors")
+        threads = [threading.Thread(target=lambda: [counter.inc(stage='a"b') for _ in range(1000)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counter.render()[-1], 'errors_total{stage="a\\"b"} 8000')
+
+    def test_stage_timer_records_errors_and_breakdown(self):
+        metrics = ConverterMetrics()
+        timer = StageTimer(metrics, keep=True)
+
+        with timer.stage('parse'):
+            pass
+        with self.assertRaises(ValueError):
+            with timer.stage('fetch'):
+                raise ValueError("boom")
+
+        self.assertEqual(sorted(timer.timings), ['fetch', 'parse'])
+        text = metrics.render()
+        self.assertIn('medium_errors_total{stage="fetch"} 1', text)
+        self.assertIn('medium_stage_duration_seconds_count{stage="parse"} 1', text)
+        self.assertIsNone(StageTimer(metrics).timings)
@@ -0,0 +1,74 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from search_index import SearchIndex, build_query, extract_fields
+
+QUEUE_POST = """# Building a Tiny Queue in Go
+
+Queues are everywhere.
+
+## The worker loop
+
+```go
+for job := range jobs {
+    results <- process(job)
+}
+```
+
+![Queue diagram](images/queue.png)
+*Producers and consumers*"""
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = SearchIndex(os.path.join(self.tmp.name, 'search.db'))
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp.cleanup()
+
+    def test_extract_fields(self):
+        fields = extract_fields(QUEUE_POST)
+
+        self.assertEqual(fields['title'], 'Building a Tiny Queue in Go')
+        self.assertEqual(fields['headings'], 'The worker loop')
+        self.assertIn('results <- process(job)', fields['code'])
+        self.assertNotIn('images/queue.png', fields['body'])
+        self.assertIn('*Producers and consumers*', fields['body'])
+
+    def test_ranking_snippets_and_incremental_updates(self):
+        self.assertTrue(self.index.update('https://medium.com/@a/queue?source=rss', QUEUE_POST, 'queue.md'))
+        self.index.update('https://medium.com/@a/other', "# Cooking\n\nA queue formed outside the bakery.")
+
+        results = self.index.search('queue')
+
+        self.assertEqual([r['url'] for r in results], ['https://medium.com/@a/queue', 'https://medium.com/@a/other'])
+        self.assertEqual(results[0]['filename'], 'queue.md')
+        self.assertIn('**Queue**', results[0]['snippet'])
+        self.assertEqual(self.index.search('process'), self.index.search('proc*')[:1])
+        # 内容未变时不重建索引，变化后旧内容不再可搜
+        self.assertFalse(self.index.update('https://medium.com/@a/queue', QUEUE_POST))
+        self.assertTrue(self.index.update('https://medium.com/@a/queue', "# Building a Tiny Stack"))
+        self.assertEqual([r['url'] for r in self.index.search('queue')], ['https://medium.com/@a/other'])
+        self.assertEqual(self.index.stats()['documents'], 2)
+
+    def test_query_syntax_is_escaped(self):
+        self.index.update('https://medium.com/@a/queue', QUEUE_POST)
+
+        self.assertEqual(build_query('go AND "worker" (loop'), '"go" "AND" "worker" "loop"')
+        self.assertEqual(len(self.index.search('worker (loop')), 1)
+        self.assertEqual(self.index.search('***'), [])
+
+    def test_index_directory_skips_unchanged_files(self):
+        articles = os.path.join(self.tmp.name, 'articles')
+        os.makedirs(articles)
+        for name in ('a', 'b'):
+            with open(os.path.join(articles, f'{name}.md'), 'w', encoding='utf-8') as f:
+                f.write(f"# Post {name}\n\nText")
+
+        self.assertEqual(self.index.index_directory(articles), (2, 0))
+        with open(os.path.join(articles, 'b.md'), 'a', encoding='utf-8') as f:
+            f.write(" changed")
+        self.assertEqual(self.index.index_directory(articles), (1, 1))
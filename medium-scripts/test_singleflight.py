@@ -0,0 +1,52 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from singleflight import SingleFlight
+
+
+class TestSingleFlight(TestCase):
+    def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+
+        def work():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'result'
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            leader = executor.submit(flight.do, 'key', work)
+            started.wait()
+            followers = [executor.submit(flight.do, 'key', work) for _ in range(7)]
+            results = [leader.result()] + [future.result() for future in followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0], ('result', False))
+        self.assertEqual(results[1:], [('result', True)] * 7)
+        self.assertEqual(flight.in_flight(), 0)
+        # 完成后不再复用，下一次调用重新执行
+        self.assertEqual(flight.do('key', work), ('result', False))
+        self.assertEqual(len(calls), 2)
+
+    def test_exceptions_are_shared_and_forgotten(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError("boom")
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'key', fail)
+            started.wait()
+            follower = executor.submit(flight.do, 'key', fail)
+            for future in (leader, follower):
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertEqual(flight.do('key', lambda: 1), (1, False))
@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from medium_to_markdown import MediumToMarkdown
+from article_cache import article_filename
+from sync import FeedSync, feed_url, parse_feed
+
+RSS = """<?xml version="1.0" encoding="UTF-8"?>
+<rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0"><channel><title>Pub</title>
+{items}
+</channel></rss>"""
+ITEM = """<item><title>{slug}</title><link>{base}/pub/{slug}?source=rss----abc</link>
+<guid isPermaLink="false">{base}/p/{slug}</guid><atom:updated>{updated}</atom:updated></item>"""
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serve an RSS feed at /feed/pub (ETag = feed version) and articles at /pub/<slug>"""
+    updates = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        if self.path == '/feed/pub':
+            etag = f'"{hash(tuple(sorted(self.updates.items())))}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            base = f"http://{self.headers['Host']}"
+            items = "".join(ITEM.format(base=base, slug=slug, updated=updated) for slug, updated in self.updates.items())
+            self.reply('application/rss+xml; charset=utf-8', RSS.format(items=items).encode(), etag)
+        elif self.path.startswith('/pub/'):
+            slug = self.path[len('/pub/'):].split('?')[0]
+            html = f"<html><body><article><h1>{slug}</h1><p>Version {self.updates.get(slug)}</p></article></body></html>"
+            self.reply('text/html; charset=utf-8', html.encode())
+        else:
+            self.reply('text/plain', b'', status=404)
+
+    def reply(self, content_type, body, etag=None, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFeedHelpers(TestCase):
+    def test_feed_url(self):
+        self.assertEqual(feed_url('https://medium.com/@alice'), 'https://medium.com/feed/@alice')
+        self.assertEqual(feed_url('https://medium.com/some-pub/'), 'https://medium.com/feed/some-pub')
+        self.assertEqual(feed_url('https://blog.example.com'), 'https://blog.example.com/feed')
+        self.assertEqual(feed_url('https://medium.com/feed/@alice'), 'https://medium.com/feed/@alice')
+
+    def test_parse_atom_and_rfc822_dates(self):
+        atom = ('<feed xmlns="http://www.w3.org/2005/Atom"><entry><id>urn:1</id><title>A</title>'
+                '<link rel="alternate" href="https://x.com/a"/><updated>2024-01-02T00:00:00Z</updated></entry></feed>')
+        rss = ('<rss><channel><item><link>https://x.com/b</link>'
+               '<pubDate>Tue, 02 Jan 2024 10:00:00 GMT</pubDate></item></channel></rss>')
+
+        self.assertEqual(parse_feed(atom), [{"id": "urn:1", "url": "https://x.com/a", "title": "A",
+                                             "updated": "2024-01-02T00:00:00Z"}])
+        self.assertEqual(parse_feed(rss)[0]['updated'], '2024-01-02T10:00:00+00:00')
+        self.assertEqual(article_filename('https://medium.com/@a/my-post-1a2b?x=1'), 'my-post-1a2b.md')
+
+
+class TestFeedSync(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        FeedHandler.updates = {'one': '2024-01-01', 'two': '2024-01-01', 'three': '2024-01-01'}
+        FeedHandler.requests = []
+        self.converter = MediumToMarkdown(image_dir=os.path.join(self.tmp.name, 'images'))
+        self.output = os.path.join(self.tmp.name, 'articles')
+
+    def tearDown(self):
+        self.converter.session.close()
+        self.tmp.cleanup()
+
+    def sync(self):
+        return FeedSync(self.converter, self.output, max_workers=3).sync(f"{self.base_url}/feed/pub")
+
+    def test_only_new_and_changed_articles_are_converted(self):
+        first = self.sync()
+        FeedHandler.requests.clear()
+        unchanged = self.sync()
+        FeedHandler.updates['two'] = '2024-02-01'
+        changed = self.sync()
+
+        self.assertEqual(len(first['new']), 3)
+        self.assertEqual(sorted(os.listdir(self.output)), ['one.md', 'sync_state.json', 'three.md', 'two.md'])
+        self.assertTrue(unchanged['not_modified'])
+        self.assertEqual(FeedHandler.requests[0], '/feed/pub')
+        self.assertEqual(FeedHandler.requests[1:], ['/feed/pub', '/pub/two'])
+        self.assertEqual((changed['changed'], changed['unchanged']), ([f"{self.base_url}/pub/two"], 2))
+        with open(os.path.join(self.output, 'two.md'), encoding='utf-8') as f:
+            self.assertIn('Version 2024-02-01', f.read())
+        with open(os.path.join(self.output, 'sync_state.json'), encoding='utf-8') as f:
+            state = json.load(f)
+        self.assertEqual(state['articles'][f"{self.base_url}/p/two"]['updated'], '2024-02-01')
@@ -0,0 +1,12 @@
+"""WSGI entrypoint for production serving.
+
+Run with a pre-fork server, e.g.:
+
+    gunicorn --workers 4 --threads 8 --bind 0.0.0.0:5050 wsgi:app
+
+Each worker process imports this module and builds its own app, converter
+and job manager; see README.md for what is shared between workers.
+"""
+from medium_to_markdown import create_app
+
+app = create_app()
@@ -1,17 +1,228 @@
+import argparse
+import asyncio
+import functools
+import hashlib
 import json
+import logging
+import os
+import random
 import re
 
+import sys
+
 from dotenv import load_dotenv
-from langchain_anthropic import ChatAnthropic
-from langchain_core.output_parsers import BaseOutputParser, JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import BaseOutputParser
 from langchain_core.prompts import PromptTemplate
-from langchain_core.tracers import ConsoleCallbackHandler
-from langchain_openai import ChatOpenAI
+
+# llm-common 是仓库内两个脚本共用的模块目录
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'llm-common'))
+from cached_chat_model import CachedChatModel  # noqa: E402
+from llm_cache import cache_from_env, request_scope  # noqa: E402
+from llm_metrics import LLMMetrics  # noqa: E402
+from metrics_callback import MetricsCallbackHandler  # noqa: E402
 
 load_dotenv()
 
-model = ChatAnthropic(model='claude-3-opus-20240229')
-# model = ChatOpenAI(model='gpt-4o')
+
+@functools.cache
+def get_model():
+    """
+    默认的聊天模型，第一次调用时才导入供应商 SDK 并创建。
+
+    导入本模块（测试、工具脚本）不再加载 langchain_anthropic / anthropic；
+    之后的调用复用同一个实例，也就复用它的 HTTP 连接池。
+    """
+    from langchain_anthropic import ChatAnthropic
+    # 换用 OpenAI：from langchain_openai import ChatOpenAI; return ChatOpenAI(model='gpt-4o')
+    return ChatAnthropic(model='claude-3-opus-20240229')
+
+
+logger = logging.getLogger(__name__)
+
+# 相似度只比较题目开头描述场景的部分，去掉每道题都会出现的词和模板里的固定说法
+SIMILARITY_STOPWORDS = frozenset("""
+    a an and are as at be by can each for from has have in into is it its of on or should such that the their this
+    to use using which will with your you we our how what need needs must
+    design system object oriented principles go golang model create implement build develop write demonstrate
+    programming program code concept concepts oop class classes struct structs method methods
+    simple basic complex beginner intermediate advanced level
+""".split())
+# 场景至少取这么多个有效词，第一句不够时接着取后面的句子
+MIN_SCENARIO_WORDS = 5
+MERSENNE_PRIME = (1 << 61) - 1
+
+REQUIRED_KEYS = ('exercise', 'answer', 'explanation', 'level')
+# 第一个 { 之前最多容忍的字符数，超过说明模型没有按格式输出
+MAX_PREAMBLE = 2000
+
+BATCH_OUTPUT_FORMAT = """Output format:
+Create {COUNT} different exercises, each built around a distinct scenario.
+Generate your response as a single JSON array with one object per exercise:
+
+<output_format>
+```json
+[
+  {{
+  "exercise": "The complete text of the exercise question",
+  "answer": "The complete code solution to the exercise",
+  "explanation": "A detailed explanation of the solution and related concepts, and why do this design cons and props",
+  "level": "how hard of  this  exercise,  beginner: a basic practice  intermediate: one part of system, advanced: a complex system oop design e.g kubernetes, google engine"
+  }}
+]
+```
+</output_format>
+
+Ensure that each object contains the appropriate content as described in the instructions above. The array should be valid JSON and properly formatted.
+
+Remember to tailor the difficulty and complexity of the exercises to match the specified difficulty level, and use appropriate syntax and features of the given programming language.
+"""
+
+
+def repair_json(text) -> str:
+    """修复模型常见的 JSON 问题：去掉 } 或 ] 前多余的逗号，转义字符串里的换行和制表符"""
+    repaired = []
+    in_string = escaped = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            else:
+                char = {'\n': '\\n', '\r': '\\r', '\t': '\\t'}.get(char, char)
+            repaired.append(char)
+            continue
+        if char in '}]' and pending_comma is not None:
+            # 逗号之后只有空白，删除它不影响其他位置
+            del repaired[pending_comma]
+        if char == ',':
+            pending_comma = len(repaired)
+        elif not char.isspace():
+            pending_comma = None
+        in_string = char == '"'
+        repaired.append(char)
+    return ''.join(repaired)
+
+
+def load_exercise(text) -> dict:
+    """解析一道题的 JSON 对象，失败时先本地修复再试，并检查必需字段"""
+    try:
+        exercise = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        try:
+            exercise = json.loads(repair_json(text), strict=False)
+        except json.JSONDecodeError as e:
+            raise OutputParserException(f"无法解析为有效的 JSON: {str(e)}", llm_output=text)
+    if not isinstance(exercise, dict):
+        raise OutputParserException("Exercise is not a JSON object", llm_output=text)
+    missing = [key for key in REQUIRED_KEYS if key not in exercise]
+    if missing:
+        raise OutputParserException(f"Exercise is missing {', '.join(missing)}", llm_output=text)
+    return exercise
+
+
+class ExerciseStreamParser:
+    """
+    增量解析单道题的流式输出。
+
+    从第一个 { 开始按 JSON 语法跟踪字符串和嵌套，answer 里的 ```go 代码块不会让解析提前结束，
+    顶层对象闭合即完成。必需字段重复或不是字符串、开头迟迟没有 JSON 时立即抛出
+    OutputParserException，调用方可以马上取消这次生成。
+    """
+
+    def __init__(self, max_preamble=MAX_PREAMBLE):
+        self.max_preamble = max_preamble
+        self.preamble = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.current = []
+        self.keys = []
+        self.key = None
+        # 顶层对象中下一个应出现的内容：key / colon / value / comma；
+        # scalar 表示正在读数字、true/false/null，直到 , 或 }
+        self.expect = 'key'
+
+    def feed(self, text):
+        """返回解析完成的题目；尚未完成时返回 None"""
+        for char in text:
+            if self.depth == 0:
+                if char == '{':
+                    self.depth = 1
+                    self.current = [char]
+                    continue
+                self.preamble += 1
+                if self.preamble > self.max_preamble:
+                    raise OutputParserException(f"No JSON object in the first {self.max_preamble} characters")
+                continue
+
+            self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.key is not None:
+                        self.check_key(''.join(self.key))
+                        self.key = None
+                elif self.key is not None:
+                    self.key.append(char)
+                continue
+
+            if self.depth == 1:
+                self.check_top_level(char)
+            if char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    return load_exercise(''.join(self.current))
+        return None
+
+    def check_key(self, key):
+        if key in REQUIRED_KEYS and key in self.keys:
+            raise OutputParserException(f"Duplicate field '{key}'")
+        self.keys.append(key)
+
+    def check_top_level(self, char):
+        if char.isspace():
+            return
+        if self.expect == 'key':
+            if char == '"':
+                self.key = []
+                self.expect = 'colon'
+            elif char != '}':
+                raise OutputParserException(f"Expected a field name, got {char!r}")
+        elif self.expect == 'colon':
+            if char != ':':
+                raise OutputParserException(f"Expected ':' after '{self.keys[-1]}', got {char!r}")
+            self.expect = 'value'
+        elif self.expect == 'value':
+            if self.keys[-1] in REQUIRED_KEYS and char != '"':
+                raise OutputParserException(f"Field '{self.keys[-1]}' must be a string")
+            # 字符串、对象、数组由 feed 跟踪到结束；其余是标量，逐字符跳过
+            self.expect = 'comma' if char in '"{[' else 'scalar'
+        elif self.expect == 'scalar':
+            if char == ',':
+                self.expect = 'key'
+        elif char == ',':
+            self.expect = 'key'
+        elif char != '}':
+            raise OutputParserException(f"Expected ',' or '}}', got {char!r}")
+
+    def close(self):
+        """流结束但对象未闭合时调用：只缺最后的 } 就补上，否则抛出异常"""
+        if self.depth == 1 and not self.in_string and self.expect in ('key', 'comma', 'scalar'):
+            return load_exercise(''.join(self.current) + '}')
+        raise OutputParserException("Output ended before the exercise was complete")
 
 
 class GeneratorOutputParser(BaseOutputParser):
@@ -20,34 +231,23 @@ class GeneratorOutputParser(BaseOutputParser):
         解析文本中的 Markdown JSON 部分。
 
         Args:
-            text (str): 需要解析的文本，假定包含一个 ` ```json ... ``` `代码块.
+            text (str): 需要解析的文本，通常包含一个 ` ```json ... ``` `代码块，
+                字段内容里可以有 ` ```go ` 之类的代码块。
 
         Returns:
-            dict: 解析后的 JSON 数据（如果找到）。
+            dict: 解析后的 JSON 数据。
         """
-        # 使用正则表达式提取 ```json ``` 包裹的部分
-        regex = r'```json\s*([\s\S]+?)```'
+        parser = ExerciseStreamParser(max_preamble=len(text))
+        exercise = parser.feed(text)
+        return exercise if exercise is not None else parser.close()
 
-        # Using re.search instead of re.match
-        match = re.search(regex, text)
-
-        if not match:
-            raise ValueError(f"cannot parse the response {text}")
-
-        # Extracting JSON content from the matched group
-        json_content = match.group(1)
-
-        if match:
-            try:
-                content = json.loads(json_content)
-                return content
-            except json.JSONDecodeError as e:
-                raise ValueError(f"无法解析为有效的 JSON: {json_content}")
-        else:
-            raise ValueError("找不到符合 ` ```json ... ``` ` 模式的内容")
 
+def load_prompt(path, batch=False) -> PromptTemplate:
+    """
+    生成题目的 prompt。
 
-def load_prompt(path) -> PromptTemplate:
+    ``batch=True`` 时要求模型一次返回 ``{COUNT}`` 道题组成的 JSON 数组，其余说明不变。
+    """
     # with open(path, "r") as f:
     #     template = f.read()
 
@@ -88,7 +288,8 @@ Instructions for generating the explanation:
 3. Explain why certain design choices were made and how they relate to object-oriented principles.
 4. If applicable, mention any alternative approaches and why the chosen solution is preferred.
 
-Output format:
+"""
+    output_template = """Output format:
 Generate your response in markdown format with the following structure:
 
 <output_format>
@@ -106,31 +307,554 @@ Ensure that each field contains the appropriate content as described in the inst
 
 Remember to tailor the difficulty and complexity of the exercise to match the specified difficulty level, and use appropriate syntax and features of the given programming language.
     """
-    return PromptTemplate(input_variables=["DIFFICULTY_LEVEL", "PROGRAMMING_LANGUAGE", "TOPIC"], template=generator_template)
+    if batch:
+        return PromptTemplate(input_variables=["DIFFICULTY_LEVEL", "PROGRAMMING_LANGUAGE", "TOPIC", "COUNT"],
+                              template=generator_template + BATCH_OUTPUT_FORMAT)
+    return PromptTemplate(input_variables=["DIFFICULTY_LEVEL", "PROGRAMMING_LANGUAGE", "TOPIC"], template=generator_template + output_template)
+
+
+def is_rate_limit_error(error) -> bool:
+    """
+    判断异常是否来自服务商限流（429）或过载（529）。
+
+    Anthropic 和 OpenAI 的 SDK 各自定义 RateLimitError，这里按状态码和类名判断，不依赖具体 SDK。
+    """
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    name = type(error).__name__.lower()
+    return status in (429, 529) or 'ratelimit' in name or 'overloaded' in name
+
+
+def retry_after(error):
+    """Seconds from the Retry-After header of a rate limit error, or None"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """
+    限制同时进行的模型调用数，并根据限流自适应调整。
+
+    遇到限流时上限减半并暂停所有新请求，之后每连续成功 ``limit`` 次上限加一，
+    直到恢复为 ``max_concurrency``（AIMD）。
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.paused_until = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self.paused_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, rate_limited=False, delay=0.0):
+        async with self.condition:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+                self.paused_until = max(self.paused_until, asyncio.get_running_loop().time() + delay)
+            else:
+                self.successes += 1
+                if self.limit < self.max_concurrency and self.successes >= self.limit:
+                    self.limit += 1
+                    self.successes = 0
+            self.condition.notify_all()
+
+
+class ResultWriter:
+    """
+    把每道题在完成时追加写入 JSONL 文件，崩溃时已生成的题目不会丢失。
+
+    每行形如 ``{"slot": 3, "exercise": {...}}``，``slot`` 是题目在本次运行中的序号。
+    ``resume=True`` 时读取已有记录，``completed`` 中的序号可以跳过；否则清空文件重新开始。
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.completed = set()
+        if resume and os.path.exists(path):
+            self.completed = set(read_results(path))
+            self.truncate_partial_line()
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def truncate_partial_line(self):
+        # 崩溃时最后一行可能只写了一半，截掉它，否则新记录会接在残行后面
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
 
+    def write(self, slot, exercise):
+        self.file.write(json.dumps({"slot": slot, "exercise": exercise}, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.completed.add(slot)
 
-def generate_practice(number, topic, level, language, prompt, outputParser):
-    result = []
-    for i in range(number):
-        # prompt.format(DIFFICULTY_LEVEL=level, PROGRAMMING_LANGUAGE=language, TOPIC=topic)
-        chain = prompt | model | outputParser
-        current_result = chain.invoke(
-            {
-                "DIFFICULTY_LEVEL": level,
-                "PROGRAMMING_LANGUAGE": language,
-                "TOPIC": topic
-            },
-            config={"callbacks": [ConsoleCallbackHandler()]},
-        )
-        current_result['level'] = level
-        result.append(current_result)
-    return result
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_results(path) -> dict:
+    """读取 JSONL 结果文件，返回 ``{slot: exercise}``；无法解析的行（写了一半的记录）会被跳过"""
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                results[record['slot']] = record['exercise']
+            except (json.JSONDecodeError, KeyError, TypeError):
+                logger.warning(f"Skipping unreadable line {line_number} in {path}")
+    return results
+
+
+def compact_results(jsonl_path, json_path) -> int:
+    """把 JSONL 结果按序号整理成 JSON 数组，先写临时文件再原子替换；返回题目数量"""
+    results = read_results(jsonl_path)
+    exercises = [results[slot] for slot in sorted(results)]
+    tmp_path = f"{json_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(exercises, f, indent=4)
+    os.replace(tmp_path, json_path)
+    return len(exercises)
+
+
+def exercise_scenario(exercise) -> str:
+    """题目文本的第一句"""
+    text = exercise.get('exercise', '') if isinstance(exercise, dict) else str(exercise)
+    return re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+
+
+def exercise_shingles(exercise, size=1, stopwords=SIMILARITY_STOPWORDS) -> set:
+    """
+    题目场景的词 shingle 集合；复数简单去掉结尾的 s，vehicle 和 vehicles 视为同一个词。
+
+    "In Golang, design an advanced system to model a library system." 去掉停用词后只剩
+    library 一个词，这时接着取后面的句子，直到至少 ``MIN_SCENARIO_WORDS`` 个词。
+    """
+    text = exercise.get('exercise', '') if isinstance(exercise, dict) else str(exercise)
+    words = []
+    for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+        words.extend(word.rstrip('s') for word in re.findall(r'[a-z0-9]+', sentence.lower()) if word not in stopwords)
+        if len(words) >= MIN_SCENARIO_WORDS:
+            break
+    return {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))} - {''}
+
+
+class MinHashIndex:
+    """
+    用 MinHash + LSH 查找场景相似的题目。
+
+    LSH 分桶只用来挑候选，候选再按 shingle 集合的 Jaccard 相似度精确比较，
+    相似度不低于 ``threshold`` 即视为重复。``ignore`` 传入本次生成的主题、难度、语言，
+    这些词每道题都会出现，不参与比较。
+    """
+
+    def __init__(self, threshold=0.4, num_perm=64, bands=32, shingle_size=1, seed=42, ignore=()):
+        rng = random.Random(seed)
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.stopwords = SIMILARITY_STOPWORDS.union(*(re.findall(r'[a-z0-9]+', text.lower()) for text in ignore))
+        self.permutations = [(rng.randrange(1, MERSENNE_PRIME), rng.randrange(MERSENNE_PRIME))
+                             for _ in range(num_perm)]
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+        self.shingles = {}
+        self.rejected = 0
+
+    def signature(self, shingles):
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for shingle in shingles]
+        return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in self.permutations]
+
+    def band_keys(self, signature):
+        return [tuple(signature[i * self.rows:(i + 1) * self.rows]) for i in range(len(self.buckets))]
+
+    def find(self, exercise):
+        """返回最相似的重复题 ``(key, similarity)``，没有重复时返回 None"""
+        shingles = exercise_shingles(exercise, self.shingle_size, self.stopwords)
+        if not shingles:
+            return None
+        candidates = set()
+        for bucket, band in zip(self.buckets, self.band_keys(self.signature(shingles))):
+            candidates.update(bucket.get(band, ()))
+        best = None
+        for key in candidates:
+            other = self.shingles[key]
+            similarity = len(shingles & other) / len(shingles | other)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        return best
+
+    def add(self, key, exercise):
+        shingles = exercise_shingles(exercise, self.shingle_size, self.stopwords)
+        if not shingles:
+            return
+        self.shingles[key] = shingles
+        for bucket, band in zip(self.buckets, self.band_keys(self.signature(shingles))):
+            bucket.setdefault(band, []).append(key)
+
+    def __len__(self):
+        return len(self.shingles)
+
+    def load(self, path) -> int:
+        """把以前生成的 JSON 数组或 JSONL 结果文件加入索引，返回加入的题目数量"""
+        if path.endswith('.jsonl'):
+            exercises = read_results(path)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                exercises = dict(enumerate(json.load(f)))
+        for slot, exercise in exercises.items():
+            self.add(f"{path}:{slot}", exercise)
+        return len(exercises)
+
+
+def diversity_hint(topic, exercises) -> str:
+    """在主题后追加提示，要求模型换一个与已有题目不同的场景"""
+    scenarios = '\n'.join(f"- {exercise_scenario(exercise)}" for exercise in exercises)
+    return f"{topic}\n\nThe exercise must use a different scenario from these existing exercises:\n{scenarios}"
+
+
+def message_text(message) -> str:
+    """消息内容的文本；Anthropic 的流式块可能是内容块列表"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return ''.join(block.get('text', '') if isinstance(block, dict) else str(block) for block in content)
+
+
+class JsonArrayStreamParser:
+    """
+    增量解析流式返回的 JSON 数组：每个顶层对象一闭合就解析并返回。
+
+    数组开始前的内容（说明文字、```json）会被忽略；说明文字里的 [advanced] 之类不算数组开始，
+    只有后面（跳过空白）紧跟 { 或 ] 的 [ 才算。字符串内的括号和代码块不影响计数。
+    单个对象解析失败只跳过该对象，计入 ``malformed``，后面的对象照常返回；
+    整个输出没有一个对象时也计一次 ``malformed``。
+    """
+
+    def __init__(self):
+        self.opening = False
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.current = []
+        self.items = 0
+        self.malformed = 0
+
+    def feed(self, text) -> list:
+        objects = []
+        for char in text:
+            if self.finished:
+                break
+            if not self.started:
+                if self.opening and not char.isspace():
+                    self.started = char in '{]'
+                self.opening = char == '[' or (self.opening and char.isspace())
+                if not self.started:
+                    continue
+            if self.depth == 0:
+                # 对象之间只会有逗号和空白，数组结束后不再解析
+                if char == '{':
+                    self.depth = 1
+                    self.current = [char]
+                elif char == ']':
+                    self.finished = True
+                continue
+
+            self.current.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    self.items += 1
+                    current_object = self.parse_object(''.join(self.current))
+                    if current_object is not None:
+                        objects.append(current_object)
+        return objects
+
+    def parse_object(self, text):
+        try:
+            return load_exercise(text)
+        except OutputParserException as e:
+            self.malformed += 1
+            logger.warning(f"Skipping malformed exercise in batch: {str(e)}")
+            return None
+
+    def close(self):
+        """流结束时调用；未闭合的对象（输出被截断）或一个对象都没有的输出计为 malformed"""
+        if self.depth > 0:
+            self.malformed += 1
+            logger.warning("Skipping truncated exercise at the end of a batch")
+        elif self.items == 0:
+            self.malformed += 1
+            logger.warning("Batch output contained no exercises")
+        self.depth = 0
+
+
+async def agenerate_practice(number, topic, level, language, prompt, outputParser, model=None,
+                             concurrency=8, max_retries=5, callbacks=None, writer=None, dedup=None,
+                             max_regenerations=2, per_call=1, metrics=None):
+    """
+    并发生成练习题。
+
+    Args:
+        number (int): 需要生成的题目数量。
+        model: 聊天模型，默认使用 ``get_model()``；测试时可传入假模型。
+        concurrency (int): 同时进行的模型调用上限。
+        max_retries (int): 单次调用遇到限流后的最多重试次数。
+        callbacks (list): 传给每次调用的 LangChain 回调。
+        writer (ResultWriter): 传入时每道题完成后立即写入文件，不在内存中保留，
+            ``writer.completed`` 中的序号会被跳过。
+        dedup (MinHashIndex): 传入时与本次及以前的题目查重，重复的题目带着差异化提示重新生成，
+            ``max_regenerations`` 次后仍重复则丢弃。
+        per_call (int): 大于 1 时每次调用生成 ``per_call`` 道题，``prompt`` 需用
+            ``load_prompt(path, batch=True)``，``outputParser`` 不再使用，
+            流式返回的数组每闭合一个对象就保存一道题。
+        metrics (LLMMetrics): 记录重试、格式错误、接受和因重复被拒的题目数；
+            每次调用的耗时和 token 由 ``MetricsCallbackHandler`` 回调记录。
+
+    Returns:
+        list: 生成的题目，顺序与请求顺序一致；重试后仍失败的题目会记录日志并跳过。
+            传入 ``writer`` 时返回空列表，结果以文件为准。
+    """
+    # chain 只构建一次，所有请求共用
+    model = model or get_model()
+    # GeneratorOutputParser 边接收边解析，格式错误时可以提前取消生成
+    streaming = per_call > 1 or isinstance(outputParser, GeneratorOutputParser)
+    chain = prompt | model if streaming else prompt | model | outputParser
+    inputs = {
+        "DIFFICULTY_LEVEL": level,
+        "PROGRAMMING_LANGUAGE": language,
+        "TOPIC": topic
+    }
+    limiter = AdaptiveLimiter(concurrency)
+    results = {}
+
+    def record(event, amount=1, **fields):
+        if metrics is not None and amount:
+            metrics.record_event(event, amount, **fields)
+
+    async def with_retries(label, call):
+        for attempt in range(max_retries + 1):
+            await limiter.acquire()
+            rate_limited, delay = False, 0.0
+            try:
+                return await call()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == max_retries:
+                    raise
+                rate_limited = True
+                record('retries', label=label)
+                delay = retry_after(e) or min(60.0, 2 ** attempt + random.random())
+                logger.warning(f"{label} rate limited, retrying in {delay:.1f}s ({attempt + 1}/{max_retries})")
+                continue
+            finally:
+                await limiter.release(rate_limited, delay)
+
+    def is_duplicate(label, current_result):
+        duplicate = dedup.find(current_result) if dedup is not None else None
+        if duplicate is not None:
+            dedup.rejected += 1
+            record('rejected', label=label)
+            logger.info(f"{label} is a near-duplicate of {duplicate[0]} ({duplicate[1]:.2f})")
+        return duplicate is not None
+
+    def store(index, current_result):
+        record('accepted')
+        # 查重和加入索引之间没有 await，并发的题目不会同时通过检查
+        if dedup is not None:
+            dedup.add(f"run:{index}", current_result)
+        if writer is None:
+            results[index] = current_result
+        else:
+            writer.write(index, current_result)
+
+    async def stream_exercise(slot_inputs):
+        parser = ExerciseStreamParser()
+        exercise = None
+        chunks = chain.astream(slot_inputs, config={"callbacks": callbacks or []})
+        try:
+            async for chunk in chunks:
+                # 对象闭合后只剩结尾的 ```，照常读完，完整的输出才会进响应缓存
+                if exercise is None:
+                    exercise = parser.feed(message_text(chunk))
+        finally:
+            await chunks.aclose()
+        return exercise if exercise is not None else parser.close()
+
+    async def generate_one(index):
+        # 响应缓存按题目序号区分同一个 prompt，续跑时不会重放别的题目的回复；gather 给每个任务独立的 context
+        request_scope.set(f"slot:{index}")
+        slot_inputs, similar = inputs, []
+        for _ in range(max_regenerations + 1):
+            try:
+                current_result = await with_retries(
+                    f"Exercise {index}",
+                    lambda: stream_exercise(slot_inputs) if streaming
+                    else chain.ainvoke(slot_inputs, config={"callbacks": callbacks or []}))
+            except OutputParserException as e:
+                logger.warning(f"Exercise {index} malformed, regenerating: {str(e)}")
+                record('parse_failures', label=f"Exercise {index}")
+                continue
+            current_result['level'] = level
+            if not is_duplicate(f"Exercise {index}", current_result):
+                store(index, current_result)
+                return
+            similar.append(current_result)
+            slot_inputs = dict(inputs, TOPIC=diversity_hint(topic, similar))
+        logger.warning(f"Exercise {index} dropped after {max_regenerations} regenerations")
+
+    async def generate_batch(label, count, free, similar, scope):
+        request_scope.set(scope)
+        batch_inputs = dict(inputs, COUNT=count)
+        if similar:
+            batch_inputs['TOPIC'] = diversity_hint(topic, similar)
+
+        async def stream():
+            parser = JsonArrayStreamParser()
+            accepted = 0
+            chunks = chain.astream(batch_inputs, config={"callbacks": callbacks or []})
+            try:
+                async for chunk in chunks:
+                    for current_result in parser.feed(message_text(chunk)):
+                        # 题目已够时多出来的对象直接忽略
+                        if accepted == count or not free:
+                            continue
+                        current_result['level'] = level
+                        if is_duplicate(label, current_result):
+                            similar.append(current_result)
+                            continue
+                        store(free.pop(0), current_result)
+                        accepted += 1
+            finally:
+                await chunks.aclose()
+            parser.close()
+            record('parse_failures', parser.malformed, label=label)
+            return accepted
+
+        return await with_retries(label, stream)
+
+    slots = [i for i in range(number) if writer is None or i not in writer.completed]
+    if len(slots) < number:
+        logger.info(f"Resuming: {number - len(slots)} of {number} exercises already generated")
+
+    if per_call > 1:
+        # 被跳过（格式错误、重复、失败）的题目在下一轮补齐
+        free, similar = list(slots), []
+        for round_number in range(max_regenerations + 1):
+            if not free:
+                break
+            starts = range(0, len(free), per_call)
+            counts = [min(per_call, len(free) - i) for i in starts]
+            labels = [f"Batch {round_number}.{i}" for i in range(len(counts))]
+            # 缓存作用域是这一批本轮要补的题目序号
+            scopes = ["slots:" + ",".join(map(str, free[i:i + per_call])) for i in starts]
+            outcomes = await asyncio.gather(*(generate_batch(label, count, free, similar, scope)
+                                              for label, count, scope in zip(labels, counts, scopes)),
+                                            return_exceptions=True)
+            for label, outcome in zip(labels, outcomes):
+                if isinstance(outcome, BaseException):
+                    logger.error(f"{label} failed: {outcome}")
+        if free:
+            logger.warning(f"{len(free)} exercises missing after {max_regenerations + 1} rounds")
+    else:
+        outcomes = await asyncio.gather(*(generate_one(i) for i in slots), return_exceptions=True)
+        for index, outcome in zip(slots, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.error(f"Exercise {index} failed: {outcome}")
+
+    return [results[index] for index in sorted(results)]
+
+
+def generate_practice(number, topic, level, language, prompt, outputParser, model=None, concurrency=8,
+                      callbacks=None, writer=None, dedup=None, per_call=1, metrics=None):
+    """同步入口，内部调用 ``agenerate_practice``"""
+    return asyncio.run(agenerate_practice(number, topic, level, language, prompt, outputParser,
+                                          model=model, concurrency=concurrency, callbacks=callbacks,
+                                          writer=writer, dedup=dedup, per_call=per_call, metrics=metrics))
 
 
 if __name__ == '__main__':
-    prompt = load_prompt("prompt.txt")
-    # outputParser = GeneratorOutputParser()
-    outputParser = JsonOutputParser()
-    res = generate_practice(50, "inherent", "advanced", "golang", prompt, outputParser)
-    with open("result.json", 'w') as f:
-        json.dump(res, f, indent=4)
+    parser = argparse.ArgumentParser(description="Generate OOP practice exercises")
+    parser.add_argument('--number', type=int, default=50)
+    parser.add_argument('--output', default="result.json", help="final JSON array (default: result.json)")
+    parser.add_argument('--resume', action='store_true', help="skip exercises already recorded in the .jsonl file")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv("OOP_CONCURRENCY", 8)))
+    parser.add_argument('--prior', nargs='*', default=[], help="earlier result files to check for duplicates")
+    parser.add_argument('--similarity', type=float, default=0.4,
+                        help="scenario similarity at which an exercise counts as a duplicate (default: 0.4)")
+    parser.add_argument('--per-call', type=int, default=1, help="exercises requested per model call (default: 1)")
+    parser.add_argument('--no-cache', action='store_true', help="always call the provider")
+    parser.add_argument('--replay', action='store_true', default=os.getenv("LLM_REPLAY") == "1",
+                        help="offline: answer only from recorded responses (LLM_REPLAY=1)")
+    parser.add_argument('--trace', default=os.getenv("LLM_TRACE_PATH", "trace.jsonl"),
+                        help="JSONL trace of model calls and events, empty to disable (default: trace.jsonl)")
+    parser.add_argument('--verbose', action='store_true', help="print every chain step to the console")
+    args = parser.parse_args()
+
+    # 响应缓存位置和大小见 LLM_CACHE_PATH / LLM_CACHE_TTL / LLM_CACHE_MAX_MB
+    cache = None if args.no_cache else cache_from_env()
+    if args.replay and cache is None:
+        parser.error("--replay needs the response cache")
+    model = get_model()
+    chat_model = CachedChatModel(inner=model, response_cache=cache, offline=args.replay) if cache else model
+
+    prompt = load_prompt("prompt.txt", batch=args.per_call > 1)
+    outputParser = GeneratorOutputParser()
+    # outputParser = langchain_core.output_parsers.JsonOutputParser()
+    # 先逐题写入 result.jsonl，全部结束后再整理成 result.json
+    jsonl_path = args.output + 'l' if args.output.endswith('.json') else args.output + '.jsonl'
+    topic, level, language = "inherent", "advanced", "golang"
+    dedup = MinHashIndex(threshold=args.similarity, ignore=(topic, level, language))
+    for path in args.prior:
+        dedup.load(path)
+    metrics = LLMMetrics(trace_path=args.trace or None)
+    callbacks = [MetricsCallbackHandler(metrics)]
+    if args.verbose:
+        from langchain_core.tracers import ConsoleCallbackHandler
+        callbacks.append(ConsoleCallbackHandler())
+    with ResultWriter(jsonl_path, resume=args.resume) as writer:
+        # 续跑时已完成的题目也参与查重
+        for slot, exercise in read_results(jsonl_path).items():
+            dedup.add(f"run:{slot}", exercise)
+        generate_practice(args.number, topic, level, language, prompt, outputParser, model=chat_model,
+                          concurrency=args.concurrency, callbacks=callbacks,
+                          writer=writer, dedup=dedup, per_call=args.per_call, metrics=metrics)
+    count = compact_results(jsonl_path, args.output)
+    print(f"{count} exercises written to {args.output}")
+    print(metrics.format_summary())
+    metrics.close()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
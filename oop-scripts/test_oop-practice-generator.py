@@ -1,7 +1,433 @@
+import asyncio
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
 from unittest import TestCase
+from unittest.mock import patch
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.language_models.fake_chat_models import (
+    FakeListChatModel, FakeMessagesListChatModel, GenericFakeChatModel
+)
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import PromptTemplate
 
 
 class TestGeneratorOutputParser(TestCase):
     def test_parse(self):
         text = "```json\n{\n  \"exercise\": \"In Golang, design an advanced system using object-oriented principles to model a library system. The system should handle multiple types of media, such as books, DVDs, and magazines, using inheritance. Implement the following functionalities:\\n\\n1. Create a base struct `Media` that contains common properties like `Title`, `Publisher`, and `Year`. \\n2. Derive specialized structs `Book`, `DVD`, and `Magazine` from `Media`. Each derived struct should have additional specific properties (e.g., `Author` for `Book`, `Director` for `DVD`, and `IssueNumber` for `Magazine`).\\n3. Implement a method for each derived struct to display detailed information specific to that media type.\\n4. Use interfaces and embedding to demonstrate polymorphism where a single function can handle any media type to display their information.\\n5. Introduce a `Library` struct that can store a collection of media items and provide a method to display all media details.\\n\\nWrite the necessary Go code to define these structs, methods, and demonstrate the functionality with a sample collection of media items in a library.\",\n  \"answer\": \"```go\\npackage main\\n\\nimport \\\"fmt\\\"\\n\\n// Base struct\\ntype Media struct {\\n\\tTitle    string\\n\\tPublisher string\\n\\tYear     int\\n}\\n\\n// Book struct inheriting Media\\ntype Book struct {\\n\\tMedia\\n\\tAuthor string\\n}\\n\\n// DVD struct inheriting Media\\ntype DVD struct {\\n\\tMedia\\n\\tDirector string\\n}\\n\\n// Magazine struct inheriting Media\\ntype Magazine struct {\\n\\tMedia\\n\\tIssueNumber int\\n}\\n\\n// Interface for displaying media details\\ntype MediaDetails interface {\\n\\tDisplayDetails()\\n}\\n\\n// Method for Book\\nfunc (b Book) DisplayDetails() {\\n\\tfmt.Printf(\\\"Book: %s by %s, published by %s in %d\\\\n\\\", b.Title, b.Author, b.Publisher, b.Year)\\n}\\n\\n// Method for DVD\\nfunc (d DVD) DisplayDetails() {\\n\\tfmt.Printf(\\\"DVD: %s directed by %s, published by %s in %d\\\\n\\\", d.Title, d.Director, d.Publisher, d.Year)\\n}\\n\\n// Method for Magazine\\nfunc (m Magazine) DisplayDetails() {\\n\\tfmt.Printf(\\\"Magazine: %s, Issue %d, published by %s in %d\\\\n\\\", m.Title, m.IssueNumber, m.Publisher, m.Year)\\n}\\n\\n// Library struct containing media\\ntype Library struct {\\n\\tmediaCollection []MediaDetails\\n}\\n\\n// Method to display all media details\\nfunc (l *Library) DisplayAllMedia() {\\n\\tfor _, media := range l.mediaCollection {\\n\\t\\tmedia.DisplayDetails()\\n\\t}\\n}\\n\\nfunc main() {\\n\\t// Sample media items\\n\\tbook := Book{Media{\\\"The Great Gatsby\\\", \\\"Scribner\\\", 1925}, \\\"F. Scott Fitzgerald\\\"}\\n\\tdvd := DVD{Media{\\\"Inception\\\", \\\"Warner Bros.\\\", 2010}, \\\"Christopher Nolan\\\"}\\n\\tmagazine := Magazine{Media{\\\"National Geographic\\\", \\\"National Geographic Society\\\", 2021}, 5}\\n\\n\\t// Library containing media items\\n\\tlibrary := Library{\\n\\t\\tmediaCollection: []MediaDetails{book, dvd, magazine},\\n\\t}\\n\\n\\t// Display all media details\\n\\tlibrary.DisplayAllMedia()\\n}\\n```\",\n  \"explanation\": \"The solution models a library system using Go's structs and interfaces to demonstrate inheritance and polymorphism, fitting the advanced difficulty level. \\n\\n1. **Inheritance** in Go is achieved through struct embedding. The `Book`, `DVD`, and `Magazine` structs embed the base `Media` struct, inheriting its properties. This mimics class inheritance in languages like Java or C++. Each derived struct adds extra fields specific to the media type.\\n\\n2. **Polymorphism** is handled using interfaces. The `MediaDetails` interface requires a `DisplayDetails` method. Each media type implements this method, allowing for polymorphic behavior. The `Library` struct stores a collection of `MediaDetails` interfaces, enabling it to handle different media types uniformly.\\n\\n3. **Method Implementation**: Each media type has its own `DisplayDetails` method which provides custom output. This shows how polymorphism allows different behaviors for the same method call.\\n\\n4. **Library System**: The `Library` struct holds a slice of `MediaDetails`, and its `DisplayAllMedia` method iterates over this collection, calling `DisplayDetails` on each item. This illustrates the power of polymorphism in managing diverse types through a single interface.\\n\\n5. **Design Choices**: Using interfaces and embedding in Go leverages its strengths in composition over inheritance. This approach is efficient and idiomatic in Go, as it avoids the complexities and pitfalls of deep inheritance hierarchies.\\n\\nAlternative approaches could involve more complex systems, like adding borrowing functionality, but this design comprehensively illustrates the inheritance and polymorphism concepts in an advanced OOP exercise.\",\n  \"level\": \"advanced\"\n}\n```"
 
+        exercise = generator.GeneratorOutputParser().parse(text)
+        # answer 里的 ```go 代码块不能让解析提前结束
+        self.assertTrue(exercise['answer'].startswith("```go\npackage main"))
+        self.assertTrue(exercise['answer'].endswith("}\n```"))
+        self.assertEqual(exercise['level'], "advanced")
+
+
+def load_generator():
+    # 文件名带连字符，不能直接 import
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oop-practice-generator.py')
+    spec = importlib.util.spec_from_file_location('oop_practice_generator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+generator = load_generator()
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class SlowFakeModel(FakeListChatModel):
+    """Replies out of order: earlier calls sleep longer; tracks the peak number of concurrent calls"""
+    in_flight: int = 0
+    peak: int = 0
+    calls: int = 0
+    rate_limited_calls: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        call = self.calls
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.02 / call)
+            if call <= self.rate_limited_calls:
+                raise RateLimitError("429 Too Many Requests")
+            content = json.dumps({"exercise": f"exercise {call}", "answer": "", "explanation": ""})
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+        finally:
+            self.in_flight -= 1
+
+
+class TestGeneratePractice(TestCase):
+    def generate(self, model, number, concurrency):
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        return generator.generate_practice(number, "inherent", "advanced", "golang", prompt, JsonOutputParser(),
+                                           model=model, concurrency=concurrency)
+
+    def test_results_keep_request_order(self):
+        model = SlowFakeModel(responses=[""])
+        results = self.generate(model, 6, concurrency=6)
+        # 后发起的调用先返回，结果仍按发起顺序排列
+        self.assertEqual([r['exercise'] for r in results], [f"exercise {i}" for i in range(1, 7)])
+        self.assertTrue(all(r['level'] == 'advanced' for r in results))
+        self.assertEqual(model.peak, 6)
+
+    def test_concurrency_cap(self):
+        model = SlowFakeModel(responses=[""])
+        results = self.generate(model, 10, concurrency=3)
+        self.assertEqual(len(results), 10)
+        self.assertLessEqual(model.peak, 3)
+
+    def test_rate_limit_retries_and_lowers_concurrency(self):
+        model = SlowFakeModel(responses=[""], rate_limited_calls=2)
+        with patch.object(generator, 'retry_after', return_value=0.01):
+            results = self.generate(model, 4, concurrency=4)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(model.calls, 6)
+
+    def test_rate_limit_detection(self):
+        self.assertTrue(generator.is_rate_limit_error(RateLimitError()))
+        self.assertTrue(generator.is_rate_limit_error(type('RateLimitError', (Exception,), {})()))
+        self.assertFalse(generator.is_rate_limit_error(ValueError("bad json")))
+
+
+class TestResultWriter(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'result.jsonl')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def generate(self, model, number, writer):
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        return generator.generate_practice(number, "inherent", "advanced", "golang", prompt, JsonOutputParser(),
+                                           model=model, concurrency=3, writer=writer)
+
+    def test_results_are_written_as_they_complete(self):
+        with generator.ResultWriter(self.path) as writer:
+            self.assertEqual(self.generate(SlowFakeModel(responses=[""]), 4, writer), [])
+        self.assertEqual(sorted(generator.read_results(self.path)), [0, 1, 2, 3])
+
+    def test_resume_skips_completed_slots_and_partial_lines(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"slot": 0, "exercise": {"exercise": "kept"}}) + '\n')
+            f.write(json.dumps({"slot": 2, "exercise": {"exercise": "kept"}}) + '\n')
+            f.write('{"slot": 3, "exerc')  # 崩溃时写了一半的记录
+
+        model = SlowFakeModel(responses=[""])
+        with generator.ResultWriter(self.path, resume=True) as writer:
+            self.assertEqual(writer.completed, {0, 2})
+            self.generate(model, 4, writer)
+        self.assertEqual(model.calls, 2)
+
+        results = generator.read_results(self.path)
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(results[0], {"exercise": "kept"})
+
+        output = os.path.join(self.tmp.name, 'result.json')
+        self.assertEqual(generator.compact_results(self.path, output), 4)
+        with open(output, encoding='utf-8') as f:
+            exercises = json.load(f)
+        self.assertEqual(exercises[0], {"exercise": "kept"})
+        self.assertEqual(exercises[2], {"exercise": "kept"})
+
+    def test_without_resume_starts_over(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"slot": 0, "exercise": {}}) + '\n')
+        with generator.ResultWriter(self.path) as writer:
+            self.assertEqual(writer.completed, set())
+        self.assertEqual(generator.read_results(self.path), {})
+
+
+def exercise_message(text):
+    content = json.dumps({"exercise": text, "answer": "", "explanation": ""})
+    return AIMessage(content=content, usage_metadata={"input_tokens": 90, "output_tokens": 10, "total_tokens": 100})
+
+
+class RecordingFakeModel(FakeMessagesListChatModel):
+    prompts: list = []
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.prompts.append(messages[-1].content)
+        return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class TestNearDuplicates(TestCase):
+    FLEET = "Design a system for managing a fleet of vehicles in a transportation company. Cars and trucks differ."
+    VEHICLES = "Design a system for managing different types of vehicles in a transportation company."
+    BANK = "Design a banking system with savings and checking accounts. Accounts share a base type."
+
+    def test_similar_scenarios_are_found(self):
+        index = generator.MinHashIndex()
+        index.add("fleet", {"exercise": self.FLEET})
+        key, similarity = index.find({"exercise": self.VEHICLES})
+        self.assertEqual(key, "fleet")
+        self.assertGreaterEqual(similarity, 0.4)
+        self.assertIsNone(index.find({"exercise": self.BANK}))
+
+    def test_duplicates_are_regenerated_with_a_hint(self):
+        model = RecordingFakeModel(responses=[exercise_message(text) for text in (self.FLEET, self.VEHICLES, self.BANK)],
+                                   prompts=[])
+        index = generator.MinHashIndex()
+        metrics = generator.LLMMetrics()
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        results = generator.generate_practice(2, "inherent", "advanced", "golang", prompt, JsonOutputParser(),
+                                              model=model, concurrency=1, dedup=index, metrics=metrics,
+                                              callbacks=[generator.MetricsCallbackHandler(metrics)])
+
+        self.assertEqual([r['exercise'] for r in results], [self.FLEET, self.BANK])
+        self.assertEqual(index.rejected, 1)
+        self.assertEqual(len(index), 2)
+        self.assertIn("different scenario", model.prompts[-1])
+        self.assertIn("managing different types of vehicles", model.prompts[-1])
+        summary = metrics.summary()
+        self.assertEqual((summary['calls'], summary['accepted'], summary['rejected']), (3, 2, 1))
+        self.assertEqual(summary['tokens_per_accepted'], 150)
+
+    def test_different_scenarios_behind_the_template_opening_are_kept(self):
+        opening = "In Golang, design an advanced system using object-oriented principles to model a {}."
+        texts = [
+            opening.format("library system") + " Books, DVDs and magazines can be borrowed and returned.",
+            opening.format("hospital system") + " Patients are admitted to wards and treated by doctors.",
+            opening.format("stock exchange") + " Traders place buy and sell orders that are matched.",
+        ]
+        model = RecordingFakeModel(responses=[exercise_message(text) for text in texts], prompts=[])
+        index = generator.MinHashIndex(ignore=("inherent", "advanced", "golang"))
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        results = generator.generate_practice(3, "inherent", "advanced", "golang", prompt, JsonOutputParser(),
+                                              model=model, concurrency=1, dedup=index)
+
+        self.assertEqual([r['exercise'] for r in results], texts)
+        self.assertEqual(index.rejected, 0)
+        # 同一个场景换个说法仍然算重复
+        self.assertIsNotNone(index.find({"exercise": opening.format("library") +
+                                         " Members borrow and return books, DVDs and magazines."}))
+
+    def test_prior_results_are_loaded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'result.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump([{"exercise": self.FLEET}, {"exercise": self.BANK}], f)
+            index = generator.MinHashIndex()
+            self.assertEqual(index.load(path), 2)
+        self.assertEqual(index.find({"exercise": self.VEHICLES})[0], f"{path}:0")
+
+
+def exercise(text):
+    return {"exercise": text, "answer": "", "explanation": "", "level": ""}
+
+
+def batch_response(*items):
+    """A batch reply as the model writes it: a fenced JSON array, items given as exercise texts or raw JSON"""
+    body = ',\n'.join(item if item.startswith('{') else json.dumps(exercise(item)) for item in items)
+    return AIMessage(content=f"Here are the exercises:\n```json\n[\n{body}\n]\n```")
+
+
+class TestJsonArrayStreamParser(TestCase):
+    def feed_in_chunks(self, text, size):
+        parser = generator.JsonArrayStreamParser()
+        objects = []
+        for i in range(0, len(text), size):
+            objects.extend(parser.feed(text[i:i + size]))
+        parser.close()
+        return parser, objects
+
+    def test_objects_are_yielded_as_they_close(self):
+        parser = generator.JsonArrayStreamParser()
+        first = '```json\n[{"exercise": "a {b} [c]", "answer": "```go\\n}\\n```", "explanation": "", "level": ""}'
+        self.assertEqual(parser.feed(first)[0]['answer'], "```go\n}\n```")
+        self.assertEqual(parser.feed(', {"exercise": "\\"quoted\\" }", "answer": "", "explanation": ""'), [])
+        self.assertEqual(parser.feed(', "level": ""}]')[0]['exercise'], '"quoted" }')
+
+    def test_malformed_items_are_skipped(self):
+        text = batch_response("one", '{"exercise": "two" "answer": ""}', "three",
+                              '{"exercise": "raw\nnewline", "answer": "", "explanation": "", "level": "",}',
+                              '{"exercise": "no answer", "explanation": "", "level": ""}').content
+        for size in (1, 7, len(text)):
+            parser, objects = self.feed_in_chunks(text, size)
+            self.assertEqual([o['exercise'] for o in objects], ["one", "three", "raw\nnewline"])
+            self.assertEqual(parser.malformed, 2)
+
+    def test_brackets_in_the_preamble_do_not_start_the_array(self):
+        text = ("Here are 2 exercises [advanced, golang]:\n```json\n[ \n"
+                + json.dumps(exercise("one")) + ", " + json.dumps(exercise("two")) + "]\n```")
+        for size in (1, 3, len(text)):
+            parser, objects = self.feed_in_chunks(text, size)
+            self.assertEqual([o['exercise'] for o in objects], ["one", "two"])
+            self.assertEqual(parser.malformed, 0)
+
+    def test_output_without_exercises_counts_as_malformed(self):
+        for text in ("```json\n[]\n```", "Sorry, I can't produce [exercises] right now."):
+            parser, objects = self.feed_in_chunks(text, 4)
+            self.assertEqual((objects, parser.malformed), ([], 1), msg=text)
+
+    def test_truncated_output_counts_as_malformed(self):
+        parser, objects = self.feed_in_chunks('[' + json.dumps(exercise("one")) + ', {"exercise": "tw', 5)
+        self.assertEqual([o['exercise'] for o in objects], ["one"])
+        self.assertEqual(parser.malformed, 1)
+
+
+class TestBatchGeneration(TestCase):
+    def generate(self, messages, number, per_call, **kwargs):
+        model = GenericFakeChatModel(messages=iter(messages))
+        prompt = PromptTemplate.from_template("{COUNT} {DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        return generator.generate_practice(number, "inherent", "advanced", "golang", prompt, None,
+                                           model=model, concurrency=1, per_call=per_call, **kwargs)
+
+    def test_batch_prompt_asks_for_count(self):
+        prompt = generator.load_prompt("prompt.txt", batch=True)
+        self.assertIn("COUNT", prompt.input_variables)
+        self.assertIn("Create 3 different exercises",
+                      prompt.format(DIFFICULTY_LEVEL="advanced", PROGRAMMING_LANGUAGE="go", TOPIC="x", COUNT=3))
+
+    def test_malformed_items_are_refilled_in_the_next_round(self):
+        messages = [
+            batch_response("one", '{"exercise": broken}', "three"),
+            batch_response("four", "five"),
+            batch_response("six"),
+        ]
+        results = self.generate(messages, 5, per_call=3)
+        self.assertEqual([r['exercise'] for r in results], ["one", "three", "four", "five", "six"])
+        self.assertTrue(all(r['level'] == 'advanced' for r in results))
+
+    def test_extra_items_are_ignored_and_persisted_per_slot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'result.jsonl')
+            with generator.ResultWriter(path) as writer:
+                messages = [batch_response("one", "two", "three")]
+                self.assertEqual(self.generate(messages, 2, per_call=2, writer=writer), [])
+            results = generator.read_results(path)
+        self.assertEqual({slot: r['exercise'] for slot, r in results.items()}, {0: "one", 1: "two"})
+
+
+class TestExerciseStreamParser(TestCase):
+    VALID = '{"exercise": "e", "answer": "```go\\nfunc main() {}\\n```", "explanation": "x", "level": "advanced"}'
+
+    def test_parses_across_chunks_and_ignores_trailing_text(self):
+        text = "Sure!\n```json\n" + self.VALID + "\n```\nLet me know if you need more."
+        parser = generator.ExerciseStreamParser()
+        results = [parser.feed(text[i:i + 3]) for i in range(0, len(text), 3)]
+        completed = [r for r in results if r is not None]
+        self.assertEqual(len(completed), 1)
+        self.assertEqual(completed[0]['answer'], "```go\nfunc main() {}\n```")
+
+    def test_common_breakage_is_repaired(self):
+        parser = generator.GeneratorOutputParser()
+        # 模板示例本身就在最后一个字段后面带逗号
+        self.assertEqual(parser.parse(self.VALID[:-1] + ',\n}')['level'], "advanced")
+        self.assertEqual(parser.parse('{"exercise": "line\n2", "answer": "\tx", "explanation": "", "level": ""}')
+                         ['exercise'], "line\n2")
+        # 输出在最后的 } 之前结束
+        self.assertEqual(parser.parse("```json\n" + self.VALID[:-1])['exercise'], "e")
+
+    def test_clearly_malformed_output_aborts_early(self):
+        for text in ('{"exercise": 42', '{"exercise": "a", "exercise"', '{"exercise" "a"', '{"exercise": "a" "answer"'):
+            with self.assertRaises(OutputParserException, msg=text):
+                generator.ExerciseStreamParser().feed(text)
+        with self.assertRaises(OutputParserException):
+            generator.ExerciseStreamParser(max_preamble=10).feed("I cannot help with that request.")
+
+    def test_scalar_extra_fields_are_accepted(self):
+        for value, expected in (('12', 12), ('-1.5e3', -1500.0), ('true', True), ('false', False), ('null', None)):
+            text = '{"id": ' + value + ', ' + self.VALID[1:-1] + ', "ok": ' + value + ' }'
+            for chunk_size in (1, len(text)):
+                parser = generator.ExerciseStreamParser()
+                results = [parser.feed(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+                exercise = results[-1]
+                self.assertEqual((exercise['id'], exercise['ok']), (expected, expected), msg=text)
+        # 最后一个字段是标量、输出缺少结尾的 } 时同样补齐
+        self.assertEqual(generator.GeneratorOutputParser().parse(self.VALID[:-1] + ', "id": 7')['id'], 7)
+
+    def test_incomplete_output_is_rejected(self):
+        parser = generator.GeneratorOutputParser()
+        with self.assertRaises(OutputParserException):
+            parser.parse('{"exercise": "e", "answer": "```go\\nfunc')
+        with self.assertRaises(OutputParserException):
+            parser.parse('{"exercise": "e", "answer": "a", "explanation": "x"}')
+
+    def test_malformed_generation_is_regenerated(self):
+        model = GenericFakeChatModel(messages=iter([
+            AIMessage(content='```json\n{"exercise": ["not", "a", "string"], ' + 'padding ' * 200),
+            AIMessage(content="```json\n" + self.VALID + "\n```"),
+        ]))
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+        results = generator.generate_practice(1, "inherent", "advanced", "golang", prompt,
+                                              generator.GeneratorOutputParser(), model=model)
+        self.assertEqual([r['exercise'] for r in results], ["e"])
+
+
+class TestResponseCacheReplay(TestCase):
+    def test_full_run_replays_offline(self):
+        from llm_cache import ResponseCache
+
+        valid = TestExerciseStreamParser.VALID
+        replies = [AIMessage(content="```json\n" + valid.replace('"e"', f'"{name}"') + "\n```")
+                   for name in ("first", "second")]
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+
+        def run(offline):
+            cache = ResponseCache(os.path.join(tmp, 'llm.db'))
+            chat_model = generator.CachedChatModel(inner=FakeMessagesListChatModel(responses=replies),
+                                                   response_cache=cache, offline=offline)
+            try:
+                return generator.generate_practice(2, "inherent", "advanced", "golang", prompt,
+                                                   generator.GeneratorOutputParser(), model=chat_model, concurrency=1)
+            finally:
+                cache.close()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            recorded = run(offline=False)
+            with patch.object(FakeMessagesListChatModel, '_generate', side_effect=AssertionError("provider called")):
+                replayed = run(offline=True)
+        self.assertEqual([r['exercise'] for r in recorded], ["first", "second"])
+        self.assertEqual(replayed, recorded)
+
+    def test_resumed_slots_are_not_answered_with_earlier_slots_replies(self):
+        from llm_cache import ResponseCache
+
+        valid = TestExerciseStreamParser.VALID
+        prompt = PromptTemplate.from_template("{DIFFICULTY_LEVEL} {PROGRAMMING_LANGUAGE} {TOPIC}")
+
+        def run(number, names, resume):
+            replies = [AIMessage(content=valid.replace('"e"', f'"{name}"')) for name in names]
+            cache = ResponseCache(os.path.join(tmp, 'llm.db'))
+            chat_model = generator.CachedChatModel(inner=FakeMessagesListChatModel(responses=replies),
+                                                   response_cache=cache)
+            try:
+                with generator.ResultWriter(os.path.join(tmp, 'result.jsonl'), resume=resume) as writer:
+                    generator.generate_practice(number, "inherent", "advanced", "golang", prompt,
+                                                generator.GeneratorOutputParser(), model=chat_model, concurrency=1,
+                                                writer=writer)
+            finally:
+                cache.close()
+            return generator.read_results(os.path.join(tmp, 'result.jsonl'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            run(2, ["first", "second"], resume=False)
+            results = run(4, ["third", "fourth"], resume=True)
+        self.assertEqual([results[slot]['exercise'] for slot in range(4)], ["first", "second", "third", "fourth"])
+
+
+class TestStartup(TestCase):
+    def test_import_does_not_load_provider_sdks(self):
+        # 在新的解释器里导入，anthropic / openai 要到第一次调用模型时才加载
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'oop-practice-generator.py')
+        code = (
+            "import importlib.util, sys\n"
+            f"spec = importlib.util.spec_from_file_location('generator', {path!r})\n"
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+            "print(sorted(m for m in ('anthropic', 'langchain_anthropic', 'openai', 'langchain_openai')"
+            " if m in sys.modules))\n"
+        )
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "[]")